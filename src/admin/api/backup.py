@@ -0,0 +1,23 @@
+from aiohttp import web
+from aiohttp_pydantic import PydanticView
+from aiohttp_pydantic.oas.typing import r200
+
+from modules.schemas import response_schemas as schemas
+from modules.utils.api_utils import manage_exceptions
+from phonebook.services import backup_service
+
+
+class BackupView(PydanticView):
+    @manage_exceptions
+    async def post(self) -> r200[schemas.GenericResponseModel[dict]]:
+        """
+        Make consistent point-in-time backup of phonebook with checksum while
+        entry's keep being changed, stats include event loop stalls during backup.
+        """
+        report = await backup_service.create_backup()
+
+        return web.json_response(
+            data=schemas.GenericResponseModel(
+                data=report
+            ).dict()
+        )
@@ -0,0 +1,33 @@
+from aiohttp import web
+from aiohttp_pydantic import PydanticView
+from aiohttp_pydantic.oas.typing import r200
+
+from conf.settings import DEDUPE_THRESHOLD
+from modules.schemas import response_schemas as schemas
+from modules.utils.api_utils import manage_exceptions
+from phonebook.services import dedupe_service
+
+
+class DedupeView(PydanticView):
+    @manage_exceptions
+    async def post(
+            self,
+            threshold: float = DEDUPE_THRESHOLD,
+            merge: bool = False
+    ) -> r200[schemas.GenericResponseModel[dict]]:
+        """
+        Find clusters of duplicate entry's by shared phones and similar names request.
+
+        :param threshold:
+            Query param: Minimal similarity of duplicates from 0 to 1.
+        :param merge:
+            Query param: Merge each cluster into the entry with the lowest ID and delete the rest.
+        """
+        report = await dedupe_service.find_duplicate_entries(threshold=threshold, merge=merge)
+
+        return web.json_response(
+            data=schemas.GenericResponseModel(
+                data=report,
+                total=len(report['clusters'])
+            ).dict()
+        )
@@ -0,0 +1,34 @@
+from aiohttp import web
+from aiohttp_pydantic import PydanticView
+from aiohttp_pydantic.oas.typing import r200
+
+from logger.logs import log_stats
+from modules.middlewares.admission import ADMISSION_KEY
+from modules.middlewares.compression import COMPRESSION_KEY
+from modules.schemas import response_schemas as schemas
+from modules.utils.api_utils import manage_exceptions
+from phonebook.db_session import get_session
+
+
+class MetricsView(PydanticView):
+    @manage_exceptions
+    async def get(self) -> r200[schemas.GenericResponseModel[dict]]:
+        """
+        Get server metrics: admission control queues, response
+        compression, stats of last database save and backup and
+        amount of log records dropped and suppressed by rate limit.
+        """
+        admission = self.request.app.get(ADMISSION_KEY)
+        compression = self.request.app.get(COMPRESSION_KEY)
+
+        return web.json_response(
+            data=schemas.GenericResponseModel(
+                data={
+                    'admission': admission.stats() if admission is not None else None,
+                    'compression': compression.stats() if compression is not None else None,
+                    'db_last_save': get_session().last_save,
+                    'db_last_backup': get_session().last_backup,
+                    'logging': log_stats()
+                }
+            ).dict()
+        )
@@ -0,0 +1,23 @@
+from aiohttp import web
+
+from admin.api import metrics, dedupe, backup
+from modules.middlewares.admission import ADMISSION_KEY, Priority
+
+
+def setup_routes(app: web.Application):
+    """
+    Initialize all routes of current application (Admin).
+
+    :param app:
+        Instance of aiohttp application
+    """
+
+    app.router.add_view('/admin/metrics', metrics.MetricsView)
+    app.router.add_view('/admin/dedupe', dedupe.DedupeView)
+    app.router.add_view('/admin/backup', backup.BackupView)
+
+    if ADMISSION_KEY in app:
+        # Duplicates detection occupies all CPUs, so only one runs at a time.
+        app[ADMISSION_KEY].add_route('/admin/dedupe', 'POST', limit=1, priority=Priority.SCAN)
+        # Every backup copies all entry's, concurrent ones would only multiply memory.
+        app[ADMISSION_KEY].add_route('/admin/backup', 'POST', limit=1, priority=Priority.SCAN)
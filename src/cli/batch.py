@@ -0,0 +1,153 @@
+import asyncio
+import inspect
+import shlex
+import sys
+from os.path import basename
+from typing import Iterable, Optional
+
+import click
+
+from modules.exceptions.client_exceptions import RequestFailed
+from utils import set_batch_mode
+
+# Commands to leave interactive shell.
+EXIT_COMMANDS = frozenset(("exit", "quit"))
+
+
+def parse_line(line: str) -> Optional[list]:
+    """
+    Split line of script or shell input to command arguments.
+
+    :param line:
+        Line to split.
+
+    :return:
+        List of arguments or None if line is empty or a comment.
+    """
+    args = shlex.split(line, comments=True)
+
+    return args or None
+
+
+async def execute(group: click.Group, args: list) -> bool:
+    """
+    Execute one CLI command in running event loop.
+
+    :param group:
+        Click group of CLI commands.
+    :param args:
+        Command name and its arguments.
+
+    :return:
+        True if command succeeded, else False, errors of command are printed.
+    """
+    try:
+        result = group.main(args=args, prog_name=basename(sys.argv[0]), standalone_mode=False)
+
+        if inspect.isawaitable(result):
+            await result
+    except click.exceptions.Exit:
+        pass
+    except click.ClickException as exc:
+        exc.show()
+        return False
+    except (click.exceptions.Abort, EOFError):
+        return False
+    except RequestFailed as exc:
+        print(f"Error: {exc}")
+        return False
+    except Exception as exc:
+        # Unexpected error of one command (e.g. broken response) fails only this command.
+        print(f"Error: {exc.__class__.__name__}: {exc}")
+        return False
+
+    return True
+
+
+async def run_lines(group: click.Group, lines: Iterable[str], concurrency: int = 1) -> int:
+    """
+    Execute CLI commands line by line in one event loop.
+    With concurrency > 1 commands are independent and run simultaneously,
+    so their output is printed in order of completion.
+
+    :param group:
+        Click group of CLI commands.
+    :param lines:
+        Lines with commands.
+    :param concurrency:
+        Maximum amount of commands executed at the same time.
+
+    :return:
+        Amount of failed commands.
+    """
+    pending = set()
+    failed = 0
+
+    set_batch_mode(True)
+    try:
+        for line in lines:
+            try:
+                args = parse_line(line)
+            except ValueError as exc:
+                print(f"Error: {exc}")
+                failed += 1
+                continue
+
+            if args is None:
+                continue
+
+            if concurrency == 1:
+                failed += not await execute(group, args)
+                continue
+
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failed += sum(not task.result() for task in done)
+
+            pending.add(asyncio.create_task(execute(group, args)))
+
+        if pending:
+            done, _ = await asyncio.wait(pending)
+            failed += sum(not task.result() for task in done)
+    finally:
+        set_batch_mode(False)
+
+    return failed
+
+
+async def repl(group: click.Group, prompt: str = "phonebook> ") -> None:
+    """
+    Interactive shell reading CLI commands from input
+    and executing them in one event loop.
+
+    :param group:
+        Click group of CLI commands.
+    :param prompt:
+        Prompt to print before each input.
+    """
+    loop = asyncio.get_running_loop()
+
+    set_batch_mode(True)
+    try:
+        while True:
+            try:
+                line = await loop.run_in_executor(None, input, prompt)
+            except EOFError:
+                print()
+                break
+
+            try:
+                args = parse_line(line)
+            except ValueError as exc:
+                print(f"Error: {exc}")
+                continue
+
+            if args is None:
+                continue
+
+            if args[0] in EXIT_COMMANDS:
+                break
+
+            await execute(group, args)
+    finally:
+        set_batch_mode(False)
@@ -1,27 +1,260 @@
-from typing import Mapping, List
-from modules.utils.utils import filter_none_values
-from conf.settings import SERVER_URL
-from modules.client.request_handler import ClientRequestHandler
+import asyncio
+import json
+from typing import Mapping, List, AsyncIterator, Optional
+from modules.utils.utils import filter_none_values, paginator
+from conf.settings import (
+    SERVER_URL,
+    REPLICA_LOCATION,
+    REPLICA_MAX_AGE,
+    CLIENT_CONNECTIONS_LIMIT,
+    CLIENT_CONNECTIONS_LIMIT_PER_HOST,
+    CLIENT_DNS_CACHE_TTL,
+    CLIENT_KEEPALIVE_TIMEOUT,
+    CLIENT_TIMEOUT,
+    CLIENT_RETRIES,
+    CLIENT_RETRY_BACKOFF,
+    CLIENT_COMPRESSION
+)
+from modules.client.request_handler import ClientRequestHandler, get_shared_handler
+from modules.client.utils import httpize
+from replica import LocalReplica
+
+# Page size used to download all entry's to local replica.
+REPLICA_SYNC_PAGE_SIZE = 1000
+
+
+def get_client() -> ClientRequestHandler:
+    """
+    Get process-wide HTTP client configured from settings.
+    All requests of CLI and integrations that import this module
+    share its connection pool, so connections are reused between calls.
+    """
+    return get_shared_handler(
+        limit=CLIENT_CONNECTIONS_LIMIT,
+        limit_per_host=CLIENT_CONNECTIONS_LIMIT_PER_HOST,
+        ttl_dns_cache=CLIENT_DNS_CACHE_TTL,
+        keepalive_timeout=CLIENT_KEEPALIVE_TIMEOUT,
+        timeout=CLIENT_TIMEOUT,
+        retries=CLIENT_RETRIES,
+        retry_backoff=CLIENT_RETRY_BACKOFF,
+        compression=CLIENT_COMPRESSION
+    )
+
+
+async def sync_replica(replica: LocalReplica) -> str | LocalReplica:
+    """
+    Makes an HTTP GET request to the endpoint /phonebook/changes to get
+    changes since the last sync of local replica and applies them.
+    If server can't provide changes (replica is empty, server restarted
+    or replica is too old) all entry's are downloaded from /phonebook page by page,
+    each page starts after the last ID of previous one, so entry's deleted
+    in between don't shift the next pages.
+    Replica that is fresh enough is returned without any requests.
+
+    :param replica:
+        Local replica to sync.
+    """
+
+    if replica.is_fresh():
+        return replica
+
+    client = get_client()
+    response = await client.get_request(
+        url=f'{SERVER_URL}/phonebook/changes',
+        params=filter_none_values({'since': replica.seq, 'epoch': replica.epoch}),
+    )
+
+    response_json = await response.json()
+
+    if not response_json['success']:
+        return f"Error: {response_json['error_msg']}"
+
+    changes = response_json['data']
+
+    if not changes['reset']:
+        replica.apply(events=changes['events'], seq=changes['seq'], epoch=changes['epoch'])
+    else:
+        entries = {}
+        # IDs are not negative, so the first page starts from the smallest one.
+        last_id = -1
+        while True:
+            response = await client.get_request(
+                url=f'{SERVER_URL}/phonebook',
+                params={'after_id': last_id, 'page_size': REPLICA_SYNC_PAGE_SIZE},
+            )
+
+            response_json = await response.json()
+
+            if not response_json['success']:
+                return f"Error: {response_json['error_msg']}"
 
+            page = response_json['data']
+            entries.update((entry['id'], entry) for entry in page)
 
-async def get_entry_list_request(**kwargs) -> str | List[Mapping]:
+            if len(page) < REPLICA_SYNC_PAGE_SIZE:
+                break
+
+            last_id = page[-1]['id']
+
+        replica.reset(entries=entries.values(), seq=changes['seq'], epoch=changes['epoch'])
+
+    replica.save()
+
+    return replica
+
+
+def get_replica() -> Optional[LocalReplica]:
+    """
+    Load local replica if it is enabled in configuration.
+    """
+    if REPLICA_LOCATION is None:
+        return None
+
+    return LocalReplica.load(location=REPLICA_LOCATION, max_age=REPLICA_MAX_AGE)
+
+
+async def get_entry_list_request(use_replica: bool = True, **kwargs) -> str | List[Mapping]:
     """
     Makes an HTTP GET request to the endpoint /phonebook,
     accepts JSON in response and decodes it into a dictionary.
     If the request is not successful, it returns a string
     with an error description, otherwise it returns a list of entry objects.
+    If local replica is enabled, it is synced and used to answer instead.
+
+    :param use_replica:
+        Answer from local replica if it is enabled, False to always request server.
+    :param kwargs:
+        Dictionary of query parameters for HTTP request.
+    """
+
+    # Replica supports only exact queries, fuzzy ones are answered by server.
+    replica = get_replica() if use_replica and not kwargs.get('fuzzy') else None
+
+    if replica is not None:
+        replica = await sync_replica(replica)
+
+        if isinstance(replica, str):
+            return replica
+
+        query = filter_none_values(kwargs)
+        page_num = query.pop('page_num', 1)
+        page_size = query.pop('page_size', 15)
+
+        if page_num < 1:
+            return "Error: Page number must be > 0"
 
+        return paginator(replica.search(**query), page_num=page_num, page_size=page_size)
+
+    client = get_client()
+    response = await client.get_request(
+        url=f'{SERVER_URL}/phonebook',
+        params=filter_none_values(kwargs),
+    )
+
+    response_json = await response.json()
+
+    if not response_json['success']:
+        return f"Error: {response_json['error_msg']}"
+
+    return response_json['data']
+
+
+async def iter_entry_list_pages(
+        page_size: int = 100,
+        use_replica: bool = True,
+        **kwargs
+) -> AsyncIterator[str | List[Mapping]]:
+    """
+    Walks through all pages of endpoint /phonebook and yields them one by one.
+    Request of the next page is sent before the current one is yielded,
+    so it is downloaded while caller processes the current page,
+    and no more than two pages are kept in memory.
+    If some request is not successful, it yields a string with an error description and stops.
+    If local replica is enabled, it is synced once and pages are taken from it.
+
+    :param page_size:
+        Amount of entry's on each page.
+    :param use_replica:
+        Take pages from local replica if it is enabled, False to always request server.
     :param kwargs:
         Dictionary of query parameters for HTTP request.
     """
 
-    async with ClientRequestHandler() as client:
-        response = await client.get_request(
-            url=f'{SERVER_URL}/phonebook',
-            params=filter_none_values(kwargs),
+    # Replica supports only exact queries, fuzzy ones are answered by server.
+    replica = get_replica() if use_replica and not kwargs.get('fuzzy') else None
+
+    if replica is not None:
+        replica = await sync_replica(replica)
+
+        if isinstance(replica, str):
+            yield replica
+            return
+
+        data = replica.search(**filter_none_values(kwargs))
+        for i in range(0, len(data), page_size):
+            yield data[i:i + page_size]
+        return
+
+    def request_page(num: int) -> asyncio.Task:
+        return asyncio.create_task(
+            get_entry_list_request(use_replica=False, page_num=num, page_size=page_size, **kwargs)
         )
 
-        response_json = await response.json()
+    page_num = 1
+    next_page = request_page(page_num)
+    previous_first_id = None
+
+    try:
+        while True:
+            page = await next_page
+            next_page = None
+
+            if isinstance(page, str):
+                yield page
+                return
+
+            # Server returns the last page for page numbers out of range.
+            if not page or page[0].get('id') == previous_first_id:
+                return
+
+            last_page = len(page) < page_size
+            if not last_page:
+                page_num += 1
+                next_page = request_page(page_num)
+
+            previous_first_id = page[0].get('id')
+            yield page
+
+            if last_page:
+                return
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+
+async def search_entry_list_request(q: str, page_num: int = 1, page_size: int = 15) -> str | List[Mapping]:
+    """
+    Makes an HTTP GET request to the endpoint /phonebook/search,
+    accepts JSON in response and decodes it into a dictionary.
+    If the request is not successful, it returns a string
+    with an error description, otherwise it returns a list of entry objects
+    sorted by relevance.
+
+    :param q:
+        Words to search in all fields of entry's.
+    :param page_num:
+        Number of page with entry's.
+    :param page_size:
+        Page size with entry's.
+    """
+
+    client = get_client()
+    response = await client.get_request(
+        url=f'{SERVER_URL}/phonebook/search',
+        params={'q': q, 'page_num': page_num, 'page_size': page_size},
+    )
+
+    response_json = await response.json()
 
     if not response_json['success']:
         return f"Error: {response_json['error_msg']}"
@@ -29,23 +262,41 @@ async def get_entry_list_request(**kwargs) -> str | List[Mapping]:
     return response_json['data']
 
 
-async def get_entry_request(entry_id: int) -> str | Mapping:
+async def get_entry_request(entry_id: int, use_replica: bool = True) -> str | Mapping:
     """
     Makes an HTTP GET request to the endpoint /phonebook/{entry_id},
     accepts JSON in response and decodes it into a dictionary.
     If the request is not successful, it returns a string
     with an error description, otherwise it returns a single entry object.
+    If local replica is enabled, it is synced and used to answer instead.
 
     :param entry_id:
         ID of entry to get.
+    :param use_replica:
+        Answer from local replica if it is enabled, False to always request server.
     """
 
-    async with ClientRequestHandler() as client:
-        response = await client.get_request(
-            url=f'{SERVER_URL}/phonebook/{entry_id}',
-        )
+    replica = get_replica() if use_replica else None
+
+    if replica is not None:
+        replica = await sync_replica(replica)
+
+        if isinstance(replica, str):
+            return replica
+
+        data = replica.get(entry_id)
+
+        if data is None:
+            return f"Error: Entry with ID {entry_id} does not exist"
+
+        return data
 
-        response_json = await response.json()
+    client = get_client()
+    response = await client.get_request(
+        url=f'{SERVER_URL}/phonebook/{entry_id}',
+    )
+
+    response_json = await response.json()
 
     if not response_json['success']:
         return f"Error: {response_json['error_msg']}"
@@ -64,13 +315,13 @@ async def create_entry_request(**kwargs) -> str | Mapping:
         Dictionary of fields to create in entry for request body object for HTTP request.
     """
 
-    async with ClientRequestHandler() as client:
-        response = await client.post_request(
-            url=f'{SERVER_URL}/phonebook/create',
-            data=kwargs
-        )
+    client = get_client()
+    response = await client.post_request(
+        url=f'{SERVER_URL}/phonebook/create',
+        data=kwargs
+    )
 
-        response_json = await response.json()
+    response_json = await response.json()
 
     if not response_json['success']:
         return f"Error: {response_json['error_msg']}"
@@ -91,13 +342,13 @@ async def update_entry_request(entry_id: int, **kwargs) -> str | Mapping:
         Dictionary of fields to update for request body object for HTTP request.
     """
 
-    async with ClientRequestHandler() as client:
-        response = await client.put_request(
-            url=f'{SERVER_URL}/phonebook/{entry_id}',
-            data=kwargs
-        )
+    client = get_client()
+    response = await client.put_request(
+        url=f'{SERVER_URL}/phonebook/{entry_id}',
+        data=kwargs
+    )
 
-        response_json = await response.json()
+    response_json = await response.json()
 
     if not response_json['success']:
         return f"Error: {response_json['error_msg']}"
@@ -116,14 +367,107 @@ async def delete_entry_request(entry_id: int) -> str:
         ID of entry to delete.
     """
 
-    async with ClientRequestHandler() as client:
-        response = await client.delete_request(
-            url=f'{SERVER_URL}/phonebook/{entry_id}',
-        )
+    client = get_client()
+    response = await client.delete_request(
+        url=f'{SERVER_URL}/phonebook/{entry_id}',
+    )
 
-        response_json = await response.json()
+    response_json = await response.json()
 
     if not response_json['success']:
         return f"Error: {response_json['error_msg']}"
 
     return f'Entry with ID {entry_id} deleted'
+
+
+async def dedupe_request(threshold: float = None, merge: bool = False, timeout: float = None) -> str | Mapping:
+    """
+    Makes an HTTP POST request to the endpoint /admin/dedupe,
+    accepts JSON in response and decodes it into a dictionary.
+    If the request is not successful, it returns a string
+    with an error description, otherwise it returns a report with
+    clusters of duplicate entry's and stats.
+
+    :param threshold:
+        Minimal similarity of duplicates from 0 to 1, server default if None.
+    :param merge:
+        Merge each cluster into the entry with the lowest ID.
+    :param timeout:
+        Total timeout of request in seconds, detection of large phonebook takes minutes.
+    """
+
+    client = get_client()
+    response = await client.post_request(
+        url=f'{SERVER_URL}/admin/dedupe',
+        params=filter_none_values({'threshold': threshold, 'merge': merge}),
+        timeout=timeout
+    )
+
+    response_json = await response.json()
+
+    if not response_json['success']:
+        return f"Error: {response_json['error_msg']}"
+
+    return response_json['data']
+
+
+async def backup_request(timeout: float = None) -> str | Mapping:
+    """
+    Makes an HTTP POST request to the endpoint /admin/backup,
+    accepts JSON in response and decodes it into a dictionary.
+    If the request is not successful, it returns a string
+    with an error description, otherwise it returns stats of backup
+    with its location and checksum.
+
+    :param timeout:
+        Total timeout of request in seconds, backup of large phonebook takes a while.
+    """
+
+    client = get_client()
+    response = await client.post_request(
+        url=f'{SERVER_URL}/admin/backup',
+        timeout=timeout
+    )
+
+    response_json = await response.json()
+
+    if not response_json['success']:
+        return f"Error: {response_json['error_msg']}"
+
+    return response_json['data']
+
+
+async def watch_entry_changes_request(
+        since: int = None,
+        epoch: str = None,
+        reconnect_delay: float = 1.0
+) -> AsyncIterator[Mapping]:
+    """
+    Connects to the WebSocket endpoint /phonebook/changes
+    and yields decoded entry change events as they are pushed by server.
+    If connection is lost, it reconnects and resumes from the
+    last received sequence number, so no changes are missed.
+
+    :param since:
+        Sequence number to resume from, None to get only new changes.
+    :param epoch:
+        Epoch of the server feed that sequence number belongs to.
+    :param reconnect_delay:
+        Delay in seconds before reconnecting.
+    """
+
+    while True:
+        client = get_client()
+        async for message in client.establish_websocket_conn(
+            url=f'{SERVER_URL}/phonebook/changes',
+            params=httpize(filter_none_values({'since': since, 'epoch': epoch})),
+        ):
+            if message is None:
+                break
+
+            event = json.loads(message)
+            since, epoch = event['seq'], event['epoch']
+
+            yield event
+
+        await asyncio.sleep(reconnect_delay)
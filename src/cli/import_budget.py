@@ -0,0 +1,149 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Annotated, Iterable, List, Tuple
+
+import typer
+
+CLI_MAIN: Path = Path(__file__).resolve().parent / 'main.py'
+
+# Modules that must not be imported before command actually needs them.
+HEAVY_MODULES: List[str] = ['aiohttp', 'tabulate', 'yaml', 'pydantic', 'asyncio', 'logging.config']
+
+# CLI framework imported by every command, its import time is not counted in budget.
+FRAMEWORK_MODULE: str = 'typer'
+
+IMPORT_TIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+budget_cli: typer.Typer = typer.Typer(add_completion=False)
+
+
+def measure_imports(args: List[str]) -> List[Tuple[str, int, int]]:
+    """
+    Run CLI with "-X importtime" and collect import times.
+
+    :param args:
+        Arguments of CLI command to measure.
+
+    :return:
+        Imported modules in order of "-X importtime" output (nested imports
+        go before the module importing them) with their nesting depth
+        and cumulative import time in microseconds.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+        str(CLI_MAIN.parent.parent), os.environ.get('PYTHONPATH')
+    ])))
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', str(CLI_MAIN), *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    imports = []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+
+        _, cumulative, indent, name = match.groups()
+        imports.append((name, len(indent) // 2, int(cumulative)))
+
+    return imports
+
+
+def _matches(name: str, modules: Iterable[str]) -> bool:
+    return any(name == module or name.startswith(f'{module}.') for module in modules)
+
+
+def import_time(imports: List[Tuple[str, int, int]], excluded: Iterable[str] = ()) -> int:
+    """
+    Get total import time in microseconds without time of excluded modules with their nested imports.
+
+    :param imports:
+        Imports collected by measure_imports.
+    :param excluded:
+        Names of modules (with their submodules) not to count.
+    """
+    total = sum(cumulative for _, depth, cumulative in imports if depth == 0)
+
+    # Reversed output lists every module before its nested imports,
+    # so nested imports of already excluded module are skipped.
+    excluded_depths = []
+    for name, depth, cumulative in reversed(imports):
+        while excluded_depths and excluded_depths[-1] >= depth:
+            excluded_depths.pop()
+
+        if not excluded_depths and _matches(name, excluded):
+            total -= cumulative
+            excluded_depths.append(depth)
+
+    return total
+
+
+@budget_cli.command()
+def check(
+    budget_ms: Annotated[
+        float,
+        typer.Option(
+            help="Maximum import time of command in milliseconds, without typer and allowed modules"
+        )
+    ] = 150,
+    runs: Annotated[
+        int,
+        typer.Option(
+            min=1,
+            help="Amount of measurements, the fastest one is compared with budget"
+        )
+    ] = 5,
+    allow: Annotated[
+        List[str],
+        typer.Option(
+            help="Heavy module the command needs, e.g. aiohttp for commands making requests"
+        )
+    ] = None,
+    args: Annotated[
+        List[str],
+        typer.Argument(
+            help="CLI command to measure"
+        )
+    ] = None,
+):
+    """
+    Check that CLI command imports no heavy modules it doesn't need and that the rest
+    of its imports fit into time budget. Import time of typer and of modules the command
+    needs is reported but not counted, it is the same for any change of CLI code.
+    Exit code is 1 if the check failed, so it can be used in CI.
+    Pass CLI arguments after "--".
+    """
+    args = args or ['--help']
+    allow = allow or []
+    measurements = [measure_imports(args) for _ in range(runs)]
+    total_ms = min(import_time(m) for m in measurements) / 1000
+    own_ms = min(import_time(m, excluded=[FRAMEWORK_MODULE, *allow]) for m in measurements) / 1000
+
+    failed = False
+
+    imported = {name for name, _, _ in measurements[0]}
+    heavy = [name for name in HEAVY_MODULES if name not in allow and any(_matches(m, [name]) for m in imported)]
+    if heavy:
+        print(f"Heavy modules imported by '{' '.join(args)}': {', '.join(heavy)}")
+        failed = True
+
+    print(
+        f"Import time of '{' '.join(args)}': {own_ms:.1f} ms (budget {budget_ms:.1f} ms), "
+        f"{total_ms:.1f} ms in total"
+    )
+    if own_ms > budget_ms:
+        failed = True
+
+    if failed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    budget_cli()
@@ -1,14 +1,57 @@
+import json
+import sys
+from enum import Enum
+from pathlib import Path
 from typing import Annotated
 
 import typer
-import client
-import tabulate
 
-from utils import coro
+from utils import coro, is_batch_mode
+
+# Modules with heavy imports (HTTP client, tabulate, logging configuration)
+# are imported inside commands, so "--help" and other commands don't pay for them.
+# Check startup time with "python cli/import_budget.py" after adding new imports.
 
 cli: typer.Typer = typer.Typer()
 
 
+class OutputFormat(str, Enum):
+    table = "table"
+    ndjson = "ndjson"
+
+
+class SortField(str, Enum):
+    first_name = "first_name"
+    last_name = "last_name"
+    middle_name = "middle_name"
+    organization = "organization"
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+def print_entries(entries: list, output: OutputFormat) -> None:
+    """
+    Print list of entry's as a table or as JSON lines.
+
+    :param entries:
+        Entry's to print.
+    :param output:
+        Output format.
+    """
+    if output == OutputFormat.ndjson:
+        print('\n'.join(json.dumps(e) for e in entries), flush=True)
+    else:
+        import tabulate
+
+        header = entries[0].keys()
+        rows = [x.values() for x in entries]
+
+        print(tabulate.tabulate(rows, header, tablefmt='grid'), flush=True)
+
+
 @cli.command()
 @coro
 async def list_entry(
@@ -60,11 +103,88 @@ async def list_entry(
             help="Query by personal phone"
         )
     ] = None,
+    fuzzy: Annotated[
+        bool,
+        typer.Option(
+            help="Match first and last name with typos, most similar entry's go first"
+        )
+    ] = False,
+    max_distance: Annotated[
+        int,
+        typer.Option(
+            min=0,
+            help="Maximum amount of typos in each name for --fuzzy query"
+        )
+    ] = 2,
+    sort_by: Annotated[
+        SortField,
+        typer.Option(
+            help="Field to sort entry's by, insertion order if not provided"
+        )
+    ] = None,
+    order: Annotated[
+        SortOrder,
+        typer.Option(
+            help="Sort order"
+        )
+    ] = SortOrder.asc,
+    server: Annotated[
+        bool,
+        typer.Option(
+            help="Request server even if local replica is enabled"
+        )
+    ] = False,
+    all_pages: Annotated[
+        bool,
+        typer.Option(
+            "--all",
+            "--stream",
+            help="Walk through all pages starting from the first one, "
+                 "next page is downloaded while the current one is printed"
+        )
+    ] = False,
+    output: Annotated[
+        OutputFormat,
+        typer.Option(
+            help="Output format: grid table or one JSON object per line"
+        )
+    ] = OutputFormat.table,
 ):
     """
     Get all entry's from Phonebook or search specific entry's by query.
     """
+    import asyncio
+    import client
+
+    if all_pages:
+        empty = True
+        async for page in client.iter_entry_list_pages(
+            page_size=page_size,
+            use_replica=not server,
+            first_name=first_name,
+            last_name=last_name,
+            middle_name=middle_name,
+            organization=organization,
+            work_phone=work_phone,
+            personal_phone=personal_phone,
+            fuzzy=fuzzy or None,
+            max_distance=max_distance if fuzzy else None,
+            sort_by=sort_by.value if sort_by else None,
+            order=order.value if sort_by else None
+        ):
+            if isinstance(page, str):
+                print(page)
+                return
+
+            empty = False
+            await asyncio.to_thread(print_entries, page, output)
+
+        if empty and output == OutputFormat.table:
+            print('Phonebook is empty')
+        return
+
     data = await client.get_entry_list_request(
+        use_replica=not server,
         page_num=page_num,
         page_size=page_size,
         first_name=first_name,
@@ -72,18 +192,64 @@ async def list_entry(
         middle_name=middle_name,
         organization=organization,
         work_phone=work_phone,
-        personal_phone=personal_phone
+        personal_phone=personal_phone,
+        fuzzy=fuzzy or None,
+        max_distance=max_distance if fuzzy else None,
+        sort_by=sort_by.value if sort_by else None,
+        order=order.value if sort_by else None
     )
     if isinstance(data, str):
         print(data)
     else:
         if len(data) == 0:
-            print('Phonebook is empty')
+            if output == OutputFormat.table:
+                print('Phonebook is empty')
         else:
-            header = data[0].keys()
-            rows = [x.values() for x in data]
+            print_entries(data, output)
+
+
+@cli.command()
+@coro
+async def search(
+    q: Annotated[
+        str,
+        typer.Argument(
+            help="Words to search in all fields of entry's, the last one may be incomplete"
+        )
+    ],
+    page_num: Annotated[
+        int,
+        typer.Option(
+            help="Number of page with entry's in Phonebook"
+        )
+    ] = 1,
+    page_size: Annotated[
+        int,
+        typer.Option(
+            help="Page size with entry's in Phonebook"
+        )
+    ] = 15,
+    output: Annotated[
+        OutputFormat,
+        typer.Option(
+            help="Output format: grid table or one JSON object per line"
+        )
+    ] = OutputFormat.table,
+):
+    """
+    Full-text search of entry's in Phonebook, most relevant entry's go first.
+    """
+    import client
 
-            print(tabulate.tabulate(rows, header, tablefmt='grid'))
+    data = await client.search_entry_list_request(q=q, page_num=page_num, page_size=page_size)
+
+    if isinstance(data, str):
+        print(data)
+    elif len(data) == 0:
+        if output == OutputFormat.table:
+            print('Nothing found')
+    else:
+        print_entries(data, output)
 
 
 @cli.command()
@@ -94,12 +260,21 @@ async def entry(
         typer.Argument(
             help="ID of entry to GET in Phonebook"
         )
-    ]
+    ],
+    server: Annotated[
+        bool,
+        typer.Option(
+            help="Request server even if local replica is enabled"
+        )
+    ] = False,
 ):
     """
     Get specific entry by its ID.
     """
-    data = await client.get_entry_request(entry_id=entry_id)
+    import client
+    import tabulate
+
+    data = await client.get_entry_request(entry_id=entry_id, use_replica=not server)
 
     if isinstance(data, str):
         print(data)
@@ -153,6 +328,9 @@ async def create_entry(
     """
     Create entry in Phonebook.
     """
+    import client
+    import tabulate
+
     data = await client.create_entry_request(
         first_name=first_name,
         last_name=last_name,
@@ -221,6 +399,9 @@ async def update_entry(
     Update entry in phonebook by its ID.
     A PUT request is used so the fields not provided will take the value None.
     """
+    import client
+    import tabulate
+
     data = await client.update_entry_request(
         entry_id=entry_id,
         first_name=first_name,
@@ -253,10 +434,220 @@ async def delete_entry(
     """
     Delete entry from phonebook by its ID.
     """
+    import client
+
     data = await client.delete_entry_request(entry_id=entry_id)
 
     print(data)
 
 
+@cli.command()
+@coro
+async def dedupe(
+    threshold: Annotated[
+        float,
+        typer.Option(
+            min=0,
+            max=1,
+            help="Minimal similarity of duplicates from 0 to 1, server setting by default"
+        )
+    ] = None,
+    merge: Annotated[
+        bool,
+        typer.Option(
+            help="Merge each cluster of duplicates into the entry with the lowest ID and delete the rest"
+        )
+    ] = False,
+    location: Annotated[
+        Path,
+        typer.Option(
+            help="Find duplicates in database file instead of server, only when server doesn't use it"
+        )
+    ] = None,
+    workers: Annotated[
+        int,
+        typer.Option(
+            min=0,
+            help="Amount of worker processes for --location, amount of CPUs by default"
+        )
+    ] = None,
+    timeout: Annotated[
+        float,
+        typer.Option(
+            help="Seconds to wait for server to find duplicates"
+        )
+    ] = 600,
+):
+    """
+    Find clusters of duplicate entry's by shared phones and similar names.
+    Each cluster is printed as a JSON line with IDs of entry's and similarity of their pairs,
+    followed by a line with stats.
+    """
+    if location is None:
+        import client
+
+        report = await client.dedupe_request(threshold=threshold, merge=merge, timeout=timeout)
+
+        if isinstance(report, str):
+            print(report)
+            return
+    else:
+        from conf.settings import DEDUPE_THRESHOLD, DEDUPE_MAX_BLOCK_SIZE
+        from db.database import Database
+        from phonebook.dedupe import find_duplicates, merge_clusters
+
+        async with Database(location=str(location), read_only=not merge, handle_json_int_keys=True) as db:
+            snapshot = dict(db.get_all())
+            report = find_duplicates(
+                snapshot,
+                threshold=DEDUPE_THRESHOLD if threshold is None else threshold,
+                workers=workers,
+                max_block_size=DEDUPE_MAX_BLOCK_SIZE
+            )
+
+            if merge:
+                report['merge'] = await merge_clusters(db=db, snapshot=snapshot, clusters=report['clusters'])
+
+    for cluster in report['clusters']:
+        print(json.dumps(cluster))
+
+    print(json.dumps(dict(report['stats'], **report.get('merge', {}))), flush=True)
+
+
+@cli.command()
+@coro
+async def backup(
+    timeout: Annotated[
+        float,
+        typer.Option(
+            help="Seconds to wait for server to write backup"
+        )
+    ] = 600,
+):
+    """
+    Make point-in-time backup of phonebook on server while it keeps serving requests.
+    Prints location and SHA-256 checksum of backup with stats as JSON.
+    """
+    import client
+
+    report = await client.backup_request(timeout=timeout)
+
+    print(report if isinstance(report, str) else json.dumps(report))
+
+
+@cli.command()
+@coro
+async def build_snapshot(
+    source: Annotated[
+        Path,
+        typer.Argument(help="Path of JSON database")
+    ],
+    target: Annotated[
+        Path,
+        typer.Argument(help="Path of binary snapshot to write")
+    ],
+    int_keys: Annotated[
+        bool,
+        typer.Option(help="Convert JSON keys to int like API server does")
+    ] = True,
+):
+    """
+    Build binary snapshot of JSON database file (segment files of incremental mode included)
+    to open it with Database(read_only=True, mapped=True) in reporting processes.
+    """
+    from db.database import Database
+
+    async with Database(str(source), read_only=True, handle_json_int_keys=int_keys, incremental=True) as db:
+        await db.export_mapped(str(target))
+
+    print(target)
+
+
+@cli.command()
+@coro
+async def watch(
+    since: Annotated[
+        int,
+        typer.Option(
+            help="Sequence number of the last seen change to resume from"
+        )
+    ] = None,
+    epoch: Annotated[
+        str,
+        typer.Option(
+            help="Epoch of the server change feed that --since belongs to"
+        )
+    ] = None,
+):
+    """
+    Watch changes of entry's in Phonebook.
+    Each change is printed as a JSON line with its sequence number,
+    "reset" change means that some changes were missed and entry's should be reloaded.
+    """
+    import client
+
+    async for event in client.watch_entry_changes_request(since=since, epoch=epoch):
+        print(json.dumps(event), flush=True)
+
+
+@cli.command()
+@coro
+async def shell():
+    """
+    Interactive shell to execute many commands in one process.
+    All commands share one event loop and HTTP connections, type "exit" or "quit" to leave.
+    """
+    import batch
+
+    if is_batch_mode():
+        print("Error: shell can't be started from shell or script")
+        return
+
+    await batch.repl(typer.main.get_command(cli))
+
+
+@cli.command()
+@coro
+async def run_script(
+    file: Annotated[
+        Path,
+        typer.Argument(
+            help="File with one command per line, \"-\" to read from stdin",
+            allow_dash=True
+        )
+    ],
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            min=1,
+            help="Amount of commands executed at the same time, use only for independent commands"
+        )
+    ] = 1,
+):
+    """
+    Execute commands from file in one process.
+    All commands share one event loop and HTTP connections,
+    lines starting with "#" are ignored.
+    """
+    import batch
+
+    if is_batch_mode():
+        print("Error: script can't be started from shell or script")
+        return
+
+    group = typer.main.get_command(cli)
+
+    # Stdin is not opened by the command, so it is left open.
+    if str(file) == "-":
+        failed = await batch.run_lines(group, sys.stdin, concurrency=concurrency)
+    else:
+        with open(file, 'r') as lines:
+            failed = await batch.run_lines(group, lines, concurrency=concurrency)
+
+    if failed:
+        print(f"{failed} command(s) failed")
+        raise typer.Exit(code=1)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,168 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Optional, Mapping, List, Dict, Iterable
+
+from phonebook.utils import normalize_phone
+
+# Entry fields searched by normalized phone number, like server indexes them.
+PHONE_FIELDS = ('work_phone', 'personal_phone')
+
+
+class LocalReplica:
+    """
+    Class for on-disk local copy of Phonebook entry's used by CLI client
+    to answer read requests without HTTP round trips.
+    Replica remembers sequence number and epoch of server change feed
+    it is synced to, so only changes since last sync should be downloaded.
+
+    :param location:
+        Path of JSON file to keep replica in.
+    :param max_age:
+        Amount of seconds since last sync while replica is answering
+        reads without asking server for changes.
+    """
+    def __init__(self, location: str | Path, max_age: float = 0):
+        self.location: str | Path = location
+        self.max_age: float = max_age
+        self.seq: Optional[int] = None
+        self.epoch: Optional[str] = None
+        self.synced_at: float = 0
+        self.entries: Dict[int, Mapping] = {}
+
+    @classmethod
+    def load(cls, location: str | Path, max_age: float = 0) -> "LocalReplica":
+        """
+        Factory method to read replica from disc or create empty one if there is no file.
+
+        :param location:
+            Path of JSON file to keep replica in.
+        :param max_age:
+            Amount of seconds since last sync while replica is fresh.
+        """
+        self = cls(location=location, max_age=max_age)
+
+        try:
+            with open(location, 'r') as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return self
+
+        self.seq = data.get('seq')
+        self.epoch = data.get('epoch')
+        self.synced_at = data.get('synced_at', 0)
+        self.entries = {int(k): v for k, v in data.get('entries', {}).items()}
+
+        return self
+
+    def save(self) -> None:
+        """
+        Write replica to disc. Data is written to temporary file
+        and then replaces old one, so replica file is never torn.
+        """
+        tmp_location = f'{self.location}.tmp'
+
+        with open(tmp_location, 'w') as file:
+            json.dump(
+                {
+                    'seq': self.seq,
+                    'epoch': self.epoch,
+                    'synced_at': self.synced_at,
+                    'entries': self.entries
+                },
+                file
+            )
+
+        os.replace(tmp_location, self.location)
+
+    def is_fresh(self) -> bool:
+        """
+        Check if replica was synced less than max_age seconds ago.
+        """
+        return self.seq is not None and time.time() - self.synced_at < self.max_age
+
+    def reset(self, entries: Iterable[Mapping], seq: int, epoch: str) -> None:
+        """
+        Replace all entry's of replica.
+
+        :param entries:
+            Entry's with "id" field as returned by server.
+        :param seq:
+            Sequence number of server change feed before entry's were downloaded.
+        :param epoch:
+            Epoch of server change feed.
+        """
+        self.entries = {entry['id']: dict(entry) for entry in entries}
+        self.mark_synced(seq=seq, epoch=epoch)
+
+    def apply(self, events: Iterable[Mapping], seq: int, epoch: str) -> None:
+        """
+        Apply changes of server change feed to replica.
+
+        :param events:
+            Change events in order of sequence numbers.
+        :param seq:
+            Sequence number of server change feed after the events.
+        :param epoch:
+            Epoch of server change feed.
+        """
+        for event in events:
+            if event['op'] == 'delete':
+                self.entries.pop(event['id'], None)
+            elif event['op'] in ('create', 'update'):
+                self.entries[event['id']] = dict(event['data'], id=event['id'])
+
+        self.mark_synced(seq=seq, epoch=epoch)
+
+    def mark_synced(self, seq: int, epoch: str) -> None:
+        self.seq = seq
+        self.epoch = epoch
+        self.synced_at = time.time()
+
+    def get(self, entry_id: int) -> Optional[Mapping]:
+        """
+        Get entry by its ID.
+
+        :param entry_id:
+            ID of entry to get.
+        """
+        entry = self.entries.get(entry_id)
+
+        if entry is None:
+            return None
+
+        return {k: v for k, v in entry.items() if k != 'id'}
+
+    @staticmethod
+    def _matches(entry: Mapping, field: str, value: Any) -> bool:
+        if field in PHONE_FIELDS:
+            phone = normalize_phone(value)
+            return phone is not None and normalize_phone(entry.get(field)) == phone
+
+        return entry.get(field) == value
+
+    def search(self, sort_by: Optional[str] = None, order: str = 'asc', **query) -> List[Mapping]:
+        """
+        Get entry's which fields are equal to all given values,
+        phone numbers are compared in any format like on server.
+
+        :param sort_by:
+            Field to sort entry's by like server does, insertion order if not provided.
+        :param order:
+            Sort order, "asc" or "desc".
+        :param query:
+            Fields and values to search by.
+        """
+        entries = [
+            entry for entry in self.entries.values()
+            if all(self._matches(entry, k, v) for k, v in query.items())
+        ]
+
+        if sort_by is not None:
+            entries.sort(
+                key=lambda e: (e.get(sort_by) is None, e.get(sort_by) or '', e['id']),
+                reverse=order == 'desc'
+            )
+
+        return entries
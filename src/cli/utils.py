@@ -1,17 +1,60 @@
-import asyncio
+import sys
 from functools import wraps
 from typing import Awaitable
 
+from modules.exceptions.client_exceptions import RequestFailed
+
+# If enabled, wrapped commands return coroutine to await in already running event loop.
+_batch_mode: bool = False
+
+
+def set_batch_mode(enabled: bool) -> None:
+    """
+    Enable or disable batch mode, in which commands wrapped by "coro"
+    are not run in new event loop, but return coroutine to await,
+    so many commands can be executed in one event loop.
+
+    :param enabled:
+        Batch mode state.
+    """
+    global _batch_mode
+
+    _batch_mode = enabled
+
+
+def is_batch_mode() -> bool:
+    return _batch_mode
+
 
 def coro(f: Awaitable) -> callable:
     """
     Wrapper to run coroutine (async func) in asyncio event loop.
+    Shared HTTP client is closed after coroutine is done and failed
+    requests are printed as errors.
+    In batch mode coroutine is returned to caller without running.
 
     :param f:
         Coroutine to run.
     """
+    async def run(*args, **kwargs):
+        try:
+            return await f(*args, **kwargs)
+        finally:
+            from modules.client.request_handler import close_shared_handler
+
+            await close_shared_handler()
+
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        if _batch_mode:
+            return f(*args, **kwargs)
+
+        import asyncio
+
+        try:
+            return asyncio.run(run(*args, **kwargs))
+        except RequestFailed as exc:
+            print(f"Error: {exc}")
+            sys.exit(1)
 
     return wrapper
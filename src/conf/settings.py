@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 
 # The root directory of the project from which all paths will be formed.
@@ -9,7 +10,57 @@ load_dotenv(BASE_DIR / 'conf/config')
 
 DB_NAME: str = os.environ.get("DB_NAME")
 DB_LOCATION: str | Path = BASE_DIR / "db/data" / DB_NAME
+DB_COMPRESSION: Optional[str] = os.environ.get("DB_COMPRESSION") or None
+DB_COMPRESSION_LEVEL: Optional[int] = (
+    int(os.environ["DB_COMPRESSION_LEVEL"]) if os.environ.get("DB_COMPRESSION_LEVEL") else None
+)
+DB_INCREMENTAL: bool = os.environ.get("DB_INCREMENTAL", "false").lower() in ("1", "true", "yes")
+DB_CONSOLIDATE_AFTER: int = int(os.environ.get("DB_CONSOLIDATE_AFTER", 10000))
+DB_SCAN_WORKERS: int = int(os.environ.get("DB_SCAN_WORKERS") or 0)
+DB_SCAN_MIN_SIZE: int = int(os.environ.get("DB_SCAN_MIN_SIZE", 100000))
+DB_PERSIST_DERIVED: bool = os.environ.get("DB_PERSIST_DERIVED", "true").lower() in ("1", "true", "yes")
+SERVER_TIMING: bool = os.environ.get("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+SLOW_REQUEST_THRESHOLD: Optional[float] = (
+    float(os.environ["SLOW_REQUEST_THRESHOLD"]) if os.environ.get("SLOW_REQUEST_THRESHOLD") else None
+)
+
+RESPONSE_COMPRESSION_MIN_SIZE: int = int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+RESPONSE_COMPRESSION_LEVEL: int = int(os.environ.get("RESPONSE_COMPRESSION_LEVEL", 6))
+RESPONSE_COMPRESSION_CACHE_SIZE: int = int(os.environ.get("RESPONSE_COMPRESSION_CACHE_SIZE", 16 * 1024 * 1024))
+
+CHANGES_BUFFER_SIZE: int = int(os.environ.get("CHANGES_BUFFER_SIZE", 1000))
 
 HOST: str = os.environ.get("HOST")
 PORT: int | str = os.environ.get("PORT")
 SERVER_URL: str = f'http://{HOST}:{PORT}'
+
+ADMISSION_MAX_CONCURRENCY: int = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", 64))
+ADMISSION_LOOKUP_LIMIT: int = int(os.environ.get("ADMISSION_LOOKUP_LIMIT", 64))
+ADMISSION_WRITE_LIMIT: int = int(os.environ.get("ADMISSION_WRITE_LIMIT", 16))
+ADMISSION_SCAN_LIMIT: int = int(os.environ.get("ADMISSION_SCAN_LIMIT", 4))
+ADMISSION_MAX_QUEUE: int = int(os.environ.get("ADMISSION_MAX_QUEUE", 100))
+ADMISSION_QUEUE_TIMEOUT: float = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 2))
+ADMISSION_RETRY_AFTER: int = int(os.environ.get("ADMISSION_RETRY_AFTER", 1))
+
+REPLICA_LOCATION: Optional[str] = os.environ.get("REPLICA_LOCATION") or None
+REPLICA_MAX_AGE: float = float(os.environ.get("REPLICA_MAX_AGE", 0))
+
+CLIENT_CONNECTIONS_LIMIT: int = int(os.environ.get("CLIENT_CONNECTIONS_LIMIT", 100))
+CLIENT_CONNECTIONS_LIMIT_PER_HOST: int = int(os.environ.get("CLIENT_CONNECTIONS_LIMIT_PER_HOST", 0))
+CLIENT_DNS_CACHE_TTL: int = int(os.environ.get("CLIENT_DNS_CACHE_TTL", 300))
+CLIENT_KEEPALIVE_TIMEOUT: float = float(os.environ.get("CLIENT_KEEPALIVE_TIMEOUT", 15))
+CLIENT_TIMEOUT: float = float(os.environ.get("CLIENT_TIMEOUT", 30))
+CLIENT_RETRIES: int = int(os.environ.get("CLIENT_RETRIES", 2))
+CLIENT_RETRY_BACKOFF: float = float(os.environ.get("CLIENT_RETRY_BACKOFF", 0.2))
+CLIENT_COMPRESSION: bool = os.environ.get("CLIENT_COMPRESSION", "true").lower() in ("1", "true", "yes")
+
+LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE: int = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+LOG_RATE_LIMIT: float = float(os.environ.get("LOG_RATE_LIMIT", 10))
+LOG_RATE_BURST: int = int(os.environ.get("LOG_RATE_BURST", 50))
+
+DEDUPE_THRESHOLD: float = float(os.environ.get("DEDUPE_THRESHOLD", 0.8))
+DEDUPE_WORKERS: Optional[int] = int(os.environ["DEDUPE_WORKERS"]) if os.environ.get("DEDUPE_WORKERS") else None
+DEDUPE_MAX_BLOCK_SIZE: int = int(os.environ.get("DEDUPE_MAX_BLOCK_SIZE", 1000))
+
+BACKUP_DIR: Path = Path(os.environ.get("BACKUP_DIR") or BASE_DIR / "db/backups")
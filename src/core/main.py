@@ -1,7 +1,10 @@
 from aiohttp import web
 
-from conf.settings import DB_LOCATION, HOST, PORT
-from startup_tasks import init_routes, init_db_session, create_db
+from conf.settings import (
+    DB_LOCATION, HOST, PORT, CHANGES_BUFFER_SIZE, DB_COMPRESSION, DB_COMPRESSION_LEVEL, DB_INCREMENTAL, DB_CONSOLIDATE_AFTER,
+    DB_SCAN_WORKERS, DB_SCAN_MIN_SIZE, DB_PERSIST_DERIVED
+)
+from startup_tasks import init_routes, init_middlewares, init_db_session, create_db
 import asyncio
 
 from db.database import Database
@@ -25,6 +28,7 @@ def init(db_session: Database) -> web.Application:
     """
     app = web.Application()
 
+    init_middlewares(app)
     init_routes(app)
     init_db_session(db_session)
 
@@ -37,7 +41,18 @@ async def run() -> None:
     """
     pre_init()
 
-    async with Database(location=DB_LOCATION, handle_json_int_keys=True) as session:
+    async with Database(
+            location=DB_LOCATION,
+            handle_json_int_keys=True,
+            changes_buffer_size=CHANGES_BUFFER_SIZE,
+            compression=DB_COMPRESSION,
+            compression_level=DB_COMPRESSION_LEVEL,
+            incremental=DB_INCREMENTAL,
+            consolidate_after=DB_CONSOLIDATE_AFTER,
+            scan_workers=DB_SCAN_WORKERS,
+            scan_min_size=DB_SCAN_MIN_SIZE,
+            persist_derived=DB_PERSIST_DERIVED
+    ) as session:
         app = init(db_session=session)
 
         await web._run_app(
@@ -4,6 +4,15 @@ from pathlib import Path
 
 from aiohttp import web
 
+from admin.router import setup_routes as setup_admin_routes
+from conf.settings import (
+    ADMISSION_MAX_CONCURRENCY, ADMISSION_QUEUE_TIMEOUT, ADMISSION_MAX_QUEUE, ADMISSION_RETRY_AFTER,
+    RESPONSE_COMPRESSION_MIN_SIZE, RESPONSE_COMPRESSION_LEVEL, RESPONSE_COMPRESSION_CACHE_SIZE,
+    SERVER_TIMING, SLOW_REQUEST_THRESHOLD
+)
+from modules.middlewares.admission import ADMISSION_KEY, AdmissionController, admission_middleware
+from modules.middlewares.compression import COMPRESSION_KEY, CompressionCache, compression_middleware
+from modules.middlewares.tracing import tracing_middleware
 from phonebook.router import setup_routes as setup_phonebook_routes
 from phonebook.db_session import setup_session as setup_phonebook_session
 from db.database import Database
@@ -17,6 +26,35 @@ def init_routes(application: web.Application) -> None:
         The aiohttp Application object to use in applications.
     """
     setup_phonebook_routes(application)
+    setup_admin_routes(application)
+
+
+def init_middlewares(application: web.Application) -> None:
+    """
+    Launching functions for initializing middlewares of all project applications.
+    Middlewares should be initialized before routes, so applications can configure them.
+    Tracing is the outermost one, so it covers all phases of request. Compression goes next,
+    so bodies are compressed after admission slot is released.
+
+    :param application:
+        The aiohttp Application object to use in applications.
+    """
+    application.middlewares.append(
+        tracing_middleware(slow_threshold=SLOW_REQUEST_THRESHOLD, timing_header=SERVER_TIMING)
+    )
+
+    cache = CompressionCache(max_size=RESPONSE_COMPRESSION_CACHE_SIZE, level=RESPONSE_COMPRESSION_LEVEL)
+    application[COMPRESSION_KEY] = cache
+    application.middlewares.append(compression_middleware(cache, min_size=RESPONSE_COMPRESSION_MIN_SIZE))
+
+    controller = AdmissionController(
+        max_concurrency=ADMISSION_MAX_CONCURRENCY,
+        queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+        max_queue=ADMISSION_MAX_QUEUE,
+        retry_after=ADMISSION_RETRY_AFTER
+    )
+    application[ADMISSION_KEY] = controller
+    application.middlewares.append(admission_middleware(controller))
 
 
 def init_db_session(session: Database) -> None:
@@ -0,0 +1,139 @@
+import asyncio
+import uuid
+from collections import deque
+from typing import Hashable, Any, Optional, AsyncIterator, Deque, Set, List
+
+
+class ChangeFeed:
+    """
+    Class for broadcasting storage changes to subscribers.
+    Each change gets monotonically increasing sequence number and
+    last changes are kept in a bounded buffer, so subscribers
+    can resume from the last sequence number they have seen.
+
+    :param buffer_size:
+        Amount of last changes to keep for resuming.
+    :param queue_size:
+        Amount of changes that can wait for a slow subscriber,
+        after that subscriber gets reset event and is disconnected.
+    """
+    def __init__(self, buffer_size: int = 1000, queue_size: int = 1000):
+        self.epoch: str = uuid.uuid4().hex
+        self.seq: int = 0
+        self.buffer: Deque[dict] = deque(maxlen=buffer_size)
+        self.queue_size: int = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def publish(self, op: str, key: Hashable, data: Any = None) -> dict:
+        """
+        Register new change and send it to all subscribers.
+
+        :param op:
+            Type of change: create, update or delete.
+        :param key:
+            Key of changed object.
+        :param data:
+            New value of changed object, None for delete.
+
+        :return:
+            Published event.
+        """
+        self.seq += 1
+        event = {
+            "seq": self.seq,
+            "epoch": self.epoch,
+            "op": op,
+            "id": key,
+            "data": dict(data) if isinstance(data, dict) else data
+        }
+        self.buffer.append(event)
+
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+
+        return event
+
+    def _reset_event(self) -> dict:
+        return {"seq": self.seq, "epoch": self.epoch, "op": "reset", "id": None, "data": None}
+
+    def can_resume(self, since: Optional[int], epoch: Optional[str]) -> bool:
+        """
+        Check if subscriber can continue from given sequence number
+        without losing any changes.
+
+        :param since:
+            Last sequence number seen by subscriber.
+        :param epoch:
+            Epoch of feed that sequence number belongs to.
+        """
+        if since is None:
+            return True
+
+        if epoch != self.epoch or since > self.seq:
+            return False
+
+        oldest = self.buffer[0]["seq"] if self.buffer else self.seq + 1
+        return since >= oldest - 1
+
+    def changes_since(self, since: Optional[int], epoch: Optional[str]) -> Optional[List[dict]]:
+        """
+        Get buffered changes after given sequence number.
+
+        :param since:
+            Last sequence number seen by caller.
+        :param epoch:
+            Epoch of feed that sequence number belongs to.
+
+        :return:
+            List of changes or None if they can't be replayed
+            and caller should reload all data.
+        """
+        if since is None or not self.can_resume(since=since, epoch=epoch):
+            return None
+
+        return [event for event in self.buffer if event["seq"] > since]
+
+    async def subscribe(
+            self,
+            since: Optional[int] = None,
+            epoch: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Iterate over changes. First event is always a reset event with
+        current sequence number if changes since given one cannot be replayed,
+        then buffered changes after "since" and then live changes.
+
+        :param since:
+            Last sequence number seen by subscriber, None to get only new changes.
+        :param epoch:
+            Epoch of feed that sequence number belongs to.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+
+        try:
+            if not self.can_resume(since=since, epoch=epoch):
+                reset_event = self._reset_event()
+                since = reset_event["seq"]
+                yield reset_event
+            elif since is not None:
+                for event in [e for e in self.buffer if e["seq"] > since]:
+                    since = event["seq"]
+                    yield event
+
+            while True:
+                event = await queue.get()
+
+                if event is None:
+                    yield self._reset_event()
+                    return
+
+                if since is None or event["seq"] > since:
+                    yield event
+        finally:
+            self._subscribers.discard(queue)
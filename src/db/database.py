@@ -1,7 +1,9 @@
+import asyncio
 import json
+import time
 from pathlib import Path
 from types import TracebackType
-from typing import Hashable, Any, List, Tuple, MutableMapping, Optional, Type
+from typing import Hashable, Any, List, Tuple, MutableMapping, Optional, Type, Iterable
 
 import aiofiles
 
@@ -9,8 +11,23 @@ from io import UnsupportedOperation
 from os.path import basename
 
 from aiofiles.base import AiofilesContextManager
+from db.changes import ChangeFeed
+from db.derived import data_checksum, derived_path, read_derived, write_derived
 from db.exceptions import KeyAlreadyExist
-from db.utils import catch_exception, deep_update, deep_search_by_pair
+from db.indexes import Index, FuzzyIndex, TextIndex, SortedIndex
+from db.mapped import MappedData, write_mapped
+from db.parallel import ParallelScanner, WorkerFailed
+from db.planner import QueryPlanner, PlanNode
+from db.query import CompiledQuery, Predicate, is_flat
+from db.snapshot import (
+    CHUNK_SIZE, write_snapshot, write_backup, SnapshotDecoder, segment_path, list_segments, append_segment, replay_segment
+)
+from db.utils import catch_exception, deep_update, current_task, LoopStallMonitor
+from logger.logs import logger
+from logger.tracing import traced
+
+# Marker stored in the undo log for keys that did not exist before a mutation.
+_MISSING = object()
 
 
 class Connection:
@@ -24,6 +41,16 @@ class Connection:
         self.location: Optional[str] = None
         self.data: Optional[dict] = None
         self.encoding: Optional[str] = None
+        self.compression: Optional[str] = None
+        self.compression_level: Optional[int] = None
+        self.last_write: Optional[dict] = None
+        self.last_consolidation: Optional[dict] = None
+        self.incremental: bool = False
+        self.mapped: bool = False
+        self.segment: int = 0
+        self.segment_records: int = 0
+        self._write_lock: asyncio.Lock = asyncio.Lock()
+        self._consolidate_lock: asyncio.Lock = asyncio.Lock()
 
     @classmethod
     async def connect(
@@ -31,6 +58,10 @@ class Connection:
             location: str | Path,
             read_only: bool = False,
             encoding: str = 'utf8',
+            compression: Optional[str] = None,
+            compression_level: Optional[int] = None,
+            incremental: bool = False,
+            mapped: bool = False,
             **kwargs
     ) -> "Connection":
         """
@@ -42,11 +73,35 @@ class Connection:
             Open JSON file only for reading.
         :param encoding:
             JSON file encoding.
+        :param compression:
+            Compression of written snapshot, "zlib", "lzma" or None for plain JSON.
+            Compression of read snapshot is detected automatically.
+        :param compression_level:
+            Compression level, default one of compression if None.
+        :param incremental:
+            Write only changed records to segment files next to JSON file,
+            they are replayed on reading and merged into JSON file by consolidate method.
+        :param mapped:
+            Map binary snapshot written by Database.export_mapped to memory
+            instead of reading JSON file, records are decoded on access.
+            Works only with read_only.
         """
+        if mapped and not read_only:
+            raise ValueError("Mapped binary snapshot can be opened only for reading")
+
         self = cls()
         self.location = location
         self.encoding = encoding
         self.read_only = read_only
+        self.compression = compression
+        self.compression_level = compression_level
+        self.incremental = incremental
+        self.mapped = mapped
+
+        if mapped:
+            self.data = self.read_mapped(**kwargs)
+            return self
+
         self.connection = await self.open_db()
         self.data = await self.read(**kwargs)
         return self
@@ -56,9 +111,9 @@ class Connection:
         Open JSON file descriptor.
         """
         if self.read_only:
-            file = await aiofiles.open(self.location, encoding=self.encoding, mode='r')
+            file = await aiofiles.open(self.location, mode='rb')
         else:
-            file = await aiofiles.open(self.location, encoding=self.encoding, mode='r+')
+            file = await aiofiles.open(self.location, mode='r+b')
 
         return file
 
@@ -66,6 +121,9 @@ class Connection:
         """
         Close JSON file.
         """
+        if isinstance(self.data, MappedData):
+            self.data.close()
+
         if self.connection is not None:
             await self.connection.close()
             self.connection = None
@@ -73,6 +131,9 @@ class Connection:
     async def read(self, handle_json_int_keys: bool = False) -> dict:
         """
         Read all data from opened JSON file to memory.
+        Each chunk of file is decompressed as soon as it is read into buffer
+        of JSON text, which is parsed at the end of file, then changes
+        from segment files are applied in incremental mode.
 
         :param handle_json_int_keys:
             Convert all JSON keys to int.
@@ -80,33 +141,265 @@ class Connection:
         :return:
             Deserialized JSON data to dictionary.
         """
-        file = await self.connection.read()
+        await self.connection.seek(0)
+
+        decoder = SnapshotDecoder(encoding=self.encoding)
+        while chunk := await self.connection.read(CHUNK_SIZE):
+            decoder.feed(chunk)
 
         if handle_json_int_keys:
-            data = json.loads(
-                file,
-                object_hook=lambda d: {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}
-            )
+            object_hook = lambda d: {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}
         else:
-            data = json.loads(file)
+            object_hook = None
+
+        data = decoder.load(object_hook=object_hook)
+
+        if self.incremental:
+            loop = asyncio.get_running_loop()
+
+            for number, path in list_segments(self.location):
+                self.segment = number
+                self.segment_records += await loop.run_in_executor(
+                    None, replay_segment, path, data, object_hook
+                )
 
         return data
 
-    async def write(self) -> bool:
+    def read_mapped(self, handle_json_int_keys: bool = False) -> MappedData:
+        """
+        Map binary snapshot to memory. Only its header is read,
+        so it is done without offloading to a thread.
+
+        :param handle_json_int_keys:
+            Convert all JSON keys of decoded records to int.
+        """
+        if handle_json_int_keys:
+            object_hook = lambda d: {int(k) if k.lstrip('-').isdigit() else k: v for k, v in d.items()}
+        else:
+            object_hook = None
+
+        return MappedData(self.location, object_hook=object_hook)
+
+    async def write(self, dirty: Optional[Iterable[Hashable]] = None) -> bool:
         """
         Write new object to JSON file.
-        Seek first position of file, add new object
-        and truncate old object from file.
+        Serialization, compression and writing are done in a worker thread
+        against a shallow copy of data taken on the event loop. Stored values
+        are never changed in place, only replaced, so the copy is stable while
+        requests keep mutating data. Concurrent writes are serialized.
+        Amount of written bytes, time spent and the longest event loop
+        stall during write are kept in last_write.
+
+        :param dirty:
+            Keys changed since last write. In incremental mode only these
+            records are appended to segment file, if not provided
+            the whole data is consolidated into JSON file.
         """
         if self.read_only:
             raise UnsupportedOperation(f"{basename(self.location)} is not writable")
 
-        await self.connection.seek(0)
-        await self.connection.write(json.dumps(self.data))
-        await self.connection.truncate()
+        if self.incremental:
+            if dirty is None:
+                return await self.consolidate()
+
+            return await self._append(dirty)
+
+        async with self._write_lock, LoopStallMonitor() as monitor:
+            started = time.perf_counter()
+            snapshot = self.data.copy()
+            stats = {
+                'mode': 'full',
+                'compression': self.compression,
+                'snapshot_seconds': time.perf_counter() - started
+            }
+
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: write_snapshot(
+                    self.location,
+                    snapshot,
+                    stats=stats,
+                    encoding=self.encoding,
+                    compression=self.compression,
+                    level=self.compression_level
+                )
+            )
+
+            stats['seconds'] = time.perf_counter() - started
+
+        stats['loop_stall_seconds'] = monitor.max_stall
+        self.last_write = stats
 
         return True
 
+    async def _append(self, dirty: Iterable[Hashable]) -> bool:
+        """
+        Append current values of changed records to active segment file.
+
+        :param dirty:
+            Keys changed since last write.
+        """
+        async with self._write_lock, LoopStallMonitor() as monitor:
+            started = time.perf_counter()
+            records = [(key, self.data.get(key, _MISSING)) for key in dirty]
+            stats = {'mode': 'append', 'snapshot_seconds': time.perf_counter() - started}
+
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: append_segment(
+                    segment_path(self.location, self.segment),
+                    records,
+                    missing=_MISSING,
+                    stats=stats
+                )
+            )
+
+            self.segment_records += stats['records']
+            stats['seconds'] = time.perf_counter() - started
+
+        stats['loop_stall_seconds'] = monitor.max_stall
+        self.last_write = stats
+
+        return True
+
+    async def consolidate(self) -> bool:
+        """
+        Merge segment files into JSON file.
+        New segment file is started and data is copied at the same moment,
+        so writes may go on while JSON file is rewritten. JSON file is replaced
+        atomically and only then covered segment files are removed. If process
+        dies in between, covered segments are replayed over data that already
+        contains them, which gives the same result.
+        Stats are kept in last_consolidation.
+        """
+        if self.read_only:
+            raise UnsupportedOperation(f"{basename(self.location)} is not writable")
+
+        async with self._consolidate_lock, LoopStallMonitor() as monitor:
+            started = time.perf_counter()
+
+            async with self._write_lock:
+                snapshot = self.data.copy()
+                covered = self.segment
+                covered_records = self.segment_records
+                self.segment += 1
+                self.segment_records = 0
+
+            stats = {
+                'mode': 'consolidate',
+                'compression': self.compression,
+                'segment_records': covered_records,
+                'snapshot_seconds': time.perf_counter() - started
+            }
+
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: write_snapshot(
+                        self.location,
+                        snapshot,
+                        stats=stats,
+                        replace=True,
+                        encoding=self.encoding,
+                        compression=self.compression,
+                        level=self.compression_level
+                    )
+                )
+            except Exception:
+                self.segment_records += covered_records
+                raise
+
+            for number, path in list_segments(self.location):
+                if number <= covered:
+                    path.unlink(missing_ok=True)
+
+            stats['seconds'] = time.perf_counter() - started
+
+        stats['loop_stall_seconds'] = monitor.max_stall
+        self.last_consolidation = stats
+
+        return True
+
+
+class Transaction:
+    """
+    Async context manager that groups several Database mutations into one unit of work.
+    Every mutation made inside is recorded in the undo log of the database,
+    on success the data is saved on disc once, on exception all recorded
+    mutations are reverted in reverse order.
+    Nested transactions of the same task work like savepoints:
+    they only rollback their own mutations and leave saving to the outermost one.
+    All arguments should be passed through Database.transaction method.
+
+    :param db:
+        Database instance to group mutations of.
+    """
+    def __init__(self, db: "Database"):
+        self.db: "Database" = db
+        self.savepoint: Optional[int] = None
+        self.outermost: bool = False
+
+    async def __aenter__(self) -> "Transaction":
+        task = current_task()
+
+        if self.db._undo_log is None or self.db._transaction_owner is not task:
+            await self.db._transaction_lock.acquire()
+            self.db._undo_log = []
+            self.db._transaction_owner = task
+            self.outermost = True
+
+        self.savepoint = len(self.db._undo_log)
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ):
+        try:
+            if exc_type is not None:
+                self.rollback()
+            elif self.outermost and self.db._undo_log:
+                try:
+                    await self.db.save()
+                except Exception:
+                    self.rollback()
+                    raise
+                self.db._publish_changes()
+        finally:
+            if self.outermost:
+                self.db._undo_log = None
+                self.db._transaction_owner = None
+                self.db._transaction_lock.release()
+
+    def rollback(self) -> None:
+        """
+        Revert all mutations made since this transaction was entered.
+        Data is reverted even if some index fails to revert,
+        then indexes are rebuilt from reverted data.
+        """
+        undo_log = self.db._undo_log
+        failed = False
+
+        for key, old_value in reversed(undo_log[self.savepoint:]):
+            try:
+                if old_value is _MISSING:
+                    self.db._pop(key)
+                else:
+                    self.db._put(key, old_value)
+            except Exception as exc:
+                logger['error'].error(
+                    f"Indexes of key {key!r} in {basename(self.db.location)} are not reverted: {repr(exc)}"
+                )
+                self.db._set(key, old_value)
+                failed = True
+
+        del undo_log[self.savepoint:]
+
+        if failed:
+            self.db._rebuild_indexes()
+
 
 class Database:
     """
@@ -118,25 +411,109 @@ class Database:
         Connect to JSON-based database only for reading data.
     :param handle_json_int_keys:
         After opening convert all keys of received object to int.
+    :param changes_buffer_size:
+        Amount of last committed changes kept in change feed for resuming subscribers.
+    :param compression:
+        Compression of saved snapshot, "zlib", "lzma" or None for plain JSON.
+    :param compression_level:
+        Compression level, default one of compression if None.
+    :param incremental:
+        Track keys changed since last save and write only their records
+        to segment files, which are merged into JSON file in background.
+    :param consolidate_after:
+        Amount of records in segment files to start merging them into JSON file.
+    :param mapped:
+        Location is a binary snapshot written by export_mapped, it is mapped
+        to memory and records are decoded on access, so processes reading
+        the same snapshot share OS page cache. Requires read_only.
+    :param scan_workers:
+        Amount of worker processes scanning parts of data for "parallel_search", 0 disables them.
+        Not used in mapped mode.
+    :param scan_min_size:
+        Minimal amount of stored objects to scan them by worker processes,
+        smaller storage is faster to scan in current process.
+    :param persist_derived:
+        Save indexes, allocated keys and other state derived from data next to JSON file
+        on exit and restore them on the next start instead of building from data,
+        if data on disc was not changed in between. Not used in mapped mode.
     """
     def __init__(
             self,
             location: str | Path,
             read_only: bool = False,
-            handle_json_int_keys: bool = False
+            handle_json_int_keys: bool = False,
+            changes_buffer_size: int = 1000,
+            compression: Optional[str] = None,
+            compression_level: Optional[int] = None,
+            incremental: bool = False,
+            consolidate_after: int = 10000,
+            mapped: bool = False,
+            scan_workers: int = 0,
+            scan_min_size: int = 100000,
+            persist_derived: bool = True
     ):
         self.read_only: Optional[bool] = read_only
         self.location: Optional[Path] = location
+        self.compression: Optional[str] = compression
+        self.compression_level: Optional[int] = compression_level
+        self.incremental: bool = incremental
+        self.consolidate_after: int = consolidate_after
+        self.mapped: bool = mapped
+        self.scan_workers: int = scan_workers
+        self.scan_min_size: int = scan_min_size
+        self.scanner: Optional[ParallelScanner] = None
+        self.persist_derived: bool = persist_derived
+        self._derived: Optional[dict] = None
+        self._restored: set[Hashable] = set()
+        self._last_key: Optional[int] = None
+        self._mutations: int = 0
+        self._saved_mutations: int = 0
+        self._dirty: set[Hashable] = set()
+        self._nested_keys: Optional[set[Hashable]] = None
+        self._consolidation: Optional[asyncio.Task] = None
         self._db_session: Optional[Connection] = None
         self.handle_json_int_keys: Optional[bool] = handle_json_int_keys
+        self._undo_log: Optional[List[Tuple[Hashable, Any]]] = None
+        self._transaction_owner: Optional[asyncio.Task] = None
+        self._transaction_lock: asyncio.Lock = asyncio.Lock()
+        self.changes: ChangeFeed = ChangeFeed(buffer_size=changes_buffer_size)
+        self.indexes: dict[Hashable, Index] = {}
+        self.last_backup: Optional[dict] = None
 
     async def __aenter__(self) -> "Database":
         self._db_session = await Connection.connect(
             location=self.location,
             read_only=self.read_only,
-            handle_json_int_keys=self.handle_json_int_keys
+            handle_json_int_keys=self.handle_json_int_keys,
+            compression=self.compression,
+            compression_level=self.compression_level,
+            incremental=self.incremental,
+            mapped=self.mapped
         )
 
+        if not self.mapped:
+            if self.persist_derived:
+                await self._load_derived()
+
+            if self._derived is not None:
+                self._nested_keys = self._derived['nested_keys']
+                self._last_key = self._derived['last_key']
+            else:
+                self._nested_keys = {k for k, v in self._db_session.data.items() if not is_flat(v)}
+
+        if self.scan_workers and not self.mapped:
+            self.scanner = ParallelScanner(
+                location=f'{self.location}.scan',
+                data=self._db_session.data,
+                workers=self.scan_workers
+            )
+            try:
+                await self.scanner.start()
+            except WorkerFailed as e:
+                logger['error'].error(f'Parallel scan of {self.location} is disabled: {repr(e)}')
+                await self.scanner.close()
+                self.scanner = None
+
         return self
 
     async def __aexit__(
@@ -145,8 +522,296 @@ class Database:
         exc_val: Optional[BaseException],
         exc_tb: Optional[TracebackType]
     ):
+        if self._consolidation is not None:
+            await self._consolidation
+
+        if self.scanner is not None:
+            await self.scanner.close()
+
+        if self.persist_derived and not self.mapped and not self.read_only:
+            await self._save_derived()
+
         await self._db_session.disconnect()
 
+    async def _load_derived(self) -> None:
+        """
+        Read state saved by _save_derived if it was derived from exactly the data read from disc.
+        """
+        if not Path(derived_path(self.location)).exists():
+            return
+
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        try:
+            checksum = await loop.run_in_executor(None, data_checksum, self.location)
+            state = await loop.run_in_executor(None, read_derived, self.location, self._derived_header(checksum))
+        except OSError as e:
+            logger['error'].error(f'Derived state of {basename(self.location)} is not loaded: {repr(e)}')
+            return
+
+        if (
+            state is None
+            or state.get('count') != len(self._db_session.data)
+            or not isinstance(state.get('last_key'), int)
+            or not isinstance(state.get('nested_keys'), list)
+            or not isinstance(state.get('indexes'), list)
+        ):
+            logger['debug'].debug(f'Derived state of {basename(self.location)} is stale, it will be rebuilt')
+            return
+
+        try:
+            state['indexes'] = {saved['name']: saved for saved in state['indexes']}
+            state['nested_keys'] = set(state['nested_keys'])
+        except (TypeError, KeyError):
+            logger['debug'].debug(f'Derived state of {basename(self.location)} is invalid, it will be rebuilt')
+            return
+
+        self._derived = state
+        logger['debug'].debug(
+            f'Loaded derived state of {basename(self.location)} in {(time.perf_counter() - started) * 1000:.1f} ms'
+        )
+
+    async def _save_derived(self) -> None:
+        """
+        Save indexes and other state derived from data next to JSON file, tagged with checksum of data.
+        State is saved only if data on disc matches data in memory, so it can be restored
+        on the next start, and is not rewritten if it was fully restored and nothing changed.
+        Errors are logged, not raised.
+        """
+        if self._mutations != self._saved_mutations:
+            return
+        if self._mutations == 0 and self._derived is not None and self._restored == set(self.indexes):
+            return
+
+        indexes = []
+        for name, index in self.indexes.items():
+            # Only names which keep their type in JSON can be matched on restore.
+            if not isinstance(name, (str, int)):
+                continue
+            try:
+                indexes.append({'name': name, 'signature': index.signature(), 'state': index.dump_state()})
+            except NotImplementedError:
+                continue
+
+        state = {
+            'count': len(self._db_session.data),
+            'last_key': self.last_key,
+            'nested_keys': list(self._nested_keys),
+            'indexes': indexes
+        }
+
+        def write():
+            return write_derived(self.location, self._derived_header(data_checksum(self.location)), state)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, write)
+        except Exception as e:
+            logger['error'].error(f'Derived state of {basename(self.location)} is not saved: {repr(e)}')
+
+    def _derived_header(self, checksum: str) -> dict:
+        """
+        Describe data derived state belongs to: state is restored only for the same
+        data files read with the same conversion of keys.
+        """
+        return {'checksum': checksum, 'handle_json_int_keys': bool(self.handle_json_int_keys)}
+
+    def add_index(self, index: Index, name: Optional[Hashable] = None) -> Index:
+        """
+        Register secondary index of stored objects and fill it with current data.
+        Registered index is maintained on every mutation and used by "search"
+        instead of scanning for queries by its field.
+
+        :param index:
+            Index to register.
+        :param name:
+            Name of index, field of index by default.
+        """
+        name = index.field if name is None else name
+        saved = None if self._derived is None else self._derived['indexes'].get(name)
+
+        if saved is not None and saved.get('signature') == index.signature():
+            try:
+                index.load_state(saved.get('state'))
+                self._restored.add(name)
+            except (ValueError, NotImplementedError) as e:
+                logger['debug'].debug(f'Saved index {name!r} of {basename(self.location)} is rebuilt: {repr(e)}')
+                saved = None
+        else:
+            saved = None
+
+        if saved is None:
+            index.clear()
+            index.build(self._db_session.data.items())
+
+        self.indexes[name] = index
+        return index
+
+    def _field_index(self, field: Hashable) -> Optional[Index]:
+        """
+        Get index over given field or None if there is no such one.
+        """
+        index = self.indexes.get(field)
+
+        if index is None or index.field != field:
+            return None
+
+        return index
+
+    def _put(self, key: Hashable, value: Any) -> None:
+        """
+        Set value by key in storage and update indexes.
+        Indexes are updated first, so if some of them fails
+        storage is left unchanged.
+        """
+        self._update_indexes(key, self._db_session.data.get(key, _MISSING), value)
+        self._set(key, value)
+
+    def _pop(self, key: Hashable) -> None:
+        """
+        Delete value by key from storage and indexes.
+        Indexes are updated first, so if some of them fails
+        storage is left unchanged.
+        """
+        value = self._db_session.data.get(key, _MISSING)
+
+        if value is not _MISSING:
+            self._update_indexes(key, value, _MISSING)
+            self._set(key, _MISSING)
+
+    def _update_indexes(self, key: Hashable, old_value: Any, new_value: Any) -> None:
+        """
+        Move key in all indexes from old value to new one, _MISSING if there is no value.
+        If some index raises an exception, all changes made to indexes
+        are reverted before it is raised, so indexes keep matching storage.
+        """
+        done = []
+
+        try:
+            for index in self.indexes.values():
+                if old_value is not _MISSING:
+                    index.remove(key, old_value)
+                    done.append((index.insert, old_value))
+                if new_value is not _MISSING:
+                    index.insert(key, new_value)
+                    done.append((index.remove, new_value))
+        except Exception:
+            for undo, value in reversed(done):
+                try:
+                    undo(key, value)
+                except Exception as exc:
+                    logger['error'].error(
+                        f"Index change of key {key!r} in {basename(self.location)} is not reverted: {repr(exc)}"
+                    )
+            raise
+
+    def _rebuild_indexes(self) -> None:
+        """
+        Build all indexes from storage again, index that fails
+        to be built is dropped, so its queries scan storage.
+        """
+        for name, index in list(self.indexes.items()):
+            try:
+                index.clear()
+                index.build(self._db_session.data.items())
+            except Exception as exc:
+                logger['error'].error(f"Index {name!r} of {basename(self.location)} is dropped: {repr(exc)}")
+                del self.indexes[name]
+
+    def _set(self, key: Hashable, value: Any) -> None:
+        """
+        Set value by key in storage or delete it if value is _MISSING,
+        without updating indexes.
+        """
+        data = self._db_session.data
+
+        if value is _MISSING:
+            if data.pop(key, _MISSING) is _MISSING:
+                return
+        else:
+            data[key] = value
+
+        self._dirty.add(key)
+        self._mutated()
+
+        if isinstance(key, int) and self._last_key is not None and key > self._last_key:
+            self._last_key = key
+
+        if self.scanner is not None:
+            self.scanner.changed(key)
+
+        if self._nested_keys is not None:
+            if value is _MISSING or is_flat(value):
+                self._nested_keys.discard(key)
+            else:
+                self._nested_keys.add(key)
+
+    def _mutated(self) -> None:
+        # Restored state no longer matches data, so indexes registered later are built.
+        self._mutations += 1
+        self._derived = None
+
+    @property
+    def last_key(self) -> int:
+        """
+        The largest int key ever stored, 0 if there were no such keys.
+        It is found once by going through all keys and then kept on mutations.
+        """
+        if self._last_key is None:
+            self._last_key = max(
+                (k for k in self._db_session.data if isinstance(k, int) and not isinstance(k, bool)), default=0
+            )
+
+        return self._last_key
+
+    def next_key(self) -> int:
+        """
+        Allocate int key for new object: the largest int key ever stored plus one.
+        Keys of deleted objects are not reused.
+        """
+        self._last_key = self.last_key + 1
+        return self._last_key
+
+    def transaction(self) -> Transaction:
+        """
+        Start new transaction. Use it as async context manager,
+        mutations inside will be saved on disc once on exit
+        or reverted if an exception occurs.
+        """
+        return Transaction(db=self)
+
+    def _record(self, key: Hashable) -> None:
+        """
+        Save previous value of key to the undo log of active transaction.
+
+        :param key:
+            Key that is going to be mutated.
+        """
+        if self._undo_log is not None and self._transaction_owner is current_task():
+            self._undo_log.append((key, self._db_session.data.get(key, _MISSING)))
+
+    def _publish_changes(self) -> None:
+        """
+        Publish changes of active transaction to the change feed.
+        For every mutated key its value before transaction is
+        compared with the current one to get type of change.
+        """
+        old_values = {}
+        for key, old_value in self._undo_log:
+            old_values.setdefault(key, old_value)
+
+        for key, old_value in old_values.items():
+            new_value = self._db_session.data.get(key, _MISSING)
+
+            if old_value is _MISSING and new_value is _MISSING:
+                continue
+            elif old_value is _MISSING:
+                self.changes.publish(op="create", key=key, data=new_value)
+            elif new_value is _MISSING:
+                self.changes.publish(op="delete", key=key)
+            else:
+                self.changes.publish(op="update", key=key, data=new_value)
+
     def get(self, key: Hashable, default=None) -> Any | None:
         """
         Get value from key-value storage by its key.
@@ -196,10 +861,11 @@ class Database:
         :return:
             True if success, False if key not found in storage.
         """
-        try:
-            del self._db_session.data[key]
-        except KeyError:
+        if key not in self._db_session.data:
             return False
+
+        self._record(key)
+        self._pop(key)
         return True
 
     def add(self, new_data: Any, key: Hashable = None) -> bool:
@@ -208,6 +874,7 @@ class Database:
         After call this method does not save new data
         on disc and just update it in memory,
         for writing this you should use "save" method
+        or make changes inside "transaction"
 
         :param new_data:
             New value to add.
@@ -217,17 +884,20 @@ class Database:
         if self._db_session.data.get(key) is not None:
             raise KeyAlreadyExist(f"Key {key} already exist in {self.location}")
 
-        self._db_session.data[key] = new_data
+        self._record(key)
+        self._put(key, new_data)
         return True
 
     def merge(self, new_data: MutableMapping) -> bool:
         """
-        Merge new data object and storage object
+        Merge new data object into storage object in place.
 
         :param new_data:
             New object to merge.
         """
-        self._db_session.data = self._db_session.data | new_data
+        for key, value in new_data.items():
+            self._record(key)
+            self._put(key, value)
         return True
 
     def update(self, key: Hashable, data: Any) -> bool:
@@ -239,24 +909,161 @@ class Database:
         :param data:
             Data to update.
         """
-        self._db_session.data[key] = deep_update(self._db_session.data[key], data)
+        self._record(key)
+        self._put(key, deep_update(self._db_session.data[key], data))
         return True
 
+    @traced('db.save')
     async def save(self) -> bool:
         """
         Save new object in memory to disc. Works like commit.
+        In incremental mode only records changed since last save are written
+        and segment files are merged into JSON file in background
+        when they grow over consolidate_after records.
+        """
+        mutations = self._mutations
+
+        if not self.incremental:
+            await self._db_session.write()
+        else:
+            dirty, self._dirty = self._dirty, set()
+            try:
+                await self._db_session.write(dirty=dirty)
+            except Exception:
+                self._dirty |= dirty
+                raise
+
+            if (
+                self._db_session.segment_records >= self.consolidate_after
+                and (self._consolidation is None or self._consolidation.done())
+            ):
+                self._consolidation = asyncio.create_task(self.consolidate())
+
+        self._saved_mutations = mutations
+        self._log_write(self._db_session.last_write)
+        return True
+
+    async def export_mapped(self, location: str | Path) -> bool:
+        """
+        Write binary snapshot of current data to be opened with mapped=True.
+        Data is copied on the event loop and written in a worker thread.
+
+        :param location:
+            Path of binary snapshot to write.
+        """
+        snapshot = dict(self._db_session.data)
+        await asyncio.get_running_loop().run_in_executor(None, write_mapped, location, snapshot)
+        return True
+
+    @traced('db.backup')
+    async def backup(self, location: str | Path) -> dict:
+        """
+        Write consistent point-in-time backup of data with SHA-256 checksum next to it.
+        Data is copied on the event loop without waiting for active transaction:
+        its mutations are reverted in the copy by its undo log, so backup contains
+        only committed changes. Copy is written by chunks in a worker thread,
+        so writes go on meanwhile. Backup is a regular snapshot which can be opened
+        as database. Stats are kept in last_backup.
+
+        :param location:
+            Path of backup file, should not be the database file.
+
+        :return:
+            Stats of backup: "location", "checksum", amount of "objects", change feed "seq"
+            and "epoch" backup corresponds to, "disk_bytes", "seconds", "snapshot_seconds"
+            spent on copying data and event loop stalls during backup in "loop_stall_ms".
+        """
+        async with LoopStallMonitor() as monitor:
+            started = time.perf_counter()
+
+            snapshot = dict(self._db_session.data)
+            seq, epoch = self.changes.seq, self.changes.epoch
+
+            for key, old_value in reversed(self._undo_log or ()):
+                if old_value is _MISSING:
+                    snapshot.pop(key, None)
+                else:
+                    snapshot[key] = old_value
+
+            stats = {
+                'location': str(location),
+                'objects': len(snapshot),
+                'seq': seq,
+                'epoch': epoch,
+                'compression': self.compression,
+                'snapshot_seconds': time.perf_counter() - started
+            }
+
+            stats['checksum'] = await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: write_backup(
+                    location,
+                    snapshot,
+                    stats=stats,
+                    encoding=self._db_session.encoding,
+                    compression=self.compression,
+                    level=self.compression_level
+                )
+            )
+
+            stats['seconds'] = time.perf_counter() - started
+
+        stats['loop_stall_ms'] = {
+            'p50': round(monitor.percentile(0.5) * 1000, 3),
+            'p99': round(monitor.percentile(0.99) * 1000, 3),
+            'max': round(monitor.max_stall * 1000, 3)
+        }
+        self.last_backup = stats
+
+        return stats
+
+    async def consolidate(self) -> bool:
         """
-        await self._db_session.write()
+        Merge segment files of incremental mode into JSON file.
+        Errors are logged, not raised, so it can run as background task.
+        """
+        try:
+            await self._db_session.consolidate()
+        except Exception as exc:
+            logger['error'].error(f"Consolidation of {basename(self.location)} failed: {repr(exc)}")
+            return False
+
+        self._log_write(self._db_session.last_consolidation)
         return True
 
-    def search(self, search_query: List[Tuple]) -> List[Hashable]:
+    def _log_write(self, stats: dict) -> None:
+        logger['debug'].debug(
+            f"Saved {basename(self.location)} ({stats['mode']}): {stats['disk_bytes']} bytes on disc "
+            f"in {stats['seconds'] * 1000:.1f} ms, event loop stalled for {stats['loop_stall_seconds'] * 1000:.1f} ms"
+        )
+
+    @property
+    def last_save(self) -> Optional[dict]:
+        """
+        Stats of last save: "mode" of write ("full" or "append" in incremental mode),
+        "disk_bytes" written, "seconds" spent, "snapshot_seconds" spent on copying
+        data on the event loop and the longest event loop stall "loop_stall_seconds".
+        Full write also has "raw_bytes" of serialized JSON and "compression" used,
+        append has amount of written "records".
+        """
+        return self._db_session.last_write
+
+    @traced('db.search')
+    def search(self, search_query: List[Tuple], fuzzy: bool = False, max_distance: int = 2) -> List[Hashable]:
         """
         Storage search by provided key-value pairs.
         The root key will be returned if its object or nested
         objects satisfy the search query.
+        Pairs with indexed fields are looked up in their indexes
+        and only found objects are checked for the rest pairs.
 
         :param search_query:
             List of tuples with key-value pair represents query to find.
+        :param fuzzy:
+            Match values of fields with FuzzyIndex approximately,
+            found keys are sorted by sum of edit distances.
+        :param max_distance:
+            Maximum edit distance of each approximately matched value.
         :return:
             List of found keys by search query.
         """
@@ -265,14 +1072,234 @@ class Database:
         if len(search_query) == 0:
             return results
 
+        if fuzzy:
+            fuzzy_query = [q for q in search_query if isinstance(self._field_index(q[0]), FuzzyIndex)]
+
+            if fuzzy_query:
+                return self._search_fuzzy(
+                    search_query=search_query,
+                    fuzzy_query=fuzzy_query,
+                    max_distance=max_distance
+                )
+
+        indexed_query = [q for q in search_query if self._field_index(q[0]) is not None]
+
+        if indexed_query:
+            return self._search_indexed(search_query=search_query, indexed_query=indexed_query)
+
         if len(search_query) == 1:
             if self._db_session.data.get(search_query[0][0]) == search_query[0][1]:
                 results.append(search_query[0][0])
 
-        for key, value in self._db_session.data.items():
-            if isinstance(value, dict):
-                if all(deep_search_by_pair(key_value_pair=q, mapping=value) for q in search_query):
-                    results.append(key)
+        results.extend(CompiledQuery(search_query).filter(self._db_session.data.items(), self._nested_keys))
+
+        return results
+
+    @traced('db.plan')
+    def plan(self, predicate: Optional[Predicate]) -> PlanNode:
+        """
+        Build query plan finding keys of objects satisfying predicate.
+        Plan uses registered indexes if it is estimated to be cheaper than scan
+        of all objects, keys are found by its "execute" method and
+        estimates with actual results are described by "explain".
+        Predicates match top-level fields of objects only.
+
+        :param predicate:
+            Parsed "where" condition, None to find all keys.
+        :return:
+            Root node of the plan.
+        """
+        return QueryPlanner(data=self._db_session.data, indexes=self.indexes).plan(predicate)
+
+    @traced('db.search')
+    async def parallel_search(
+            self,
+            search_query: List[Tuple],
+            fuzzy: bool = False,
+            max_distance: int = 2
+    ) -> List[Hashable]:
+        """
+        Storage search like "search", but queries without indexed fields
+        over large storage are scanned by worker processes, so scan is split
+        across cores and doesn't block event loop.
+        If workers are disabled or failed, works exactly like "search".
+        Keys changed since workers got their snapshot go after the others.
+
+        :param search_query:
+            List of tuples with key-value pair represents query to find.
+        :param fuzzy:
+            Match values of fields with FuzzyIndex approximately.
+        :param max_distance:
+            Maximum edit distance of each approximately matched value.
+        :return:
+            List of found keys by search query.
+        """
+        data = self._db_session.data
+
+        if (
+            self.scanner is None
+            or self.scanner.broken
+            or len(data) < self.scan_min_size
+            or not search_query
+            or any(self._field_index(field) is not None for field, _ in search_query)
+        ):
+            return self.search(search_query=search_query, fuzzy=fuzzy, max_distance=max_distance)
+
+        results = []
+
+        if len(search_query) == 1:
+            if data.get(search_query[0][0]) == search_query[0][1]:
+                results.append(search_query[0][0])
+
+        try:
+            results.extend(await self.scanner.scan(search_query, self._nested_keys))
+        except WorkerFailed as e:
+            logger['error'].error(f'Parallel scan of {self.location} failed, scanning in place: {repr(e)}')
+            return self.search(search_query=search_query, fuzzy=fuzzy, max_distance=max_distance)
+
+        return results
+
+    def _search_indexed(self, search_query: List[Tuple], indexed_query: List[Tuple]) -> List[Hashable]:
+        candidates = None
+        for field, value in indexed_query:
+            keys = self.indexes[field].lookup(value)
+
+            if candidates is None:
+                candidates = keys
+            else:
+                keys = set(keys)
+                candidates = [k for k in candidates if k in keys]
+
+            if not candidates:
+                return []
+
+        rest_query = [q for q in search_query if self._field_index(q[0]) is None]
+
+        if not rest_query:
+            return list(candidates)
+
+        data = self._db_session.data
+        return CompiledQuery(rest_query).filter([(key, data[key]) for key in candidates], self._nested_keys)
+
+    def _sorted_index(self, field: Hashable) -> Optional[SortedIndex]:
+        """
+        Get SortedIndex over given field or None if there is no such one.
+        """
+        for index in self.indexes.values():
+            if isinstance(index, SortedIndex) and index.field == field:
+                return index
+
+        return None
+
+    @traced('db.sort')
+    def sorted_keys(
+            self,
+            field: Hashable,
+            offset: int = 0,
+            limit: Optional[int] = None,
+            descending: bool = False
+    ) -> List[Hashable]:
+        """
+        Get keys of storage objects ordered by value of their field.
+        If there is SortedIndex over field only requested keys are taken from it,
+        otherwise all objects are sorted.
+
+        :param field:
+            Field of objects to order by.
+        :param offset:
+            Amount of keys to skip.
+        :param limit:
+            Maximum amount of keys, None to get all of them.
+        :param descending:
+            Order from the largest value to the smallest one.
+        :return:
+            List of ordered keys.
+        """
+        index = self._sorted_index(field)
+
+        if index is not None:
+            return index.page(offset=offset, limit=limit, descending=descending)
+
+        keys = self.sort_keys(keys=self._db_session.data.keys(), field=field, descending=descending)
+        return keys[offset:None if limit is None else offset + limit]
+
+    def sort_keys(self, keys: Iterable[Hashable], field: Hashable, descending: bool = False) -> List[Hashable]:
+        """
+        Order given keys by value of field of their objects.
+
+        :param keys:
+            Keys to order.
+        :param field:
+            Field of objects to order by.
+        :param descending:
+            Order from the largest value to the smallest one.
+        :return:
+            List of ordered keys.
+        """
+        data = self._db_session.data
+
+        def sort_key(key):
+            value = data[key].get(field) if isinstance(data[key], dict) else None
+            return *SortedIndex.sort_key(value), key
+
+        return sorted(keys, key=sort_key, reverse=descending)
+
+    @traced('db.text_search')
+    def text_search(self, text: str, index_name: Hashable, limit: Optional[int] = None) -> List[Hashable]:
+        """
+        Full-text search of objects containing all words of text, the last word is matched as prefix.
+
+        :param text:
+            Text to search.
+        :param index_name:
+            Name of registered TextIndex to search in.
+        :param limit:
+            Maximum amount of results, None to get all of them.
+        :return:
+            List of found keys sorted by relevance.
+        """
+        index = self.indexes.get(index_name)
+
+        if not isinstance(index, TextIndex):
+            raise KeyError(f"There is no text index {index_name} in {self.location}")
+
+        return [key for key, _ in index.search(text, limit=limit)]
+
+    def _search_fuzzy(
+            self,
+            search_query: List[Tuple],
+            fuzzy_query: List[Tuple],
+            max_distance: int
+    ) -> List[Hashable]:
+        distances = None
+        for field, value in fuzzy_query:
+            matches = dict(self.indexes[field].fuzzy_lookup(value, max_distance=max_distance))
+
+            if distances is None:
+                distances = matches
+            else:
+                distances = {k: d + matches[k] for k, d in distances.items() if k in matches}
+
+            if not distances:
+                return []
+
+        rest_query = [q for q in search_query if q not in fuzzy_query]
+        indexed_keys = [set(self._field_index(f).lookup(v)) for f, v in rest_query if self._field_index(f)]
+        scan_query = [q for q in rest_query if self._field_index(q[0]) is None]
+
+        compiled_query = CompiledQuery(scan_query) if scan_query else None
+        nested_keys = self._nested_keys
+        data = self._db_session.data
+
+        results = [
+            key for key in distances
+            if all(key in keys for keys in indexed_keys)
+            and (
+                compiled_query is None
+                or compiled_query.match(data[key], nested=nested_keys is None or key in nested_keys)
+            )
+        ]
+        results.sort(key=lambda k: distances[k])
 
         return results
 
@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+from array import array
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from db.snapshot import CHUNK_SIZE, list_segments
+
+# Derived state file: the first line is JSON header with format, version,
+# description of data state was derived from and digest of the rest of file,
+# the second line is JSON layout of state followed by binary columns it refers to.
+# Arrays of ints are kept as machine values and lists of strings as UTF-8 joined by NUL,
+# so millions of values are decoded by a few calls instead of parsing them one by one.
+# Nothing in the file can run code when it is loaded.
+FORMAT = 'phonebook-derived'
+VERSION = 4
+
+# Layout objects referring to binary columns, state must not have other objects with only these keys.
+ARRAY_MARKER = '__array__'
+STRINGS_MARKER = '__strings__'
+
+
+def derived_path(location: str | Path) -> str:
+    """
+    Get path of derived state file kept next to database file.
+    """
+    return f'{location}.derived'
+
+
+def data_checksum(location: str | Path) -> str:
+    """
+    Digest of database file with its segment files in order of replay,
+    so derived state is valid only for exactly the same data on disk.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of database file.
+    """
+    digest = blake2b(digest_size=32)
+    paths: Iterable[Path] = [Path(location), *(path for _, path in list_segments(location))]
+
+    for path in paths:
+        digest.update(str(path.name).encode())
+        with open(path, 'rb') as file:
+            while chunk := file.read(CHUNK_SIZE):
+                digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def encode_columns(state: Any, columns: bytearray) -> Any:
+    """
+    Replace arrays and lists of strings in state by references to binary columns.
+
+    :param state:
+        JSON-serializable state which may also contain arrays.
+    :param columns:
+        Buffer to append binary columns to.
+
+    :return:
+        JSON-serializable layout of state.
+    """
+    if isinstance(state, array):
+        start = len(columns)
+        columns += state.tobytes()
+        return {ARRAY_MARKER: [state.typecode, start, len(columns) - start]}
+
+    if isinstance(state, dict):
+        if len(state) == 1 and (ARRAY_MARKER in state or STRINGS_MARKER in state):
+            raise ValueError(f'State object {state!r} looks like reference to column')
+        return {key: encode_columns(value, columns) for key, value in state.items()}
+
+    if isinstance(state, (list, tuple)):
+        if state and all(isinstance(value, str) for value in state):
+            joined = '\0'.join(state)
+            # Strings with NUL can't be split back, so they stay in layout.
+            if joined.count('\0') == len(state) - 1:
+                start = len(columns)
+                columns += joined.encode('utf-8', 'surrogatepass')
+                return {STRINGS_MARKER: [start, len(columns) - start, len(state)]}
+
+        if any(isinstance(value, (dict, list, tuple, array)) for value in state):
+            return [encode_columns(value, columns) for value in state]
+
+    return state
+
+
+def decode_columns(layout: bytes, columns: memoryview) -> Any:
+    """
+    Parse layout of state and replace references to binary columns by their values.
+
+    :param layout:
+        JSON layout written by encode_columns.
+    :param columns:
+        Binary columns layout refers to.
+
+    :raises ValueError:
+        If layout or columns are corrupted.
+    """
+    def decode(obj: dict) -> Any:
+        if len(obj) != 1:
+            return obj
+
+        if ARRAY_MARKER in obj:
+            typecode, start, size = obj[ARRAY_MARKER]
+            column = array(typecode)
+            column.frombytes(columns[start:start + size])
+            return column
+
+        if STRINGS_MARKER in obj:
+            start, size, count = obj[STRINGS_MARKER]
+            values = str(columns[start:start + size], 'utf-8', 'surrogatepass').split('\0')
+            if len(values) != count:
+                raise ValueError(f'Column has {len(values)} strings instead of {count}')
+            return values
+
+        return obj
+
+    try:
+        return json.loads(layout, object_hook=decode)
+    except TypeError as e:
+        raise ValueError(f'Invalid reference to column: {e!r}') from e
+
+
+def write_derived(location: str | Path, header: dict, state: dict) -> int:
+    """
+    Write derived state of database atomically: to temporary file which then replaces the old one.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of database file, state is written next to it.
+    :param header:
+        Description of data state was derived from (checksum, key type...),
+        state is read only if it matches.
+    :param state:
+        JSON-serializable state, arrays in it are saved as binary columns.
+
+    :return:
+        Amount of written bytes.
+    """
+    columns = bytearray()
+    layout = json.dumps(encode_columns(state, columns), separators=(',', ':')).encode() + b'\n'
+
+    digest = blake2b(layout, digest_size=32)
+    digest.update(columns)
+
+    header = dict(
+        header,
+        format=FORMAT,
+        version=VERSION,
+        byteorder=sys.byteorder,
+        length=len(layout) + len(columns),
+        digest=digest.hexdigest()
+    )
+    path = derived_path(location)
+    tmp_path = f'{path}.tmp'
+
+    header_line = json.dumps(header).encode() + b'\n'
+
+    with open(tmp_path, 'wb') as file:
+        file.write(header_line)
+        file.write(layout)
+        file.write(columns)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(tmp_path, path)
+    return len(header_line) + len(layout) + len(columns)
+
+
+def read_derived(location: str | Path, header: dict) -> Optional[dict]:
+    """
+    Read derived state of database if it is consistent with data.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of database file.
+    :param header:
+        Description of current data, every item must be equal to the saved one.
+
+    :return:
+        State or None if there is no file, it has other format, version or byte order,
+        is corrupted or was derived from other data.
+    """
+    try:
+        with open(derived_path(location), 'rb') as file:
+            saved = json.loads(file.readline())
+
+            if (
+                not isinstance(saved, dict)
+                or saved.get('format') != FORMAT
+                or saved.get('version') != VERSION
+                or saved.get('byteorder') != sys.byteorder
+                or any(saved.get(name) != value for name, value in header.items())
+            ):
+                return None
+
+            payload = file.read()
+    except (OSError, ValueError):
+        return None
+
+    if len(payload) != saved.get('length') or blake2b(payload, digest_size=32).hexdigest() != saved.get('digest'):
+        return None
+
+    layout_end = payload.find(b'\n') + 1
+
+    try:
+        state = decode_columns(payload[:layout_end], memoryview(payload)[layout_end:])
+    except ValueError:
+        return None
+
+    return state if isinstance(state, dict) else None
@@ -1,2 +1,6 @@
 class KeyAlreadyExist(Exception):
     pass
+
+
+class InvalidQuery(Exception):
+    pass
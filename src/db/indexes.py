@@ -0,0 +1,814 @@
+import heapq
+import re
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import accumulate, islice, repeat
+from math import log
+from operator import ge, gt, itemgetter
+from typing import Hashable, Any, Callable, Optional, List, Dict, Tuple, Iterable, Sequence
+
+# Marker of absent value in index maps.
+_NOT_FOUND = object()
+
+
+def int_column(values: Iterable) -> array | list:
+    """
+    Pack values of saved index state into array of 64-bit ints, which is saved
+    as binary column, or keep them in list if some of them are not such ints.
+
+    :param values:
+        Values to pack, usually keys of objects.
+    """
+    values = list(values)
+
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return values
+
+
+def is_increasing(values: Sequence) -> bool:
+    """
+    Check that every value is greater than the previous one.
+    Values which can't be compared are not increasing.
+    """
+    try:
+        return not any(map(ge, values, islice(values, 1, None)))
+    except TypeError:
+        return False
+
+
+class Index:
+    """
+    Base class for secondary indexes of Database over one field of stored objects.
+    Database calls "insert" and "remove" on every mutation, so index is always
+    consistent with storage data.
+
+    :param field:
+        Field of stored objects to index.
+    """
+    def __init__(self, field: Hashable):
+        self.field: Hashable = field
+
+    def insert(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    def remove(self, key: Hashable, value: Any) -> None:
+        raise NotImplementedError
+
+    def build(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        """
+        Fill empty index with all stored objects at once.
+
+        :param items:
+            Keys and objects to index.
+        """
+        for key, value in items:
+            self.insert(key, value)
+
+    def signature(self) -> str:
+        """
+        Describe what the index is built of, saved state is restored
+        only into index with the same signature.
+        """
+        return f'{type(self).__name__}({self.field!r})'
+
+    def dump_state(self) -> dict:
+        """
+        Get indexed data as JSON-serializable dict, saved by Database on exit.
+        Keys of stored objects are kept in lists, so their types survive JSON.
+        """
+        raise NotImplementedError
+
+    def load_state(self, state: dict) -> None:
+        """
+        Restore indexed data saved by dump_state instead of building index.
+
+        :param state:
+            Indexed data of dump_state decoded from JSON.
+
+        :raises ValueError:
+            If state doesn't match the schema of index.
+        """
+        raise NotImplementedError
+
+    def lookup(self, query: Any) -> List[Hashable]:
+        """
+        Get keys of objects matching the query.
+
+        :param query:
+            Value of field to search.
+        """
+        raise NotImplementedError
+
+    def count(self, query: Any) -> int:
+        """
+        Get amount of objects matching the query, used by query planner
+        to estimate selectivity.
+
+        :param query:
+            Value of field to search.
+        """
+        return len(self.lookup(query))
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def field_value(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return value.get(self.field)
+        return None
+
+
+class HashIndex(Index):
+    """
+    Index for constant-time equality lookup by normalized field value.
+    Most values are unique, so key of the single object with given value
+    is stored directly and only repeated values get a bucket of keys.
+
+    :param field:
+        Field of stored objects to index.
+    :param normalize:
+        Function to convert field value and query into index key,
+        values converted to None are not indexed.
+    """
+    def __init__(self, field: Hashable, normalize: Callable[[Any], Optional[Hashable]] = lambda v: v):
+        super().__init__(field=field)
+        self.normalize: Callable[[Any], Optional[Hashable]] = normalize
+        self._map: Dict[Hashable, Hashable | Dict[Hashable, None]] = {}
+
+    def signature(self) -> str:
+        return f'{type(self).__name__}({self.field!r}, {self.normalize.__module__}.{self.normalize.__qualname__})'
+
+    def dump_state(self) -> dict:
+        # Normalized values may be not str, so they can't be JSON object keys: values with
+        # one key and values with buckets are kept in flat lists, keys of buckets one after another.
+        index_keys, keys = [], []
+        bucket_index_keys, bucket_lengths, bucket_keys = [], [], []
+        for index_key, bucket in self._map.items():
+            if isinstance(bucket, dict):
+                bucket_index_keys.append(index_key)
+                bucket_lengths.append(len(bucket))
+                bucket_keys.extend(bucket)
+            else:
+                index_keys.append(index_key)
+                keys.append(bucket)
+
+        return {
+            'index_keys': index_keys,
+            'keys': int_column(keys),
+            'bucket_index_keys': bucket_index_keys,
+            'bucket_lengths': int_column(bucket_lengths),
+            'bucket_keys': int_column(bucket_keys)
+        }
+
+    def load_state(self, state: dict) -> None:
+        try:
+            index_keys, keys = state['index_keys'], state['keys']
+            bucket_index_keys, bucket_lengths = state['bucket_index_keys'], state['bucket_lengths']
+            bucket_keys = state['bucket_keys']
+            if len(index_keys) != len(keys) or len(bucket_index_keys) != len(bucket_lengths):
+                raise ValueError('lengths of index keys and keys differ')
+            if sum(bucket_lengths) != len(bucket_keys) or min(bucket_lengths, default=2) < 2:
+                raise ValueError('lengths of buckets differ')
+
+            self._map = dict(zip(index_keys, keys))
+            bucket_keys = iter(bucket_keys)
+            for index_key, length in zip(bucket_index_keys, bucket_lengths):
+                self._map[index_key] = dict.fromkeys(islice(bucket_keys, length))
+
+            if len(self._map) != len(index_keys) + len(bucket_index_keys):
+                raise ValueError('index keys are repeated')
+        except (KeyError, TypeError, ValueError) as e:
+            self._map = {}
+            raise ValueError(f'Invalid state of {self.signature()}: {e!r}') from e
+
+    def insert(self, key: Hashable, value: Any) -> None:
+        index_key = self.normalize(self.field_value(value))
+        if index_key is None:
+            return
+
+        bucket = self._map.get(index_key, None)
+
+        if bucket is None and index_key not in self._map:
+            self._map[index_key] = key
+        elif isinstance(bucket, dict):
+            bucket[key] = None
+        elif bucket != key:
+            self._map[index_key] = {bucket: None, key: None}
+
+    def remove(self, key: Hashable, value: Any) -> None:
+        index_key = self.normalize(self.field_value(value))
+        if index_key not in self._map:
+            return
+
+        bucket = self._map[index_key]
+
+        if isinstance(bucket, dict):
+            bucket.pop(key, None)
+            if len(bucket) == 1:
+                self._map[index_key] = next(iter(bucket))
+        elif bucket == key:
+            del self._map[index_key]
+
+    def lookup(self, query: Any) -> List[Hashable]:
+        index_key = self.normalize(query)
+        if index_key not in self._map:
+            return []
+
+        bucket = self._map[index_key]
+
+        if isinstance(bucket, dict):
+            return list(bucket)
+        return [bucket]
+
+    def count(self, query: Any) -> int:
+        bucket = self._map.get(self.normalize(query), _NOT_FOUND)
+
+        if bucket is _NOT_FOUND:
+            return 0
+        return len(bucket) if isinstance(bucket, dict) else 1
+
+    def clear(self) -> None:
+        self._map.clear()
+
+
+def bounded_levenshtein(a: str, b: str, max_distance: int) -> Optional[int]:
+    """
+    Levenshtein distance between strings computed only inside the diagonal band
+    of width 2 * max_distance + 1 and stopped as soon as it exceeds max_distance.
+
+    :param a:
+        First string.
+    :param b:
+        Second string.
+    :param max_distance:
+        Maximum distance of interest.
+
+    :return:
+        Distance or None if it is greater than max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return None
+
+    if len(a) > len(b):
+        a, b = b, a
+
+    too_far = max_distance + 1
+    previous = [i if i <= max_distance else too_far for i in range(len(b) + 1)]
+
+    for i in range(1, len(a) + 1):
+        start = max(1, i - max_distance)
+        end = min(len(b), i + max_distance)
+
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+
+        row_min = current[0]
+        for j in range(start, end + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            current[j] = value if value <= max_distance else too_far
+            row_min = min(row_min, current[j])
+
+        if row_min > max_distance:
+            return None
+
+        previous = current
+
+    return previous[len(b)] if previous[len(b)] <= max_distance else None
+
+
+class FuzzyIndex(Index):
+    """
+    Index for approximate lookup of string values by edit distance.
+    Exact lookup works like in HashIndex by original value,
+    approximate one compares case-insensitive values.
+    Candidates are taken from postings of character bigrams: every edit removes
+    at most 2 bigrams of query, so value within distance k contains at least
+    (distinct bigrams of query) - 2 * k of them, candidates are
+    checked with bounded Levenshtein distance, so only small part of
+    distinct values is compared. For queries too short for bigram filter
+    values of suitable length are compared instead. Bigrams and lengths
+    of values restored from saved state are found on first use.
+
+    :param field:
+        Field of stored objects to index.
+    """
+    GRAM_SIZE = 2
+
+    def __init__(self, field: Hashable):
+        super().__init__(field=field)
+        self._values: Dict[str, Dict[Hashable, None]] = {}
+        # None until bigrams and lengths of restored values are found.
+        self._grams: Optional[Dict[str, Dict[str, None]]] = {}
+        self._lengths: Optional[Dict[int, Dict[str, None]]] = {}
+
+    @classmethod
+    def grams(cls, value: str) -> set:
+        padded = f'^{value.lower()}$'
+        return {padded[i:i + cls.GRAM_SIZE] for i in range(len(padded) - cls.GRAM_SIZE + 1)}
+
+    def _add_grams(self, value: str) -> None:
+        for gram in self.grams(value):
+            self._grams.setdefault(gram, {})[value] = None
+        self._lengths.setdefault(len(value), {})[value] = None
+
+    def _index_values(self) -> None:
+        """
+        Find bigrams and lengths of values restored from saved state.
+        """
+        if self._grams is None:
+            self._grams, self._lengths = {}, {}
+            for value in self._values:
+                self._add_grams(value)
+
+    def insert(self, key: Hashable, value: Any) -> None:
+        value = self.field_value(value)
+        if not isinstance(value, str):
+            return
+
+        if value not in self._values:
+            self._index_values()
+            self._values[value] = {}
+            self._add_grams(value)
+
+        self._values[value][key] = None
+
+    def dump_state(self) -> dict:
+        # Bigrams and lengths are cheap to get from distinct values, so only values are saved,
+        # keys of each value one after another.
+        keys = []
+        for value_keys in self._values.values():
+            keys.extend(value_keys)
+
+        return {
+            'values': list(self._values),
+            'lengths': int_column(len(value_keys) for value_keys in self._values.values()),
+            'keys': int_column(keys)
+        }
+
+    def load_state(self, state: dict) -> None:
+        try:
+            values, lengths, keys = state['values'], state['lengths'], state['keys']
+            if len(values) != len(lengths) or sum(lengths) != len(keys) or min(lengths, default=1) < 1:
+                raise ValueError('lengths of values and keys differ')
+            if not all(isinstance(value, str) for value in values):
+                raise ValueError('values are not strings')
+
+            keys = iter(keys)
+            self._values = {value: dict.fromkeys(islice(keys, length)) for value, length in zip(values, lengths)}
+        except (KeyError, TypeError, ValueError) as e:
+            self.clear()
+            raise ValueError(f'Invalid state of {self.signature()}: {e!r}') from e
+
+        self._grams, self._lengths = None, None
+
+    def remove(self, key: Hashable, value: Any) -> None:
+        value = self.field_value(value)
+        if value not in self._values:
+            return
+
+        keys = self._values[value]
+        keys.pop(key, None)
+
+        if not keys:
+            self._index_values()
+            del self._values[value]
+            for gram in self.grams(value):
+                self._grams[gram].pop(value, None)
+                if not self._grams[gram]:
+                    del self._grams[gram]
+            self._lengths[len(value)].pop(value, None)
+            if not self._lengths[len(value)]:
+                del self._lengths[len(value)]
+
+    def lookup(self, query: Any) -> List[Hashable]:
+        return list(self._values.get(query, ()))
+
+    def count(self, query: Any) -> int:
+        return len(self._values.get(query, ()))
+
+    def fuzzy_lookup(self, query: str, max_distance: int) -> List[Tuple[Hashable, int]]:
+        """
+        Get keys of objects which field value is within given edit distance from query.
+
+        :param query:
+            Value of field to search.
+        :param max_distance:
+            Maximum Levenshtein distance between query and value.
+
+        :return:
+            List of keys with distances sorted by distance.
+        """
+        if not isinstance(query, str):
+            return []
+
+        self._index_values()
+        query_lower = query.lower()
+        query_grams = self.grams(query)
+        min_common = len(query_grams) - self.GRAM_SIZE * max_distance
+
+        if min_common > 0:
+            counts = {}
+            for gram in query_grams:
+                for value in self._grams.get(gram, ()):
+                    counts[value] = counts.get(value, 0) + 1
+            candidates = [v for v, c in counts.items() if c >= min_common]
+        else:
+            candidates = [
+                v for length in range(max(0, len(query) - max_distance), len(query) + max_distance + 1)
+                for v in self._lengths.get(length, ())
+            ]
+
+        matches = []
+        for value in candidates:
+            distance = bounded_levenshtein(query_lower, value.lower(), max_distance)
+            if distance is not None:
+                matches.extend((key, distance) for key in self._values[value])
+
+        matches.sort(key=lambda match: match[1])
+        return matches
+
+    def clear(self) -> None:
+        self._values.clear()
+        self._grams, self._lengths = {}, {}
+
+
+class TextIndex(Index):
+    """
+    Inverted index of words of several fields for full-text search.
+    Index is not bound to one field, so it is never used for search by field value.
+    Every word is mapped to keys of objects containing it with amount of occurrences,
+    sorted list of distinct words is kept for prefix search. Postings restored
+    from saved state stay in flat arrays until the word is used.
+
+    :param fields:
+        Fields of stored objects to index.
+    :param max_expansions:
+        Maximum amount of words matched by prefix of the last query word.
+    """
+    TOKEN_PATTERN = re.compile(r'\w+')
+
+    def __init__(self, fields: Iterable[Hashable], max_expansions: int = 64):
+        super().__init__(field=None)
+        self.fields: Tuple[Hashable, ...] = tuple(fields)
+        self.max_expansions: int = max_expansions
+        self._postings: Dict[str, Dict[Hashable, int]] = {}
+        self._tokens: List[str] = []
+        self._size: int = 0
+        # Sorted words, offsets of their postings and flat arrays of keys and counts
+        # of saved state, postings of word are moved to _postings on first use.
+        self._restored: Optional[Tuple[List[str], List[int], Sequence, Sequence]] = None
+
+    def signature(self) -> str:
+        return f'{type(self).__name__}({self.fields!r})'
+
+    def _word_postings(self, token: str) -> Optional[Dict[Hashable, int]]:
+        """
+        Get postings of word or None if no object contains it.
+        Restored postings are taken from arrays on first use of word,
+        then they are kept in _postings, empty if the word was removed.
+        """
+        postings = self._postings.get(token)
+
+        if postings is None and self._restored is not None:
+            tokens, offsets, keys, counts = self._restored
+            i = bisect_left(tokens, token)
+
+            if i < len(tokens) and tokens[i] == token:
+                start, end = offsets[i], offsets[i + 1]
+                postings = self._postings[token] = dict(zip(keys[start:end], counts[start:end]))
+
+        return postings or None
+
+    def dump_state(self) -> dict:
+        # Most words are found in few objects, so postings of all words in order of words
+        # are kept in flat arrays of keys and counts with amount of postings of each word.
+        keys, counts, lengths = [], [], []
+        restored_tokens, offsets, restored_keys, restored_counts = self._restored or ([], [0], [], [])
+        i = 0
+
+        for token in self._tokens:
+            postings = self._postings.get(token)
+
+            if postings is None:
+                # Both lists are sorted, so unused restored word is found by moving forward.
+                i = bisect_left(restored_tokens, token, i)
+                start, end = offsets[i], offsets[i + 1]
+                keys.extend(restored_keys[start:end])
+                counts.extend(restored_counts[start:end])
+                lengths.append(end - start)
+            else:
+                keys.extend(postings)
+                counts.extend(postings.values())
+                lengths.append(len(postings))
+
+        return {
+            'size': self._size,
+            'tokens': list(self._tokens),
+            'lengths': int_column(lengths),
+            'keys': int_column(keys),
+            'counts': int_column(counts)
+        }
+
+    def load_state(self, state: dict) -> None:
+        try:
+            size, tokens, lengths = state['size'], state['tokens'], state['lengths']
+            keys, counts = state['keys'], state['counts']
+            if len(tokens) != len(lengths) or len(keys) != len(counts) or sum(lengths) != len(keys):
+                raise ValueError('lengths of postings differ')
+            if min(lengths, default=1) < 1:
+                raise ValueError('postings are empty')
+            if set(map(type, tokens)) - {str} or not is_increasing(tokens):
+                raise ValueError('words are not sorted strings')
+
+            offsets = list(accumulate(lengths, initial=0))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Invalid state of {self.signature()}: {e!r}') from e
+
+        if not isinstance(size, int):
+            raise ValueError(f'Invalid state of {self.signature()}: size is {size!r}')
+
+        self._size = size
+        self._postings = {}
+        self._tokens = list(tokens)
+        self._restored = (tokens, offsets, keys, counts)
+
+    @classmethod
+    def tokenize(cls, text: str) -> List[str]:
+        """
+        Split text to lowercase words. Text with several groups of digits
+        (like phone number) also gives all its digits as one word.
+
+        :param text:
+            Text to split.
+        """
+        tokens = cls.TOKEN_PATTERN.findall(text.lower())
+
+        digits = [t for t in tokens if t.isdigit()]
+        if len(digits) > 1:
+            tokens.append(''.join(digits))
+
+        return tokens
+
+    def object_tokens(self, value: Any) -> List[str]:
+        if not isinstance(value, dict):
+            return []
+
+        tokens = []
+        for field in self.fields:
+            field_value = value.get(field)
+            if isinstance(field_value, str):
+                tokens.extend(self.tokenize(field_value))
+
+        return tokens
+
+    def insert(self, key: Hashable, value: Any) -> None:
+        tokens = self.object_tokens(value)
+        if not tokens:
+            return
+
+        self._size += 1
+        for token in tokens:
+            postings = self._word_postings(token)
+
+            if postings is None:
+                postings = self._postings[token] = {}
+                insort(self._tokens, token)
+
+            postings[key] = postings.get(key, 0) + 1
+
+    def build(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        # Words are sorted once instead of inserting each new one into sorted list.
+        for key, value in items:
+            tokens = self.object_tokens(value)
+            if not tokens:
+                continue
+
+            self._size += 1
+            for token in tokens:
+                postings = self._postings.setdefault(token, {})
+                postings[key] = postings.get(key, 0) + 1
+
+        self._tokens = sorted(self._postings)
+
+    def remove(self, key: Hashable, value: Any) -> None:
+        tokens = self.object_tokens(value)
+        if not tokens:
+            return
+
+        self._size -= 1
+        for token in set(tokens):
+            postings = self._word_postings(token)
+            if postings is None:
+                continue
+
+            postings.pop(key, None)
+
+            if not postings:
+                # Empty postings of restored word are kept, so it is not taken from arrays again.
+                if self._restored is None:
+                    del self._postings[token]
+                del self._tokens[bisect_left(self._tokens, token)]
+
+    def lookup(self, query: Any) -> List[Hashable]:
+        return [key for key, _ in self.search(query)]
+
+    def _term_weights(self, token: str, prefix: bool) -> Dict[Hashable, float]:
+        """
+        Get keys of objects containing word (or word with given prefix) with their weights.
+        """
+        if not prefix:
+            postings = self._word_postings(token) or {}
+            idf = log(1 + self._size / len(postings)) if postings else 0
+            return {key: count * idf for key, count in postings.items()}
+
+        weights = {}
+        start = bisect_left(self._tokens, token)
+        for word in self._tokens[start:start + self.max_expansions]:
+            if not word.startswith(token):
+                break
+
+            postings = self._word_postings(word)
+            # Exact word is more relevant than the word only starting with prefix.
+            idf = log(1 + self._size / len(postings)) * (1 if word == token else 0.5)
+            for key, count in postings.items():
+                weights[key] = max(weights.get(key, 0), count * idf)
+
+        return weights
+
+    def search(self, text: str, limit: Optional[int] = None, prefix: bool = True) -> List[Tuple[Hashable, float]]:
+        """
+        Get keys of objects containing all words of text, sorted by relevance (TF-IDF).
+
+        :param text:
+            Text to search.
+        :param limit:
+            Maximum amount of results, None to get all of them.
+        :param prefix:
+            Match the last word of text as prefix.
+
+        :return:
+            List of keys with their scores.
+        """
+        tokens = list(dict.fromkeys(self.tokenize(text))) if isinstance(text, str) else []
+        if not tokens:
+            return []
+
+        terms = [
+            self._term_weights(token, prefix=prefix and i == len(tokens) - 1)
+            for i, token in enumerate(tokens)
+        ]
+        terms.sort(key=len)
+
+        scores = dict(terms[0])
+        for term in terms[1:]:
+            scores = {key: score + term[key] for key, score in scores.items() if key in term}
+            if not scores:
+                return []
+
+        if limit is None:
+            return sorted(scores.items(), key=lambda item: -item[1])
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._tokens.clear()
+        self._size = 0
+        self._restored = None
+
+
+class SortedIndex(Index):
+    """
+    Index keeping keys of objects ordered by field value for sorted listing.
+    Entries are kept in a list sorted with bisect, so page of sorted keys
+    is taken by slicing without sorting all objects. Objects without
+    value of field go after all others.
+
+    :param field:
+        Field of stored objects to order by.
+    """
+    def __init__(self, field: Hashable):
+        super().__init__(field=field)
+        self._entries: List[Tuple] = []
+
+    @staticmethod
+    def sort_key(field_value: Any) -> Tuple:
+        return (field_value is None, '' if field_value is None else field_value)
+
+    def _entry(self, key: Hashable, value: Any) -> Tuple:
+        return (*self.sort_key(self.field_value(value)), key)
+
+    def insert(self, key: Hashable, value: Any) -> None:
+        if isinstance(value, dict):
+            insort(self._entries, self._entry(key, value))
+
+    def dump_state(self) -> dict:
+        # Entries without value go last, so only values of the first entries are saved
+        # and entries are kept as flat lists of values and keys.
+        return {
+            'values': [value for missing, value, _ in self._entries if not missing],
+            'keys': int_column(key for _, _, key in self._entries)
+        }
+
+    def load_state(self, state: dict) -> None:
+        try:
+            values, keys = state['values'], state['keys']
+            if len(values) > len(keys):
+                raise ValueError('there are more values than keys')
+
+            entries = list(zip(repeat(False), values, keys))
+            entries.extend(zip(repeat(True), repeat(''), keys[len(values):]))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f'Invalid state of {self.signature()}: {e!r}') from e
+
+        # Saved entries are checked to be sorted, bisect on unsorted list would give wrong pages.
+        try:
+            unsorted = any(map(gt, entries, islice(entries, 1, None)))
+        except TypeError:
+            unsorted = True
+
+        if unsorted:
+            raise ValueError(f'Invalid state of {self.signature()}: entries are not sorted')
+
+        self._entries = entries
+
+    def build(self, items: Iterable[Tuple[Hashable, Any]]) -> None:
+        self._entries = sorted(self._entry(key, value) for key, value in items if isinstance(value, dict))
+
+    def remove(self, key: Hashable, value: Any) -> None:
+        if not isinstance(value, dict):
+            return
+
+        entry = self._entry(key, value)
+        i = bisect_left(self._entries, entry)
+
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def lookup(self, query: Any) -> List[Hashable]:
+        sort_key = self.sort_key(query)
+        i = bisect_left(self._entries, sort_key)
+
+        keys = []
+        while i < len(self._entries) and self._entries[i][:2] == sort_key:
+            keys.append(self._entries[i][2])
+            i += 1
+
+        return keys
+
+    def count(self, query: Any) -> int:
+        sort_key = self.sort_key(query)
+        return bisect_right(self._entries, sort_key, key=itemgetter(0, 1)) - bisect_left(self._entries, sort_key)
+
+    def _prefix_bounds(self, prefix: str) -> Tuple[int, int]:
+        # Every string starting with prefix is less than prefix followed by the last code point.
+        return (
+            bisect_left(self._entries, (False, prefix)),
+            bisect_left(self._entries, (False, prefix + '\U0010ffff'))
+        )
+
+    def prefix_lookup(self, prefix: str) -> List[Hashable]:
+        """
+        Get keys of objects which string field value starts with prefix,
+        in order of field value.
+
+        :param prefix:
+            Case-sensitive beginning of value.
+        """
+        start, end = self._prefix_bounds(prefix)
+        return [entry[2] for entry in self._entries[start:end]]
+
+    def prefix_count(self, prefix: str) -> int:
+        """
+        Get amount of objects which string field value starts with prefix.
+        """
+        start, end = self._prefix_bounds(prefix)
+        return end - start
+
+    def page(self, offset: int = 0, limit: Optional[int] = None, descending: bool = False) -> List[Hashable]:
+        """
+        Get keys of objects in order of field value.
+
+        :param offset:
+            Amount of keys to skip.
+        :param limit:
+            Maximum amount of keys, None to get all of them.
+        :param descending:
+            Order from the largest value to the smallest one.
+        """
+        if not descending:
+            end = None if limit is None else offset + limit
+            return [entry[2] for entry in self._entries[offset:end]]
+
+        end = max(len(self._entries) - offset, 0)
+        start = 0 if limit is None else max(end - limit, 0)
+        return [entry[2] for entry in reversed(self._entries[start:end])]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
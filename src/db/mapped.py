@@ -0,0 +1,210 @@
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping, ItemsView, KeysView
+from hashlib import blake2b
+from io import UnsupportedOperation
+from os.path import basename
+from pathlib import Path
+from typing import Any, Hashable, Iterator, Optional, Callable, Tuple
+
+# Binary snapshot layout, all numbers are little-endian:
+# header - magic, amount of records, offset of records, offset of key table;
+# records - length of key JSON, length of value JSON, key JSON, value JSON;
+# key table - hash of key JSON and offset of record, sorted by hash.
+MAGIC = b'PBMAP001'
+HEADER = struct.Struct('<8sQQQ')
+RECORD_HEADER = struct.Struct('<II')
+TABLE_ENTRY = struct.Struct('<QQ')
+
+
+def key_hash(key_json: bytes) -> int:
+    """
+    Get stable across processes 64-bit hash of serialized key.
+    """
+    return int.from_bytes(blake2b(key_json, digest_size=8).digest(), 'little')
+
+
+def write_mapped(location: str | Path, data: Mapping) -> None:
+    """
+    Write binary snapshot of data to be opened by MappedData.
+    File is written to temporary one and then replaces old snapshot,
+    so processes which have mapped old one keep reading it.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of binary snapshot to write.
+    :param data:
+        Mapping to write.
+    """
+    tmp_location = f'{location}.tmp'
+    table = []
+
+    with open(tmp_location, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, 0, HEADER.size, 0))
+        offset = HEADER.size
+
+        for key, value in data.items():
+            key_json = json.dumps(key).encode()
+            value_json = json.dumps(value).encode()
+
+            table.append((key_hash(key_json), offset))
+            file.write(RECORD_HEADER.pack(len(key_json), len(value_json)))
+            file.write(key_json)
+            file.write(value_json)
+            offset += RECORD_HEADER.size + len(key_json) + len(value_json)
+
+        table.sort()
+        file.write(b''.join(TABLE_ENTRY.pack(h, o) for h, o in table))
+
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, len(table), HEADER.size, offset))
+
+    os.replace(tmp_location, location)
+
+
+class MappedData(Mapping):
+    """
+    Read-only mapping over binary snapshot mapped to memory.
+    Opening reads only the header, records are decoded on access,
+    so several processes mapping the same file share OS page cache
+    instead of keeping own parsed copies of data.
+
+    :param location:
+        Path of binary snapshot written by write_mapped.
+    :param object_hook:
+        Object hook of json.loads used to decode values.
+    """
+    def __init__(self, location: str | Path, object_hook: Optional[Callable] = None):
+        self.location: str | Path = location
+        self.object_hook: Optional[Callable] = object_hook
+
+        with open(location, 'rb') as file:
+            self._mmap: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count, self._records_offset, self._table_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{location} is not a binary snapshot")
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _record(self, offset: int) -> Tuple[int, int, int]:
+        """
+        Get offset of key JSON and lengths of key and value JSON of record.
+        """
+        key_length, value_length = RECORD_HEADER.unpack_from(self._mmap, offset)
+        return offset + RECORD_HEADER.size, key_length, value_length
+
+    def _find(self, key: Hashable) -> Optional[int]:
+        """
+        Binary search of record by key hash in key table.
+
+        :return:
+            Offset of record or None if there is no such key.
+        """
+        key_json = json.dumps(key).encode()
+        target = key_hash(key_json)
+
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if TABLE_ENTRY.unpack_from(self._mmap, self._table_offset + middle * TABLE_ENTRY.size)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+
+        for i in range(low, self._count):
+            entry_hash, offset = TABLE_ENTRY.unpack_from(self._mmap, self._table_offset + i * TABLE_ENTRY.size)
+            if entry_hash != target:
+                break
+
+            start, key_length, _ = self._record(offset)
+            if self._mmap[start:start + key_length] == key_json:
+                return offset
+
+        return None
+
+    def _decode_value(self, offset: int) -> Any:
+        start, key_length, value_length = self._record(offset)
+        start += key_length
+        return json.loads(self._mmap[start:start + value_length], object_hook=self.object_hook)
+
+    def _iter_records(self) -> Iterator[Tuple[Hashable, int]]:
+        """
+        Walk records in the order they were written.
+
+        :return:
+            Iterator of keys and offsets of records.
+        """
+        offset = self._records_offset
+
+        for _ in range(self._count):
+            start, key_length, value_length = self._record(offset)
+            yield json.loads(self._mmap[start:start + key_length]), offset
+            offset = start + key_length + value_length
+
+    def partition_items(self, index: int, parts: int) -> Iterator[Tuple[Hashable, Any]]:
+        """
+        Decode one of several equal contiguous parts of records, records before it
+        are skipped by their headers without decoding.
+
+        :param index:
+            Index of part from 0.
+        :param parts:
+            Amount of parts.
+        """
+        start, end = self._count * index // parts, self._count * (index + 1) // parts
+        offset = self._records_offset
+
+        for i in range(end):
+            record_start, key_length, value_length = self._record(offset)
+
+            if i >= start:
+                key = json.loads(self._mmap[record_start:record_start + key_length])
+                yield key, self._decode_value(offset)
+
+            offset = record_start + key_length + value_length
+
+    def __getitem__(self, key: Hashable) -> Any:
+        offset = self._find(key)
+
+        if offset is None:
+            raise KeyError(key)
+
+        return self._decode_value(offset)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._find(key) is not None
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return (key for key, _ in self._iter_records())
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __setitem__(self, key: Hashable, value: Any):
+        raise UnsupportedOperation(f"{basename(self.location)} is a read-only binary snapshot")
+
+    def __delitem__(self, key: Hashable):
+        raise UnsupportedOperation(f"{basename(self.location)} is a read-only binary snapshot")
+
+    def pop(self, key: Hashable, default: Any = None):
+        raise UnsupportedOperation(f"{basename(self.location)} is a read-only binary snapshot")
+
+    def keys(self) -> KeysView:
+        return KeysView(self)
+
+    def items(self) -> ItemsView:
+        return MappedItems(self)
+
+
+class MappedItems(ItemsView):
+    """
+    Items of MappedData decoded sequentially instead of looking up each key.
+    """
+    def __iter__(self) -> Iterator[Tuple[Hashable, Any]]:
+        for key, offset in self._mapping._iter_records():
+            yield key, self._mapping._decode_value(offset)
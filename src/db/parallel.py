@@ -0,0 +1,275 @@
+import asyncio
+import itertools
+import multiprocessing
+import os
+from multiprocessing.connection import Connection as Pipe
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Tuple, Container
+
+from db.mapped import MappedData, write_mapped
+from db.query import CompiledQuery, is_flat
+from logger.logs import logger
+
+
+class WorkerFailed(Exception):
+    pass
+
+
+def serve_partition(conn: Pipe, index: int, parts: int) -> None:
+    """
+    Main function of scan worker process. Worker keeps decoded part of records
+    of binary snapshot and answers scan requests of parent process by the pipe.
+
+    Requests are tuples of operation, request ID and arguments:
+    "prepare" decodes part of new snapshot and answers with amount of its records,
+    "switch" starts scanning the prepared snapshot, "scan" answers with
+    generation of scanned snapshot and matched keys, "close" stops worker.
+    Requests are answered in order they were sent.
+
+    :param conn:
+        Pipe to parent process.
+    :param index:
+        Index of part of records from 0.
+    :param parts:
+        Amount of parts.
+    """
+    generation, partition, nested_keys = None, {}, set()
+    staged = None
+
+    while True:
+        try:
+            operation, request_id, args = conn.recv()
+        except EOFError:
+            return
+
+        if operation == 'close':
+            return
+
+        try:
+            if operation == 'prepare':
+                new_generation, location = args
+                mapped = MappedData(location)
+                try:
+                    staged = (new_generation, dict(mapped.partition_items(index, parts)))
+                finally:
+                    mapped.close()
+                conn.send((request_id, True, len(staged[1])))
+            elif operation == 'switch':
+                generation, partition = staged
+                nested_keys = {k for k, v in partition.items() if not is_flat(v)}
+                staged = None
+            elif operation == 'scan':
+                keys = CompiledQuery(args).filter(partition.items(), nested_keys)
+                conn.send((request_id, True, (generation, keys)))
+        except Exception as e:
+            conn.send((request_id, False, repr(e)))
+
+
+class ParallelScanner:
+    """
+    Pool of worker processes scanning parts of data for Database.search.
+    Data is written to binary snapshot which every worker maps and decodes
+    its own contiguous part of, so a scan is split across cores and event loop
+    only merges matched keys. Keys changed after the snapshot was taken
+    are excluded from worker results and checked by parent process,
+    the snapshot is refreshed in background when too many keys are changed.
+
+    :param location:
+        Path of binary snapshot for workers.
+    :param data:
+        Stored objects of Database.
+    :param workers:
+        Amount of worker processes, amount of CPUs if None.
+    :param refresh_after:
+        Amount of mutations to refresh the snapshot after.
+    """
+    def __init__(self, location: str | Path, data: Mapping, workers: Optional[int] = None, refresh_after: int = 10000):
+        self.location: str | Path = location
+        self.data: Mapping = data
+        self.workers: int = workers or os.cpu_count()
+        self.refresh_after: int = refresh_after
+        self.broken: bool = False
+        self.generation: int = 0
+        self._processes: List[multiprocessing.Process] = []
+        self._pipes: List[Pipe] = []
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._seq: int = 0
+        self._changes: Dict[Hashable, int] = {}
+        self._generation_seqs: Dict[int, int] = {}
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Start worker processes and load the first snapshot to them.
+        """
+        loop = asyncio.get_running_loop()
+        # Spawned workers don't inherit threads and locks of the server process.
+        context = multiprocessing.get_context('spawn')
+
+        for index in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=serve_partition,
+                args=(child_conn, index, self.workers),
+                name=f'scan-worker-{index}',
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+
+            self._processes.append(process)
+            self._pipes.append(parent_conn)
+            loop.add_reader(parent_conn.fileno(), self._receive, parent_conn)
+
+        await self.refresh()
+
+    async def close(self) -> None:
+        if self._refresh is not None:
+            self._refresh.cancel()
+
+        loop = asyncio.get_running_loop()
+
+        for conn in self._pipes:
+            loop.remove_reader(conn.fileno())
+            try:
+                conn.send(('close', None, None))
+            except OSError:
+                pass
+            conn.close()
+
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.kill()
+
+        self._fail_pending(WorkerFailed("Parallel scanner is closed"))
+        self._processes, self._pipes = [], []
+
+        for path in (Path(self.location), Path(f'{self.location}.tmp')):
+            path.unlink(missing_ok=True)
+
+    def _receive(self, conn: Pipe) -> None:
+        """
+        Read answers of worker available in pipe and resolve their futures.
+        """
+        try:
+            while conn.poll():
+                request_id, ok, result = conn.recv()
+                future = self._pending.pop(request_id, None)
+
+                if future is None or future.done():
+                    continue
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(WorkerFailed(result))
+        except (EOFError, OSError) as e:
+            asyncio.get_running_loop().remove_reader(conn.fileno())
+            self.broken = True
+            self._fail_pending(WorkerFailed(f"Scan worker stopped: {e!r}"))
+
+    def _fail_pending(self, exc: Exception) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+
+    def _send_all(self, operation: str, args: Any = None, answer: bool = True) -> List[asyncio.Future]:
+        """
+        Send the same request to all workers at once. Sending never yields to event loop,
+        so requests of one call are queued in the same order in all workers.
+        """
+        if self.broken:
+            raise WorkerFailed("Scan worker stopped")
+
+        loop = asyncio.get_running_loop()
+        futures = []
+
+        for conn in self._pipes:
+            request_id = next(self._request_ids)
+
+            if answer:
+                futures.append(self._pending.setdefault(request_id, loop.create_future()))
+
+            try:
+                conn.send((operation, request_id, args))
+            except OSError as e:
+                self.broken = True
+                self._fail_pending(WorkerFailed(f"Scan worker stopped: {e!r}"))
+                raise WorkerFailed(f"Scan worker stopped: {e!r}")
+
+        return futures
+
+    def changed(self, key: Hashable) -> None:
+        """
+        Register mutation of stored object, called by Database on every mutation.
+        Refresh of snapshot is started after refresh_after mutations since the current one.
+        """
+        self._seq += 1
+        self._changes[key] = self._seq
+
+        if (
+            self._seq - self._generation_seqs.get(self.generation, 0) >= self.refresh_after
+            and not self.broken
+            and (self._refresh is None or self._refresh.done())
+        ):
+            self._refresh = asyncio.create_task(self._refresh_logged())
+
+    async def _refresh_logged(self) -> None:
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger['error'].error(f'Refresh of parallel scan snapshot {self.location} failed: {repr(e)}')
+
+    async def refresh(self) -> None:
+        """
+        Write current data to new snapshot and switch workers to it.
+        Data is copied on the event loop (stored objects are replaced on mutation,
+        so shallow copy is consistent) and written in a worker thread.
+        """
+        generation = self.generation + 1
+        seq = self._seq
+        snapshot = dict(self.data)
+
+        await asyncio.get_running_loop().run_in_executor(None, write_mapped, self.location, snapshot)
+        await asyncio.gather(*self._send_all('prepare', (generation, str(self.location))))
+
+        # Scans sent before the switch are answered from the previous generation,
+        # so changes made after it was taken are kept until the next switch.
+        self._send_all('switch', generation, answer=False)
+        previous_seq = self._generation_seqs.get(self.generation, seq)
+        self._generation_seqs = {self.generation: previous_seq, generation: seq}
+        self.generation = generation
+        self._changes = {k: s for k, s in self._changes.items() if s > previous_seq}
+
+    async def scan(self, query: List[Tuple], nested_keys: Optional[Container] = None) -> List[Hashable]:
+        """
+        Find keys of objects matching pairs of query by plain field lookup
+        (deep search for nested objects) in all parts at once.
+
+        :param query:
+            List of tuples with key-value pair represents query to find.
+        :param nested_keys:
+            Keys of current objects that may have nested dicts or lists.
+
+        :raises WorkerFailed:
+            If any worker failed or stopped.
+        """
+        results = await asyncio.gather(*self._send_all('scan', query))
+
+        generation = results[0][0]
+        seq = self._generation_seqs.get(generation)
+
+        if seq is None:
+            raise WorkerFailed(f"Changes since snapshot {generation} are not tracked anymore")
+
+        changed = {key for key, s in self._changes.items() if s > seq}
+
+        keys = [key for _, part in results for key in part if key not in changed]
+
+        if changed:
+            data = self.data
+            keys.extend(CompiledQuery(query).filter([(k, data[k]) for k in changed if k in data], nested_keys))
+
+        return keys
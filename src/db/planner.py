@@ -0,0 +1,328 @@
+import time
+from math import log2
+from typing import Any, Hashable, List, Optional, Mapping, Tuple
+
+from db.indexes import Index, SortedIndex, TextIndex
+from db.query import Predicate, Comparison, Eq, In, Prefix, And, Or
+
+# Relative costs of plan operations per object.
+INDEX_ROW_COST = 0.1
+FETCH_ROW_COST = 1.0
+SCAN_ROW_COST = 0.5
+MATCH_COST = 1.0
+
+# Selectivity of conditions which can't be estimated by index.
+DEFAULT_SELECTIVITY = {Eq: 0.01, In: 0.03, Prefix: 0.05}
+CONTAINS_SELECTIVITY = 0.1
+
+
+class PlanNode:
+    """
+    Step of query plan producing keys of matched objects.
+    Estimates are computed when plan is built, actual amount of rows
+    and time are recorded when plan is executed.
+
+    :param predicate:
+        Condition all produced keys satisfy, None for all objects.
+    :param estimated_rows:
+        Estimated amount of produced keys.
+    :param cost:
+        Estimated cost of the step with its children.
+    """
+    OPERATION = None
+
+    def __init__(self, predicate: Optional[Predicate], estimated_rows: float, cost: float):
+        self.predicate: Optional[Predicate] = predicate
+        self.estimated_rows: float = estimated_rows
+        self.cost: float = cost
+        self.actual_rows: Optional[int] = None
+        self.seconds: Optional[float] = None
+        self.children: List[PlanNode] = []
+
+    def execute(self) -> List[Hashable]:
+        started = time.perf_counter()
+        keys = self._execute()
+        self.seconds = time.perf_counter() - started
+        self.actual_rows = len(keys)
+        return keys
+
+    def _execute(self) -> List[Hashable]:
+        raise NotImplementedError
+
+    def explain(self) -> dict:
+        """
+        Describe the step and its children, actual values are None if plan was not executed.
+        """
+        info = {
+            'operation': self.OPERATION,
+            'predicate': None if self.predicate is None else str(self.predicate),
+            'estimated_rows': round(self.estimated_rows),
+            'actual_rows': self.actual_rows,
+            'cost': round(self.cost, 1),
+            'time_ms': None if self.seconds is None else round(self.seconds * 1000, 3)
+        }
+
+        if self.children:
+            info['children'] = [child.explain() for child in self.children]
+
+        return info
+
+
+class IndexLookup(PlanNode):
+    """
+    Keys of objects with field equal to any of values taken from index.
+    """
+    OPERATION = 'index_lookup'
+
+    def __init__(self, predicate: Comparison, index_name: Hashable, index: Index, values: List[Any], rows: int):
+        super().__init__(
+            predicate=predicate,
+            estimated_rows=rows,
+            cost=len(values) + rows * INDEX_ROW_COST
+        )
+        self.index_name: Hashable = index_name
+        self.index: Index = index
+        self.values: List[Any] = values
+
+    def _execute(self) -> List[Hashable]:
+        if len(self.values) == 1:
+            return self.index.lookup(self.values[0])
+
+        return list(dict.fromkeys(key for value in self.values for key in self.index.lookup(value)))
+
+    def explain(self) -> dict:
+        return dict(super().explain(), index=self.index_name)
+
+
+class IndexRange(PlanNode):
+    """
+    Keys of objects with field starting with prefix taken from SortedIndex.
+    """
+    OPERATION = 'index_range'
+
+    def __init__(self, predicate: Prefix, index_name: Hashable, index: SortedIndex, rows: int):
+        super().__init__(
+            predicate=predicate,
+            estimated_rows=rows,
+            cost=2 * log2(len(index) + 2) + rows * INDEX_ROW_COST
+        )
+        self.index_name: Hashable = index_name
+        self.index: SortedIndex = index
+
+    def _execute(self) -> List[Hashable]:
+        return self.index.prefix_lookup(self.predicate.value)
+
+    def explain(self) -> dict:
+        return dict(super().explain(), index=self.index_name)
+
+
+class Union(PlanNode):
+    """
+    Keys produced by any of children, without duplicates.
+    """
+    OPERATION = 'union'
+
+    def __init__(self, predicate: Or, children: List[PlanNode], size: int):
+        super().__init__(
+            predicate=predicate,
+            estimated_rows=min(sum(child.estimated_rows for child in children), size),
+            cost=sum(child.cost + child.estimated_rows * INDEX_ROW_COST for child in children)
+        )
+        self.children = children
+
+    def _execute(self) -> List[Hashable]:
+        return list(dict.fromkeys(key for child in self.children for key in child.execute()))
+
+
+class Filter(PlanNode):
+    """
+    Keys produced by child which objects satisfy residual condition.
+    """
+    OPERATION = 'filter'
+
+    def __init__(self, predicate: Predicate, child: PlanNode, data: Mapping, selectivity: float):
+        super().__init__(
+            predicate=predicate,
+            estimated_rows=child.estimated_rows * selectivity,
+            cost=child.cost + child.estimated_rows * (FETCH_ROW_COST + MATCH_COST * len(predicate.leaves()))
+        )
+        self.children = [child]
+        self.data: Mapping = data
+
+    def _execute(self) -> List[Hashable]:
+        data, match = self.data, self.predicate.match
+        return [key for key in self.children[0].execute() if match(data[key])]
+
+
+class Scan(PlanNode):
+    """
+    Keys of all objects satisfying condition found by visiting every object.
+    """
+    OPERATION = 'scan'
+
+    def __init__(self, predicate: Optional[Predicate], data: Mapping, selectivity: float):
+        leaves = 0 if predicate is None else len(predicate.leaves())
+        super().__init__(
+            predicate=predicate,
+            estimated_rows=len(data) * selectivity,
+            cost=len(data) * (SCAN_ROW_COST + MATCH_COST * leaves)
+        )
+        self.data: Mapping = data
+
+    def _execute(self) -> List[Hashable]:
+        if self.predicate is None:
+            return list(self.data)
+
+        match = self.predicate.match
+        return [key for key, value in self.data.items() if match(value)]
+
+
+class QueryPlanner:
+    """
+    Cost-based planner choosing between index access and full scan for predicate.
+    Conditions on indexed fields are estimated by exact counts of their indexes,
+    others by default selectivity, conditions are assumed to be independent.
+    Conjunction is driven by its cheapest indexable condition and the rest
+    of conditions are checked on found objects, disjunction uses indexes only
+    if all its conditions are indexable, and any plan is replaced by scan
+    if scan is estimated to be cheaper.
+
+    :param data:
+        Stored objects.
+    :param indexes:
+        Registered indexes by their names.
+    """
+    def __init__(self, data: Mapping, indexes: Mapping[Hashable, Index]):
+        self.data: Mapping = data
+        self.indexes: Mapping[Hashable, Index] = indexes
+
+    def field_index(self, field: Hashable) -> Optional[Tuple[Hashable, Index]]:
+        """
+        Get name and index for equality lookup by field: index named after the field
+        or SortedIndex over it.
+        """
+        index = self.indexes.get(field)
+        if index is not None and index.field == field and not isinstance(index, TextIndex):
+            return field, index
+
+        return self.sorted_index(field)
+
+    def sorted_index(self, field: Hashable) -> Optional[Tuple[Hashable, SortedIndex]]:
+        """
+        Get name and SortedIndex over field.
+        """
+        for name, index in self.indexes.items():
+            if isinstance(index, SortedIndex) and index.field == field:
+                return name, index
+
+        return None
+
+    def plan(self, predicate: Optional[Predicate]) -> PlanNode:
+        """
+        Build the cheapest plan of finding keys of objects satisfying predicate.
+
+        :param predicate:
+            Condition to satisfy, None to get all keys.
+        """
+        if predicate is None:
+            return Scan(predicate=None, data=self.data, selectivity=1)
+
+        for leaf in predicate.leaves():
+            if isinstance(leaf, (Eq, In)):
+                index = self.field_index(leaf.field)
+                normalize = None if index is None else getattr(index[1], 'normalize', None)
+                if normalize is not None:
+                    leaf.bind(normalize)
+
+        scan = Scan(predicate=predicate, data=self.data, selectivity=self.selectivity(predicate))
+        indexed = self.index_plan(predicate)
+
+        return indexed if indexed is not None and indexed.cost < scan.cost else scan
+
+    def selectivity(self, predicate: Predicate) -> float:
+        """
+        Estimate fraction of objects satisfying predicate.
+        """
+        size = max(len(self.data), 1)
+
+        if isinstance(predicate, And):
+            result = 1.0
+            for child in predicate.children:
+                result *= self.selectivity(child)
+            return result
+
+        if isinstance(predicate, Or):
+            result = 1.0
+            for child in predicate.children:
+                result *= 1 - self.selectivity(child)
+            return 1 - result
+
+        if isinstance(predicate, (Eq, In)):
+            index = self.field_index(predicate.field)
+            if index is None:
+                return DEFAULT_SELECTIVITY[type(predicate)]
+            index = index[1]
+            values = [predicate.value] if isinstance(predicate, Eq) else predicate.value
+            return min(sum(index.count(v) for v in values) / size, 1.0)
+
+        if isinstance(predicate, Prefix):
+            index = self.sorted_index(predicate.field)
+            if index is None or not isinstance(predicate.value, str):
+                return DEFAULT_SELECTIVITY[Prefix]
+            return index[1].prefix_count(predicate.value) / size
+
+        return CONTAINS_SELECTIVITY
+
+    def index_plan(self, predicate: Predicate) -> Optional[PlanNode]:
+        """
+        Build plan producing exactly the keys of objects satisfying predicate
+        with use of indexes, None if predicate can't be found by indexes.
+        """
+        if isinstance(predicate, (Eq, In)):
+            index = self.field_index(predicate.field)
+            if index is None:
+                return None
+
+            name, index = index
+            values = [predicate.value] if isinstance(predicate, Eq) else predicate.value
+            return IndexLookup(
+                predicate=predicate,
+                index_name=name,
+                index=index,
+                values=values,
+                rows=sum(index.count(v) for v in values)
+            )
+
+        if isinstance(predicate, Prefix):
+            index = self.sorted_index(predicate.field)
+            if index is None or not isinstance(predicate.value, str):
+                return None
+
+            name, index = index
+            return IndexRange(
+                predicate=predicate,
+                index_name=name,
+                index=index,
+                rows=index.prefix_count(predicate.value)
+            )
+
+        if isinstance(predicate, Or):
+            children = [self.index_plan(child) for child in predicate.children]
+            if any(child is None for child in children):
+                return None
+
+            return Union(predicate=predicate, children=children, size=len(self.data))
+
+        if isinstance(predicate, And):
+            candidates = [(self.index_plan(child), child) for child in predicate.children]
+            candidates = [(plan, child) for plan, child in candidates if plan is not None]
+            if not candidates:
+                return None
+
+            driver, driver_predicate = min(candidates, key=lambda candidate: candidate[0].cost)
+            rest = [child for child in predicate.children if child is not driver_predicate]
+            residual = rest[0] if len(rest) == 1 else And(rest)
+
+            return Filter(predicate=residual, child=driver, data=self.data, selectivity=self.selectivity(residual))
+
+        return None
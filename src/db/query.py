@@ -0,0 +1,365 @@
+import json
+import re
+from operator import itemgetter
+from typing import Any, Callable, Hashable, Iterable, List, Optional, Sequence, Tuple, Container
+
+from db.exceptions import InvalidQuery
+from db.utils import deep_search_by_pair
+
+# Marker of absent field of stored object.
+_MISSING = object()
+
+
+def is_flat(value: Any) -> bool:
+    """
+    Check that stored object is a dict without nested dicts and lists,
+    so its pairs can be found by plain field lookups.
+    """
+    return isinstance(value, dict) and not any(isinstance(v, (dict, list)) for v in value.values())
+
+
+class CompiledQuery:
+    """
+    Search query of key-value pairs compiled once into a single field lookup
+    and comparison per object. Flat objects are matched by their top-level
+    fields only, nested ones fall back to deep search of each pair.
+
+    :param query:
+        List of tuples with key-value pair represents query to find.
+    """
+    def __init__(self, query: Sequence[Tuple]):
+        self.query: List[Tuple] = list(query)
+        self._getter = itemgetter(*(field for field, _ in self.query))
+        self._expected = self.query[0][1] if len(self.query) == 1 else tuple(value for _, value in self.query)
+
+    def match_deep(self, value: Any) -> bool:
+        """
+        Match object with the pairs found at any level of nesting.
+        """
+        return isinstance(value, dict) and all(
+            deep_search_by_pair(key_value_pair=q, mapping=value) for q in self.query
+        )
+
+    def match(self, value: Any, nested: bool = True) -> bool:
+        """
+        Match one object.
+
+        :param value:
+            Stored object.
+        :param nested:
+            Object may have nested dicts or lists.
+        """
+        if isinstance(value, dict) and all(value.get(f, _MISSING) == v for f, v in self.query):
+            return True
+
+        return nested and self.match_deep(value)
+
+    def filter(self, items: Iterable[Tuple[Hashable, Any]], nested_keys: Optional[Container] = None) -> List[Hashable]:
+        """
+        Get keys of matched objects in one pass.
+        Objects are compared by plain lookup of all query fields at once,
+        objects of nested keys are searched deeply if the lookup didn't match.
+        If any object is not a dict or lacks a field, the pass is restarted
+        with per-object checks.
+
+        :param items:
+            Keys and objects to match, should be iterable twice.
+        :param nested_keys:
+            Keys of objects that may have nested dicts or lists, None if any object may have them.
+        """
+        getter, expected, match_deep = self._getter, self._expected, self.match_deep
+
+        try:
+            if nested_keys is None:
+                return [k for k, v in items if getter(v) == expected or match_deep(v)]
+            if not nested_keys:
+                return [k for k, v in items if getter(v) == expected]
+            return [k for k, v in items if getter(v) == expected or (k in nested_keys and match_deep(v))]
+        except (KeyError, TypeError, IndexError):
+            if nested_keys is None:
+                return [k for k, v in items if self.match(v)]
+            return [k for k, v in items if self.match(v, nested=k in nested_keys)]
+
+
+class Predicate:
+    """
+    Condition on top-level fields of stored objects, node of parsed "where" expression.
+    Objects which are not dicts never match.
+    """
+    def match(self, value: Any) -> bool:
+        raise NotImplementedError
+
+    def leaves(self) -> List["Comparison"]:
+        """
+        Get all field comparisons of the condition.
+        """
+        raise NotImplementedError
+
+
+class Comparison(Predicate):
+    """
+    Comparison of one field of object with query value.
+
+    :param field:
+        Field of stored objects.
+    :param value:
+        Query value.
+    """
+    OPERATOR = None
+
+    def __init__(self, field: Hashable, value: Any):
+        self.field: Hashable = field
+        self.value: Any = value
+
+    def leaves(self) -> List["Comparison"]:
+        return [self]
+
+    def __str__(self):
+        return f'{self.field} {self.OPERATOR} {json.dumps(self.value, ensure_ascii=False)}'
+
+
+class Eq(Comparison):
+    """
+    Field is equal to value. Values may be compared after normalization
+    of index over the field, so condition matches the same objects as index lookup.
+    """
+    OPERATOR = '='
+
+    def __init__(self, field: Hashable, value: Any):
+        super().__init__(field=field, value=value)
+        self.normalize: Optional[Callable[[Any], Any]] = None
+        self._expected: Any = value
+
+    def bind(self, normalize: Callable[[Any], Any]) -> None:
+        """
+        Compare normalized values, value normalized to None matches nothing.
+        """
+        self.normalize = normalize
+        self._expected = normalize(self.value)
+
+    def match(self, value: Any) -> bool:
+        if not isinstance(value, dict):
+            return False
+
+        if self.normalize is None:
+            return value.get(self.field, _MISSING) == self._expected
+
+        return self._expected is not None and self.normalize(value.get(self.field)) == self._expected
+
+
+class In(Comparison):
+    """
+    Field is equal to any of values.
+    """
+    OPERATOR = 'IN'
+
+    def __init__(self, field: Hashable, values: Sequence[Any]):
+        super().__init__(field=field, value=list(dict.fromkeys(values)))
+        self.options: List[Eq] = [Eq(field, v) for v in self.value]
+
+    def bind(self, normalize: Callable[[Any], Any]) -> None:
+        for option in self.options:
+            option.bind(normalize)
+
+    def match(self, value: Any) -> bool:
+        return any(option.match(value) for option in self.options)
+
+    def __str__(self):
+        return f"{self.field} IN ({', '.join(json.dumps(v, ensure_ascii=False) for v in self.value)})"
+
+
+class Prefix(Comparison):
+    """
+    String field starts with value, case-sensitive.
+    """
+    OPERATOR = '^='
+
+    def match(self, value: Any) -> bool:
+        field_value = value.get(self.field) if isinstance(value, dict) else None
+        return isinstance(field_value, str) and field_value.startswith(self.value)
+
+
+class Contains(Comparison):
+    """
+    String field contains value, case-sensitive.
+    """
+    OPERATOR = '*='
+
+    def match(self, value: Any) -> bool:
+        field_value = value.get(self.field) if isinstance(value, dict) else None
+        return isinstance(field_value, str) and self.value in field_value
+
+
+class And(Predicate):
+    """
+    All conditions are true.
+    """
+    def __init__(self, children: Sequence[Predicate]):
+        self.children: List[Predicate] = list(children)
+
+    def match(self, value: Any) -> bool:
+        return all(child.match(value) for child in self.children)
+
+    def leaves(self) -> List[Comparison]:
+        return [leaf for child in self.children for leaf in child.leaves()]
+
+    def __str__(self):
+        return ' AND '.join(f'({c})' if isinstance(c, Or) else str(c) for c in self.children)
+
+
+class Or(Predicate):
+    """
+    Any of conditions is true.
+    """
+    def __init__(self, children: Sequence[Predicate]):
+        self.children: List[Predicate] = list(children)
+
+    def match(self, value: Any) -> bool:
+        return any(child.match(value) for child in self.children)
+
+    def leaves(self) -> List[Comparison]:
+        return [leaf for child in self.children for leaf in child.leaves()]
+
+    def __str__(self):
+        return ' OR '.join(str(c) for c in self.children)
+
+
+_TOKEN_PATTERN = re.compile(r'''
+    \s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        |(?P<operator>\^=|\*=|=|\(|\)|,)
+        |(?P<word>[^\s()=,^*"']+)
+        |(?P<error>\S)
+    )
+''', re.VERBOSE)
+
+_KEYWORDS = ('AND', 'OR', 'IN')
+
+
+def _tokenize(text: str) -> List[Tuple[str, str]]:
+    tokens = []
+
+    for match in _TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+
+        token = match.group(kind)
+
+        if kind == 'error':
+            raise InvalidQuery(f"Unexpected character {token!r} at position {match.start(kind)}")
+        if kind == 'string':
+            token = re.sub(r'\\(.)', r'\1', token[1:-1])
+        elif kind == 'word' and token.upper() in _KEYWORDS:
+            kind, token = 'keyword', token.upper()
+
+        tokens.append((kind, token))
+
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive descent parser of "where" expression:
+
+        expression := term ("OR" term)*
+        term       := factor ("AND" factor)*
+        factor     := "(" expression ")" | field ("=" | "^=" | "*=") value | field "IN" "(" value ("," value)* ")"
+        value      := quoted string | word
+    """
+    def __init__(self, text: str):
+        self.tokens: List[Tuple[str, str]] = _tokenize(text)
+        self.position: int = 0
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, kind: str, token: Optional[str] = None) -> str:
+        actual_kind, actual_token = self.peek()
+
+        if actual_kind != kind or (token is not None and actual_token != token):
+            expected = token or kind
+            found = 'end of query' if actual_kind is None else repr(actual_token)
+            raise InvalidQuery(f"Expected {expected}, found {found}")
+
+        self.position += 1
+        return actual_token
+
+    def parse(self) -> Predicate:
+        predicate = self.expression()
+
+        if self.position < len(self.tokens):
+            raise InvalidQuery(f"Unexpected {self.tokens[self.position][1]!r}")
+
+        return predicate
+
+    def expression(self) -> Predicate:
+        children = [self.term()]
+        while self.peek() == ('keyword', 'OR'):
+            self.position += 1
+            children.append(self.term())
+
+        return children[0] if len(children) == 1 else Or(children)
+
+    def term(self) -> Predicate:
+        children = [self.factor()]
+        while self.peek() == ('keyword', 'AND'):
+            self.position += 1
+            children.append(self.factor())
+
+        return children[0] if len(children) == 1 else And(children)
+
+    def factor(self) -> Predicate:
+        if self.peek() == ('operator', '('):
+            self.position += 1
+            predicate = self.expression()
+            self.take('operator', ')')
+            return predicate
+
+        field = self.take('word')
+        kind, token = self.peek()
+
+        if (kind, token) == ('keyword', 'IN'):
+            self.position += 1
+            self.take('operator', '(')
+            values = [self.value()]
+            while self.peek() == ('operator', ','):
+                self.position += 1
+                values.append(self.value())
+            self.take('operator', ')')
+            return In(field, values)
+
+        comparisons = {'=': Eq, '^=': Prefix, '*=': Contains}
+        if kind != 'operator' or token not in comparisons:
+            raise InvalidQuery(f"Expected comparison operator after {field!r}")
+
+        self.position += 1
+        return comparisons[token](field, self.value())
+
+    def value(self) -> str:
+        kind, token = self.peek()
+
+        if kind not in ('string', 'word'):
+            raise InvalidQuery(f"Expected value, found {'end of query' if kind is None else repr(token)}")
+
+        self.position += 1
+        return token
+
+
+def parse_where(text: str) -> Predicate:
+    """
+    Parse "where" expression into predicate, e.g.
+    'first_name ^= "Jo" AND (organization IN ("A", "B") OR last_name *= son)'.
+    Supported comparisons are "=" (equal), "^=" (starts with), "*=" (contains) and "IN",
+    "AND" binds tighter than "OR", values with spaces or special characters are quoted.
+
+    :param text:
+        Expression to parse.
+
+    :raises InvalidQuery:
+        If expression has syntax error.
+    """
+    if not text or not text.strip():
+        raise InvalidQuery("Query is empty")
+
+    return _Parser(text).parse()
@@ -0,0 +1,392 @@
+import hashlib
+import json
+import lzma
+import os
+import zlib
+from pathlib import Path
+from typing import Optional, Iterator, Any, Iterable, Hashable, Tuple, List, Callable
+
+# Size of chunks in which snapshot is written to and read from disc.
+CHUNK_SIZE = 256 * 1024
+
+# Supported compressions of snapshot.
+COMPRESSIONS = ('zlib', 'lzma')
+
+# Magic bytes of xz container used by lzma compression.
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
+
+def detect_compression(head: bytes) -> Optional[str]:
+    """
+    Detect compression of snapshot by its first bytes.
+    Plain JSON can't start with the same bytes as zlib or xz stream.
+
+    :param head:
+        First bytes of snapshot.
+
+    :return:
+        Name of compression or None for plain JSON.
+    """
+    if head.startswith(XZ_MAGIC):
+        return 'lzma'
+
+    if len(head) >= 2 and head[0] == 0x78 and (head[0] * 256 + head[1]) % 31 == 0:
+        return 'zlib'
+
+    return None
+
+
+def make_compressor(compression: Optional[str], level: Optional[int] = None):
+    """
+    Create streaming compressor object.
+
+    :param compression:
+        Name of compression, None for no compression.
+    :param level:
+        Compression level, default one of compression if None.
+
+    :return:
+        Object with "compress" and "flush" methods or None.
+    """
+    if compression is None:
+        return None
+
+    if compression == 'zlib':
+        return zlib.compressobj(level if level is not None else zlib.Z_DEFAULT_COMPRESSION)
+
+    if compression == 'lzma':
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=level)
+
+    raise ValueError(f"Unsupported compression {compression}, use one of: {', '.join(COMPRESSIONS)}")
+
+
+def make_decompressor(compression: Optional[str]):
+    """
+    Create streaming decompressor object.
+
+    :param compression:
+        Name of compression, None for no compression.
+
+    :return:
+        Object with "decompress" method or None.
+    """
+    if compression is None:
+        return None
+
+    if compression == 'zlib':
+        return zlib.decompressobj()
+
+    if compression == 'lzma':
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+
+    raise ValueError(f"Unsupported compression {compression}, use one of: {', '.join(COMPRESSIONS)}")
+
+
+def json_key(key: Any) -> str:
+    """
+    Convert dict key to JSON object key the same way json.dumps does.
+    """
+    return json.dumps(key if isinstance(key, str) else json.dumps(key))
+
+
+def iter_json(data: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """
+    Serialize object to JSON text by parts of about given size.
+    Each record of dict is serialized separately with C JSON encoder,
+    so the whole text is never kept in memory.
+
+    :param data:
+        Object to serialize.
+    :param chunk_size:
+        Approximate amount of characters in each part.
+    """
+    if not isinstance(data, dict):
+        yield json.dumps(data)
+        return
+
+    parts = ['{']
+    size = 1
+    separator = ''
+
+    for key, value in data.items():
+        part = f'{separator}{json_key(key)}: {json.dumps(value)}'
+        parts.append(part)
+        size += len(part)
+        separator = ', '
+
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+
+    parts.append('}')
+    yield ''.join(parts)
+
+
+def encode_snapshot(
+        data: Any,
+        encoding: str = 'utf8',
+        compression: Optional[str] = None,
+        level: Optional[int] = None,
+        chunk_size: int = CHUNK_SIZE,
+        stats: Optional[dict] = None
+) -> Iterator[bytes]:
+    """
+    Serialize object to snapshot bytes by chunks ready to be written to disc.
+
+    :param data:
+        Object to serialize.
+    :param encoding:
+        Encoding of JSON text.
+    :param compression:
+        Name of compression, None to write plain JSON.
+    :param level:
+        Compression level.
+    :param chunk_size:
+        Approximate size of chunks.
+    :param stats:
+        Dict to put amount of serialized ("raw_bytes") and
+        written ("disk_bytes") bytes in.
+    """
+    compressor = make_compressor(compression, level)
+    raw_bytes = disk_bytes = 0
+
+    for text in iter_json(data, chunk_size=chunk_size):
+        chunk = text.encode(encoding)
+        raw_bytes += len(chunk)
+
+        if compressor is not None:
+            chunk = compressor.compress(chunk)
+
+        if chunk:
+            disk_bytes += len(chunk)
+            yield chunk
+
+    if compressor is not None:
+        chunk = compressor.flush()
+        disk_bytes += len(chunk)
+        yield chunk
+
+    if stats is not None:
+        stats.update(raw_bytes=raw_bytes, disk_bytes=disk_bytes)
+
+
+def write_snapshot(
+        location: str | Path,
+        data: Any,
+        stats: Optional[dict] = None,
+        replace: bool = False,
+        **kwargs
+) -> None:
+    """
+    Serialize object and write it to file replacing its content.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of file to write.
+    :param data:
+        Object to serialize.
+    :param stats:
+        Dict to put amount of serialized and written bytes in.
+    :param replace:
+        Write to temporary file and then replace the file with it,
+        so the file is never torn. Otherwise existing file is overwritten in place.
+    :param kwargs:
+        Arguments of encode_snapshot.
+    """
+    path = f'{location}.tmp' if replace else location
+
+    with open(path, 'wb' if replace else 'r+b') as file:
+        for chunk in encode_snapshot(data, stats=stats, **kwargs):
+            file.write(chunk)
+        file.truncate()
+
+    if replace:
+        os.replace(path, location)
+
+
+def write_backup(
+        location: str | Path,
+        data: Any,
+        stats: Optional[dict] = None,
+        **kwargs
+) -> str:
+    """
+    Serialize object to a new backup file by chunks and compute SHA-256 of written bytes.
+    Backup is written to temporary file which is renamed only when it is complete,
+    checksum is written next to it as "<location>.sha256" in format of sha256sum,
+    so backup can be verified with "sha256sum -c".
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of backup file.
+    :param data:
+        Object to serialize.
+    :param stats:
+        Dict to put amount of serialized and written bytes in.
+    :param kwargs:
+        Arguments of encode_snapshot.
+
+    :return:
+        Hex SHA-256 of backup file.
+    """
+    digest = hashlib.sha256()
+    path = f'{location}.tmp'
+
+    with open(path, 'wb') as file:
+        for chunk in encode_snapshot(data, stats=stats, **kwargs):
+            digest.update(chunk)
+            file.write(chunk)
+        file.flush()
+        os.fsync(file.fileno())
+
+    os.replace(path, location)
+
+    checksum = digest.hexdigest()
+    with open(f'{location}.sha256', 'w') as file:
+        file.write(f'{checksum}  {Path(location).name}\n')
+
+    return checksum
+
+
+def segment_path(location: str | Path, number: int) -> str:
+    """
+    Get path of segment file with given number of snapshot.
+    """
+    return f'{location}.{number}.log'
+
+
+def list_segments(location: str | Path) -> List[Tuple[int, Path]]:
+    """
+    Find segment files of snapshot.
+
+    :param location:
+        Path of snapshot.
+
+    :return:
+        List of segment numbers and paths in ascending order.
+    """
+    location = Path(location)
+    segments = []
+
+    for path in location.parent.glob(f'{location.name}.*.log'):
+        number = path.name[len(location.name) + 1:-len('.log')]
+        if number.isdigit():
+            segments.append((int(number), path))
+
+    return sorted(segments)
+
+
+def append_segment(
+        location: str | Path,
+        records: Iterable[Tuple[Hashable, Any]],
+        missing: Any = None,
+        stats: Optional[dict] = None
+) -> None:
+    """
+    Append changed records to segment file, one JSON array per line:
+    [key, value] for changed record and [key] for deleted one.
+    Blocking function, so it is supposed to be run in a worker thread.
+
+    :param location:
+        Path of segment file.
+    :param records:
+        Keys and values of changed records.
+    :param missing:
+        Value marking deleted record.
+    :param stats:
+        Dict to put amount of written records and bytes in.
+    """
+    lines = [
+        json.dumps([key] if value is missing else [key, value])
+        for key, value in records
+    ]
+    chunk = ''.join(f'{line}\n' for line in lines).encode()
+
+    with open(location, 'ab') as file:
+        file.write(chunk)
+
+    if stats is not None:
+        stats.update(records=len(lines), disk_bytes=len(chunk))
+
+
+def replay_segment(
+        location: str | Path,
+        data: dict,
+        object_hook: Optional[Callable] = None
+) -> int:
+    """
+    Apply changed records of segment file to data.
+    Torn line at the end of file left by interrupted write is skipped.
+
+    :param location:
+        Path of segment file.
+    :param data:
+        Dict to apply changes to.
+    :param object_hook:
+        Object hook of json.loads.
+
+    :return:
+        Amount of applied records.
+    """
+    applied = 0
+
+    with open(location, 'rb') as file:
+        for line in file:
+            try:
+                record = json.loads(line, object_hook=object_hook)
+            except ValueError:
+                break
+
+            if len(record) == 2:
+                data[record[0]] = record[1]
+            else:
+                data.pop(record[0], None)
+            applied += 1
+
+    return applied
+
+
+class SnapshotDecoder:
+    """
+    Incremental decoder of snapshot read by chunks. Each chunk is decompressed
+    as soon as it is fed and only JSON text is kept in one growing buffer,
+    so compressed chunks are not held in memory until the end of file.
+    JSON is parsed at once, so text and parsed data are in memory together.
+
+    :param encoding:
+        Encoding of JSON text.
+    """
+    def __init__(self, encoding: str = 'utf8'):
+        self.encoding: str = encoding
+        self._decompressor = None
+        self._started: bool = False
+        self._buffer: bytearray = bytearray()
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Decompress next chunk of snapshot, compression is detected by the first one.
+
+        :param chunk:
+            Next bytes of snapshot.
+        """
+        if not self._started:
+            self._decompressor = make_decompressor(detect_compression(chunk))
+            self._started = True
+
+        self._buffer += self._decompressor.decompress(chunk) if self._decompressor is not None else chunk
+
+    def load(self, **kwargs) -> Any:
+        """
+        Deserialize JSON text of all fed chunks, buffer is freed before parsing.
+
+        :param kwargs:
+            Arguments of json.loads.
+        """
+        if hasattr(self._decompressor, 'flush'):
+            self._buffer += self._decompressor.flush()
+
+        text = self._buffer.decode(self.encoding)
+        self._buffer = bytearray()
+
+        return json.loads(text, **kwargs)
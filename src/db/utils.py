@@ -1,6 +1,8 @@
+import asyncio
+import time
 from functools import wraps
 from asyncio.exceptions import CancelledError
-from typing import Hashable
+from typing import Hashable, Optional
 
 from logger.logs import logger
 from os import listdir
@@ -20,6 +22,72 @@ def catch_exception(func: callable, *args, **kwargs) -> callable:
         return None
 
 
+def current_task() -> asyncio.Task | None:
+    """
+    Get currently running asyncio task or None if called outside of event loop.
+    """
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class LoopStallMonitor:
+    """
+    Async context manager measuring how long the event loop was blocked while it was entered.
+    Background task sleeps for given interval and the longest delay
+    of its wake up is taken as the event loop stall. All delays are kept
+    for percentiles, as they are the time a request arrived meanwhile waits
+    before it is handled.
+
+    :param interval:
+        Amount of seconds between checks.
+    """
+    def __init__(self, interval: float = 0.001):
+        self.interval: float = interval
+        self.max_stall: float = 0
+        self.stalls: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+        self._sleep_started: float = 0
+
+    async def __aenter__(self) -> "LoopStallMonitor":
+        self._task = asyncio.create_task(self._watch())
+        await asyncio.sleep(0)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._check()
+        self._task.cancel()
+        try:
+            await self._task
+        except CancelledError:
+            pass
+
+    def _check(self) -> None:
+        stall = max(time.perf_counter() - self._sleep_started - self.interval, 0)
+        self.stalls.append(stall)
+        self.max_stall = max(self.max_stall, stall)
+
+    def percentile(self, p: float) -> float:
+        """
+        Get stall in seconds which given fraction of checks did not exceed.
+
+        :param p:
+            Fraction from 0 to 1.
+        """
+        if not self.stalls:
+            return 0
+
+        stalls = sorted(self.stalls)
+        return stalls[min(int(len(stalls) * p), len(stalls) - 1)]
+
+    async def _watch(self) -> None:
+        while True:
+            self._sleep_started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self._check()
+
+
 def graceful_shutdown(func: callable) -> callable:
     """
     Wrapper for graceful shutdown with saving storage
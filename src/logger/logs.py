@@ -1,28 +1,211 @@
-import logging.config
-from typing import Dict
+import atexit
+import copy
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Tuple
 from pathlib import Path
 
-import yaml
+# Names of configured loggers by their keys in logger dict.
+LOGGERS: Dict[str, str] = {
+    'error': 'errorLogger',
+    'info': 'infoLogger',
+    'debug': 'debugLogger',
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formatter writing each record as one line JSON object.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': record.filename,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+
+        if getattr(record, 'suppressed', 0):
+            data['suppressed'] = record.suppressed
+
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(data)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Filter limiting amount of records from the same line of code with token bucket.
+    Records over the limit are dropped before formatting, the next passed record
+    of the same line tells how many similar records were suppressed.
+
+    :param rate:
+        Amount of records per second passed from each line of code, 0 disables limit.
+    :param burst:
+        Amount of records passed from each line of code at once.
+    """
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self.rate: float = rate
+        self.burst: int = burst
+        self.suppressed: int = 0
+        self._buckets: Dict[Tuple[str, int], List[float]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.rate:
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now, 0]
+
+        tokens, updated, suppressed = bucket
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens < 1:
+            bucket[:] = [tokens, now, suppressed + 1]
+            self.suppressed += 1
+            return False
+
+        bucket[:] = [tokens - 1, now, 0]
+
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f'{record.msg} [{suppressed} similar messages suppressed]'
+
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler that drops records if the queue is full,
+    so logging never blocks the caller when output can't keep up.
+    Records are formatted by handlers of the listener thread, not by the caller.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only arguments of message are resolved here, they may be changed after the call.
+        # Exception info is kept for formatter of the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class RoutingQueueListener(QueueListener):
+    """
+    Queue listener passing each record to the handlers of the logger
+    it was made by, so one background thread serves all loggers.
+
+    :param log_queue:
+        Queue to read records from.
+    :param routes:
+        Handlers by logger names.
+    """
+    def __init__(self, log_queue: queue.Queue, routes: Dict[str, List[logging.Handler]]):
+        super().__init__(log_queue, respect_handler_level=True)
+        self.routes: Dict[str, List[logging.Handler]] = routes
+
+    def handle(self, record: logging.LogRecord) -> None:
+        record = self.prepare(record)
+
+        for handler in self.routes.get(record.name, ()):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+def log_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Get amount of records dropped because log queue was full
+    and suppressed by rate limit since start by logger keys.
+    """
+    stats = {}
+
+    for key in LOGGERS:
+        for handler in logger[key].handlers:
+            if isinstance(handler, DroppingQueueHandler):
+                stats[key] = {
+                    'dropped': handler.dropped,
+                    'suppressed': sum(f.suppressed for f in handler.filters if isinstance(f, RateLimitFilter))
+                }
+
+    return stats
 
 
 def load_config() -> Dict:
     """
     Load logging configuration file.
+    Handlers of configured loggers are moved to a background thread:
+    loggers only put records to a bounded queue after rate limiting.
 
     :return: Dict of the logging type and the logging object.
     """
+    import logging.config
+
+    import yaml
+
+    from conf.settings import LOG_FORMAT, LOG_QUEUE_SIZE, LOG_RATE_LIMIT, LOG_RATE_BURST
 
     with open(Path(__file__).resolve().parent / 'conf.yaml', 'r') as f:
         config = yaml.safe_load(f.read())
         logging.config.dictConfig(config)
 
-    configs = {
-        'error': logging.getLogger('errorLogger'),
-        'info': logging.getLogger('infoLogger'),
-        'debug': logging.getLogger('debugLogger'),
-    }
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    json_formatter = JsonFormatter()
+    routes = {}
+    configs = {}
+
+    for key, name in LOGGERS.items():
+        log = logging.getLogger(name)
+        routes[name] = log.handlers[:]
+
+        for handler in routes[name]:
+            log.removeHandler(handler)
+            if LOG_FORMAT == 'json':
+                handler.setFormatter(json_formatter)
+
+        queue_handler = DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter(rate=LOG_RATE_LIMIT, burst=LOG_RATE_BURST))
+        log.addHandler(queue_handler)
+
+        configs[key] = log
+
+    listener = RoutingQueueListener(log_queue, routes)
+    listener.start()
+    atexit.register(listener.stop)
 
     return configs
 
 
-logger = load_config()
+class LazyLoggers(dict):
+    """
+    Dict of loggers that loads logging configuration on first access,
+    so importing logger doesn't cost parsing of configuration file.
+    """
+    def __missing__(self, key: str) -> logging.Logger:
+        if not self:
+            self.update(load_config())
+            return self[key]
+
+        raise KeyError(key)
+
+
+logger = LazyLoggers()
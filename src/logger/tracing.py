@@ -0,0 +1,130 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar, Token
+from typing import Optional, List, Dict, Tuple
+
+# Innermost open span of current request, None outside of traced request.
+_current_span: ContextVar[Optional["Span"]] = ContextVar('current_span', default=None)
+
+
+class Span:
+    """
+    Timed phase of request handling with nested phases.
+
+    :param name:
+        Name of phase, e.g. "db.search".
+    """
+    def __init__(self, name: str):
+        self.name: str = name
+        self.start: float = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def totals(self) -> Dict[str, Tuple[float, int]]:
+        """
+        Sum durations of nested spans by their names.
+        Spans nested in spans of the same name are not summed twice.
+
+        :return:
+            Dict of span names and their total duration in seconds and count.
+        """
+        totals = {}
+
+        def walk(span: Span, open_names: frozenset):
+            for child in span.children:
+                if child.name not in open_names:
+                    duration, count = totals.get(child.name, (0, 0))
+                    totals[child.name] = (duration + child.duration, count + 1)
+                walk(child, open_names | {child.name})
+
+        walk(self, frozenset((self.name,)))
+        return totals
+
+    def format_tree(self, indent: int = 0) -> str:
+        """
+        Format span with all nested spans as indented lines.
+        """
+        lines = [f"{'  ' * indent}{self.name} {self.duration * 1000:.2f} ms"]
+        lines.extend(child.format_tree(indent + 1) for child in self.children)
+        return '\n'.join(lines)
+
+
+class span:
+    """
+    Context manager timing a phase of current request as nested span.
+    Does nothing outside of traced request, so it can wrap any code.
+
+    :param name:
+        Name of phase.
+    """
+    __slots__ = ('name', '_span', '_token')
+
+    def __init__(self, name: str):
+        self.name: str = name
+        self._span: Optional[Span] = None
+        self._token: Optional[Token] = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+
+        if parent is not None:
+            self._span = Span(self.name)
+            parent.children.append(self._span)
+            self._token = _current_span.set(self._span)
+
+        return self._span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._span is not None:
+            self._span.end = time.perf_counter()
+            _current_span.reset(self._token)
+
+
+def traced(name: str):
+    """
+    Decorator timing calls of function or coroutine function as span.
+
+    :param name:
+        Name of span.
+    """
+    def decorator(func: callable) -> callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_trace(name: str) -> Tuple[Span, Token]:
+    """
+    Start root span of request in current context.
+
+    :return:
+        Root span and token to pass to finish_trace.
+    """
+    root = Span(name)
+    return root, _current_span.set(root)
+
+
+def finish_trace(root: Span, token: Token) -> None:
+    """
+    Close root span of request started by start_trace.
+    """
+    root.end = time.perf_counter()
+    _current_span.reset(token)
@@ -1,20 +1,124 @@
-import json as js_data
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from types import TracebackType
 from typing import Generator, MutableMapping, Optional, Any, Mapping, Type
 
 import aiohttp
-from aiohttp import ClientConnectorError, ClientResponse
+from aiohttp import ClientConnectorError, ClientResponse, hdrs
 
 from logger.logs import logger
 from modules.client.utils import httpize
+from modules.exceptions.client_exceptions import RequestFailed
+
+# Methods that can be safely repeated if response was not received.
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+# Response statuses after which request is repeated.
+RETRY_STATUSES = frozenset((502, 503, 504))
+
+
+def retry_after(response: ClientResponse) -> Optional[float]:
+    """
+    Get amount of seconds server asked to wait before retry with Retry-After header,
+    given as amount of seconds or as HTTP date.
+
+    :param response:
+        Response to get header from.
+
+    :return:
+        Amount of seconds or None if there is no valid header.
+    """
+    value = response.headers.get(hdrs.RETRY_AFTER)
+
+    if value is None:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
 
 
 class ClientRequestHandler:
     """
     Class for interacting with HTTP client.
+    Session with connection pool is created on first request and reused
+    by all next requests, so connections are kept alive between them.
+
+    :param limit:
+        Total amount of simultaneous connections in pool.
+    :param limit_per_host:
+        Amount of simultaneous connections to the same host.
+    :param ttl_dns_cache:
+        Amount of seconds to cache resolved host addresses.
+    :param keepalive_timeout:
+        Amount of seconds to keep idle connection open.
+    :param timeout:
+        Total timeout of request in seconds.
+    :param retries:
+        Amount of retries for failed request.
+    :param retry_backoff:
+        Delay before first retry in seconds, doubled on each next retry.
+    :param compression:
+        Ask server for gzip or deflate compressed responses, they are decompressed
+        transparently when read. Otherwise ask for uncompressed ones.
     """
-    def __init__(self):
-        self.client_session = aiohttp.ClientSession()
+    def __init__(
+            self,
+            limit: int = 100,
+            limit_per_host: int = 0,
+            ttl_dns_cache: int = 300,
+            keepalive_timeout: float = 15,
+            timeout: float = 30,
+            retries: int = 2,
+            retry_backoff: float = 0.2,
+            compression: bool = True
+    ):
+        self.limit: int = limit
+        self.limit_per_host: int = limit_per_host
+        self.ttl_dns_cache: int = ttl_dns_cache
+        self.keepalive_timeout: float = keepalive_timeout
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.retry_backoff: float = retry_backoff
+        self.compression: bool = compression
+        self._client_session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def client_session(self) -> aiohttp.ClientSession:
+        """
+        Session of current event loop, created if there is no open one.
+        """
+        loop = asyncio.get_running_loop()
+
+        if self._client_session is None or self._client_session.closed or self._loop is not loop:
+            self._client_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    use_dns_cache=True,
+                    ttl_dns_cache=self.ttl_dns_cache,
+                    keepalive_timeout=self.keepalive_timeout,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={hdrs.ACCEPT_ENCODING: 'gzip, deflate' if self.compression else 'identity'},
+                auto_decompress=True,
+            )
+            self._loop = loop
+
+        return self._client_session
 
     async def __aenter__(self) -> "ClientRequestHandler":
         return self
@@ -31,7 +135,10 @@ class ClientRequestHandler:
         """
         Close aiohttp session
         """
-        await self.client_session.close()
+        if self._client_session is not None:
+            await self._client_session.close()
+            self._client_session = None
+            self._loop = None
 
     async def do_request(
             self,
@@ -40,9 +147,14 @@ class ClientRequestHandler:
             params: Optional[Mapping[str, Any]] = None,
             data: Any = None,
             json: Any = None,
+            timeout: Optional[float] = None,
     ) -> ClientResponse:
         """
-        Make HTTP request. Serialize given request body and httpize query params.
+        Make HTTP request. Send given request body as JSON and httpize query params.
+        Failed requests are retried with exponential backoff: idempotent requests
+        on connection errors, timeouts and 502/503/504 responses, others only
+        if connection to server was not established. Retry after response with
+        Retry-After header waits at least as long as server asked.
 
         :param url:
             URL-address to request.
@@ -52,28 +164,56 @@ class ClientRequestHandler:
             HTTP query parameters to request.
         :param data:
             HTTP request body.
+        :param timeout:
+            Total timeout of this request in seconds, timeout of handler by default.
+
+        :raises RequestFailed:
+            If request failed after all retries.
         """
         if data is not None and not isinstance(data, (str, bytes)):
-            data = js_data.dumps(data)
+            data, json = None, data
 
         if params is not None:
             params = httpize(params)
 
-        try:
-            response = await self.client_session.request(
-                method=method,
-                url=url,
-                params=params,
-                data=data,
-                json=json
-            )
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        options = {} if timeout is None else {'timeout': aiohttp.ClientTimeout(total=timeout)}
+
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            delay = self.retry_backoff * 2 ** attempt
+
+            try:
+                response = await self.client_session.request(
+                    method=method,
+                    url=url,
+                    params=params,
+                    data=data,
+                    json=json,
+                    **options
+                )
+            except ClientConnectorError as exc:
+                error = repr(exc)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                if not idempotent:
+                    raise RequestFailed(f"{method} request to {url} failed: {repr(exc)}") from exc
+                error = repr(exc)
+            else:
+                if not idempotent or last_attempt or response.status not in RETRY_STATUSES:
+                    return response
+                response.release()
+                error = f"HTTP status {response.status}"
+                delay = max(delay, retry_after(response) or 0)
 
-            return response
-        except (aiohttp.ClientError, ClientConnectorError, Exception) as exc:
             logger['debug'].debug(
-                f"Error {method} request to resource {url}:\n{repr(exc)}"
+                f"Error {method} request to resource {url} (attempt {attempt + 1}):\n{error}"
             )
 
+            if last_attempt:
+                raise RequestFailed(f"{method} request to {url} failed: {error}")
+
+            await asyncio.sleep(delay)
+
     async def get_request(
             self,
             url: str,
@@ -228,3 +368,30 @@ class ClientRequestHandler:
             logger['debug'].debug(
                 f"Exception in WebSocket connection to resource '{url}':\n{repr(exc)}"
             )
+
+
+_shared_handler: Optional[ClientRequestHandler] = None
+
+
+def get_shared_handler(**kwargs) -> ClientRequestHandler:
+    """
+    Get process-wide ClientRequestHandler, so all requests share one connection pool.
+    Handler is created with given options on first call, next calls return the same one.
+
+    :param kwargs:
+        Options of ClientRequestHandler.
+    """
+    global _shared_handler
+
+    if _shared_handler is None:
+        _shared_handler = ClientRequestHandler(**kwargs)
+
+    return _shared_handler
+
+
+async def close_shared_handler() -> None:
+    """
+    Close connections of process-wide ClientRequestHandler if it was created.
+    """
+    if _shared_handler is not None:
+        await _shared_handler.close()
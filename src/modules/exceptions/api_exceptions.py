@@ -1,2 +1,6 @@
 class InvalidPageNum(Exception):
     pass
+
+
+class Overloaded(Exception):
+    pass
@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Optional, Dict, Tuple, List
+
+from aiohttp import web
+
+from logger.tracing import span
+from modules.exceptions.api_exceptions import Overloaded
+from modules.schemas import response_schemas as schemas
+
+# Key of AdmissionController in aiohttp application.
+ADMISSION_KEY = 'admission'
+
+
+class Priority(IntEnum):
+    """
+    Priority of queued requests, lower value is admitted first.
+    """
+    LOOKUP = 0
+    WRITE = 1
+    SCAN = 2
+
+
+class PriorityLimiter:
+    """
+    Semaphore which wakes up waiters in order of priority, then in order of arrival.
+    Released slot is handed over to the next waiter directly,
+    so newcomers can't overtake queued requests.
+
+    :param limit:
+        Maximum amount of simultaneous holders.
+    """
+    def __init__(self, limit: int):
+        self.limit: int = limit
+        self.active: int = 0
+        self.waiting: int = 0
+        self._waiters: List[list] = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> None:
+        """
+        Take a slot waiting for it at most timeout seconds.
+
+        :param priority:
+            Priority of waiter, lower value is woken up first.
+        :param timeout:
+            Maximum amount of seconds to wait, no limit if None.
+
+        :raises asyncio.TimeoutError:
+            If slot was not taken in time.
+        """
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._counter), future])
+        self.waiting += 1
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        """
+        Give slot back or hand it over to the first waiter.
+        """
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.active -= 1
+
+
+class RouteAdmission:
+    """
+    Admission settings and statistics of one route.
+
+    :param name:
+        Name of route in statistics.
+    :param limit:
+        Maximum amount of simultaneously handled requests of the route.
+    :param priority:
+        Priority of route requests in the queue of the whole server.
+    :param window:
+        Amount of last queue wait times kept for percentiles.
+    """
+    def __init__(self, name: str, limit: int, priority: Priority, window: int = 1000):
+        self.name: str = name
+        self.priority: Priority = priority
+        self.limiter: PriorityLimiter = PriorityLimiter(limit)
+        self.admitted: int = 0
+        self.rejected: int = 0
+        self.waits: deque = deque(maxlen=window)
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+
+        def percentile(p: float) -> float:
+            return round(waits[min(int(len(waits) * p), len(waits) - 1)] * 1000, 3) if waits else 0
+
+        return {
+            'limit': self.limiter.limit,
+            'priority': self.priority.name.lower(),
+            'active': self.limiter.active,
+            'waiting': self.limiter.waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'queue_wait_ms': {
+                'p50': percentile(0.5),
+                'p99': percentile(0.99),
+                'max': percentile(1)
+            }
+        }
+
+
+class AdmissionController:
+    """
+    Limits amount of simultaneously handled requests per route and for the whole server.
+    Requests over the limits wait in queues, point lookups are admitted
+    before writes and scans, requests which waited longer than queue timeout
+    or came to full queue are rejected.
+
+    :param max_concurrency:
+        Maximum amount of simultaneously handled requests of all limited routes.
+    :param queue_timeout:
+        Maximum amount of seconds request waits for admission.
+    :param max_queue:
+        Maximum amount of waiting requests of a route, next ones are rejected at once.
+    :param retry_after:
+        Amount of seconds to wait before retry sent to rejected clients.
+    """
+    def __init__(self, max_concurrency: int, queue_timeout: float, max_queue: int, retry_after: int = 1):
+        self.limiter: PriorityLimiter = PriorityLimiter(max_concurrency)
+        self.queue_timeout: float = queue_timeout
+        self.max_queue: int = max_queue
+        self.retry_after: int = retry_after
+        self.routes: Dict[Tuple[str, str], RouteAdmission] = {}
+
+    def add_route(self, path: str, method: str = '*', limit: int = 1, priority: Priority = Priority.SCAN) -> None:
+        """
+        Limit requests of a route. Requests of not added routes are handled without limits.
+
+        :param path:
+            Canonical path of route, e.g. "/phonebook/{entry_id}".
+        :param method:
+            HTTP method of requests to limit, "*" for all not added methods.
+        :param limit:
+            Maximum amount of simultaneously handled requests.
+        :param priority:
+            Priority of requests in the queue.
+        """
+        self.routes[(path, method)] = RouteAdmission(name=f'{method} {path}', limit=limit, priority=priority)
+
+    def match(self, request: web.Request) -> Optional[RouteAdmission]:
+        """
+        Get admission settings of request route.
+        """
+        resource = request.match_info.route.resource
+        if resource is None:
+            return None
+
+        path = resource.canonical
+        return self.routes.get((path, request.method)) or self.routes.get((path, '*'))
+
+    async def acquire(self, route: RouteAdmission) -> None:
+        """
+        Wait for slots of the route and of the server.
+
+        :raises Overloaded:
+            If queue is full or request waited for too long.
+        """
+        if route.limiter.waiting >= self.max_queue:
+            route.rejected += 1
+            raise Overloaded(f"Too many queued requests to {route.name}")
+
+        started = time.perf_counter()
+        try:
+            await route.limiter.acquire(timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            route.rejected += 1
+            raise Overloaded(f"Request to {route.name} waited for more than {self.queue_timeout} s")
+
+        try:
+            await self.limiter.acquire(
+                priority=route.priority,
+                timeout=max(self.queue_timeout - (time.perf_counter() - started), 0)
+            )
+        except BaseException as exc:
+            route.limiter.release()
+            if isinstance(exc, asyncio.TimeoutError):
+                route.rejected += 1
+                raise Overloaded(f"Request to {route.name} waited for more than {self.queue_timeout} s")
+            raise
+
+        route.admitted += 1
+        route.waits.append(time.perf_counter() - started)
+
+    def release(self, route: RouteAdmission) -> None:
+        self.limiter.release()
+        route.limiter.release()
+
+    def stats(self) -> dict:
+        return {
+            'max_concurrency': self.limiter.limit,
+            'active': self.limiter.active,
+            'waiting': self.limiter.waiting,
+            'routes': {route.name: route.stats() for route in self.routes.values()}
+        }
+
+
+def admission_middleware(controller: AdmissionController):
+    """
+    Create aiohttp middleware admitting requests through the controller.
+    Rejected requests get 503 response with Retry-After header.
+
+    :param controller:
+        Admission controller to use.
+    """
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        route = controller.match(request)
+
+        if route is None:
+            return await handler(request)
+
+        try:
+            with span('queue'):
+                await controller.acquire(route)
+        except Overloaded as e:
+            return web.json_response(
+                status=503,
+                headers={'Retry-After': str(controller.retry_after)},
+                data=schemas.GenericResponseModel(success=False, error_msg=str(e)).dict()
+            )
+
+        try:
+            # Handlers of scans do not yield while searching, so let the event loop
+            # accept newly arrived requests before running one, otherwise requests
+            # would never wait in queues and could not be reordered by priority.
+            await asyncio.sleep(0)
+            return await handler(request)
+        finally:
+            controller.release(route)
+
+    return middleware
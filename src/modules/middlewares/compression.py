@@ -0,0 +1,178 @@
+import asyncio
+import gzip
+import zlib
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Optional, Tuple
+
+from aiohttp import web, hdrs
+
+from logger.tracing import span
+
+# Key of CompressionCache in aiohttp application.
+COMPRESSION_KEY = 'compression'
+
+# Supported content codings in order of preference.
+ENCODINGS = ('gzip', 'deflate')
+
+# Bodies larger than this amount of bytes are compressed in a worker thread.
+OFFLOAD_SIZE = 64 * 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Choose supported content coding acceptable by client.
+
+    :param accept_encoding:
+        Value of Accept-Encoding header, e.g. "gzip;q=0.8, deflate".
+
+    :return:
+        Content coding with the highest quality, None if client accepts no one of supported.
+    """
+    qualities = {}
+
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+
+        qualities[coding.strip()] = quality
+
+    wildcard = qualities.get('*', 0.0)
+    best, best_quality = None, 0.0
+
+    for coding in ENCODINGS:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+
+    return best
+
+
+def compress(body: bytes, encoding: str, level: int) -> bytes:
+    """
+    Compress response body with given content coding.
+    Gzip header is written without modification time, so the same body
+    always gives the same bytes.
+    """
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=level, mtime=0)
+
+    return zlib.compress(body, level)
+
+
+class CompressionCache:
+    """
+    LRU cache of compressed response bodies keyed by digest of uncompressed body,
+    so the same payload requested again is not compressed twice.
+
+    :param max_size:
+        Maximum total amount of bytes of cached compressed bodies, 0 disables caching.
+    :param level:
+        Compression level.
+    """
+    def __init__(self, max_size: int, level: int = 6):
+        self.max_size: int = max_size
+        self.level: int = level
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+        self._bodies: OrderedDict[Tuple[str, bytes], bytes] = OrderedDict()
+
+    async def compress(self, body: bytes, encoding: str) -> bytes:
+        """
+        Get compressed body from cache or compress it and put to cache.
+
+        :param body:
+            Uncompressed body.
+        :param encoding:
+            Content coding.
+        """
+        key = (encoding, blake2b(body, digest_size=16).digest())
+        compressed = self._bodies.get(key)
+
+        if compressed is not None:
+            self._bodies.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+
+            if len(body) > OFFLOAD_SIZE:
+                compressed = await asyncio.get_running_loop().run_in_executor(
+                    None, compress, body, encoding, self.level
+                )
+            else:
+                compressed = compress(body, encoding, self.level)
+
+            self._put(key, compressed)
+
+        self.bytes_in += len(body)
+        self.bytes_out += len(compressed)
+
+        return compressed
+
+    def _put(self, key: Tuple[str, bytes], compressed: bytes) -> None:
+        if len(compressed) > self.max_size or key in self._bodies:
+            return
+
+        self._bodies[key] = compressed
+        self.size += len(compressed)
+
+        while self.size > self.max_size:
+            _, evicted = self._bodies.popitem(last=False)
+            self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        return {
+            'cached_bytes': self.size,
+            'cached_bodies': len(self._bodies),
+            'hits': self.hits,
+            'misses': self.misses,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out
+        }
+
+
+def compression_middleware(cache: CompressionCache, min_size: int):
+    """
+    Create aiohttp middleware compressing response bodies with gzip or deflate
+    negotiated from Accept-Encoding header of request.
+    Streamed responses (e.g. WebSocket) and already encoded bodies are left as is.
+
+    :param cache:
+        Cache of compressed bodies.
+    :param min_size:
+        Minimal size of body in bytes to compress.
+    """
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        response = await handler(request)
+
+        if (
+            type(response) is not web.Response
+            or response.body is None
+            or not isinstance(response.body, bytes)
+            or hdrs.CONTENT_ENCODING in response.headers
+        ):
+            return response
+
+        if len(response.body) >= min_size:
+            response.headers.add(hdrs.VARY, hdrs.ACCEPT_ENCODING)
+
+            encoding = negotiate_encoding(request.headers.get(hdrs.ACCEPT_ENCODING, ''))
+            if encoding is not None:
+                with span('compress'):
+                    response.body = await cache.compress(response.body, encoding)
+                response.headers[hdrs.CONTENT_ENCODING] = encoding
+
+        return response
+
+    return middleware
@@ -0,0 +1,78 @@
+from typing import Optional
+
+from aiohttp import web
+
+from logger.logs import logger
+from logger.tracing import Span, start_trace, finish_trace
+
+# Name of span of view method, time before it is spent on request validation.
+VIEW_SPAN = 'view'
+
+# Name of span of waiting for admission.
+QUEUE_SPAN = 'queue'
+
+
+def add_validation_span(root: Span) -> None:
+    """
+    Add span of time between admission (or start of request) and view method,
+    that is spent by aiohttp_pydantic on parsing and validation of request.
+    """
+    view = next((child for child in root.children if child.name == VIEW_SPAN), None)
+    if view is None:
+        return
+
+    queue = next((child for child in root.children if child.name == QUEUE_SPAN), None)
+
+    validation = Span('validation')
+    validation.start = queue.end if queue is not None else root.start
+    validation.end = view.start
+    root.children.insert(root.children.index(view), validation)
+
+
+def server_timing(root: Span) -> str:
+    """
+    Format Server-Timing header value with total duration of each phase of request.
+    """
+    metrics = []
+
+    for name, (duration, count) in root.totals().items():
+        description = f';desc="{count} calls"' if count > 1 else ''
+        metrics.append(f'{name}{description};dur={duration * 1000:.2f}')
+
+    metrics.append(f'total;dur={root.duration * 1000:.2f}')
+    return ', '.join(metrics)
+
+
+def tracing_middleware(slow_threshold: Optional[float] = None, timing_header: bool = True):
+    """
+    Create aiohttp middleware tracing phases of request handling.
+    Durations of phases are sent in Server-Timing header, requests
+    handled longer than threshold are logged with their span tree.
+
+    :param slow_threshold:
+        Amount of seconds to consider request slow, None disables logging.
+    :param timing_header:
+        Add Server-Timing header to responses.
+    """
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        root, token = start_trace('request')
+
+        try:
+            response = await handler(request)
+        finally:
+            finish_trace(root, token)
+            add_validation_span(root)
+
+            if slow_threshold is not None and root.duration >= slow_threshold:
+                logger['info'].info(
+                    f"Slow request {request.method} {request.path_qs} "
+                    f"{root.duration * 1000:.2f} ms:\n{root.format_tree()}"
+                )
+
+        if timing_header and not response.prepared:
+            response.headers['Server-Timing'] = server_timing(root)
+
+        return response
+
+    return middleware
@@ -1,12 +1,16 @@
 from typing import List, Mapping
 
+from modules.exceptions.api_exceptions import InvalidPageNum
+
 
 def convert_obj_to_list(dict_of_dicts: dict) -> List[Mapping]:
     """
     Convert dict of dict to list of dict and
     add root keys of origin dict as ID field in each dict in list.
+    Dicts are copied: stored objects must never be changed in place,
+    as snapshots of storage are written from shallow copies.
     """
-    return [(lambda d: d.update(id=key) or d)(val) for (key, val) in dict_of_dicts.items()]
+    return [dict(val, id=key) for (key, val) in dict_of_dicts.items()]
 
 
 def filter_none_values(dictionary: dict) -> dict:
@@ -14,3 +18,31 @@ def filter_none_values(dictionary: dict) -> dict:
     Delete keys with None values from dict.
     """
     return {key: value for key, value in dictionary.items() if value is not None}
+
+
+def paginator(items, page_num: int = 1, page_size: int = 5) -> list:
+    """
+    Split list to a given number of lists with given size.
+
+    :param items:
+        List to split.
+    :param page_num:
+        Number of sublists.
+    :param page_size:
+        Amount of items in each sublist.
+    """
+
+    if len(items) < 1:
+        return []
+
+    if page_num < 1:
+        raise InvalidPageNum("Page number must be > 0")
+
+    page_num -= 1
+
+    pages = [items[i:i+page_size] for i in range(0, len(items), page_size)]
+
+    try:
+        return pages[page_num]
+    except IndexError:
+        return pages[-1]
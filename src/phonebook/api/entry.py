@@ -1,11 +1,14 @@
-from typing import Mapping, List
+import asyncio
+from typing import Mapping, List, Literal
 
 from aiohttp import web
 from aiohttp_pydantic import PydanticView
 from aiohttp_pydantic.oas.typing import r200
 
 from modules.schemas import response_schemas as schemas
+from logger.logs import logger
 from modules.utils.api_utils import manage_exceptions
+from phonebook.db_session import SORT_FIELDS
 from phonebook.schemas import entry_schemas
 from phonebook.services import entry_service
 
@@ -21,7 +24,14 @@ class EntryCollectionView(PydanticView):
             middle_name: str = None,
             organization: str = None,
             work_phone: str = None,
-            personal_phone: str = None
+            personal_phone: str = None,
+            fuzzy: bool = False,
+            max_distance: int = 2,
+            sort_by: Literal[SORT_FIELDS] = None,
+            order: Literal['asc', 'desc'] = 'asc',
+            where: str = None,
+            explain: bool = False,
+            after_id: int = None
     ) -> r200[schemas.GenericResponseModel[List[entry_schemas.Entry]]]:
         """
         Get list of entry's request.
@@ -42,11 +52,49 @@ class EntryCollectionView(PydanticView):
             Query param: Query entry's by work phone.
         :param personal_phone:
             Query param: Query entry's by personal phone
+        :param fuzzy:
+            Query param: Match first and last name with typos, most similar entry's go first.
+        :param max_distance:
+            Query param: Maximum amount of typos in each name for fuzzy query.
+        :param sort_by:
+            Query param: Field to sort entry's by, insertion order if not provided.
+        :param order:
+            Query param: Sort order, "asc" or "desc".
+        :param where:
+            Query param: Condition of entry's with "=", "^=" (starts with), "*=" (contains),
+            "IN", "AND", "OR" and parentheses, e.g. 'first_name ^= Jo AND organization IN ("A", "B")'.
+        :param explain:
+            Query param: Return plan of the query with estimated and actual amount of entry's instead of them.
+        :param after_id:
+            Query param: Return page of entry's with ID greater than given one in order of IDs instead of page_num,
+            pages stay consistent while entry's are created and deleted between requests.
         """
+        if explain:
+            query_plan = await entry_service.explain_entry_list(
+                where=where,
+                first_name=first_name,
+                last_name=last_name,
+                middle_name=middle_name,
+                organization=organization,
+                work_phone=work_phone,
+                personal_phone=personal_phone
+            )
+            return web.json_response(
+                data=schemas.GenericResponseModel(
+                    data=query_plan,
+                    total=query_plan['actual_rows']
+                ).dict(),
+            )
 
         entry_list = await entry_service.get_entry_list(
             page_num=page_num,
             page_size=page_size,
+            fuzzy=fuzzy,
+            max_distance=max_distance,
+            sort_by=sort_by,
+            order=order,
+            where=where,
+            after_id=after_id,
             first_name=first_name,
             last_name=last_name,
             middle_name=middle_name,
@@ -62,6 +110,35 @@ class EntryCollectionView(PydanticView):
         )
 
 
+class EntrySearchView(PydanticView):
+    @manage_exceptions
+    async def get(
+            self,
+            q: str,
+            page_num: int = 1,
+            page_size: int = 15
+    ) -> r200[schemas.GenericResponseModel[List[entry_schemas.Entry]]]:
+        """
+        Full-text search of entry's by all fields request.
+        Entry's containing all words of query are returned, most relevant first,
+        the last word matches as prefix, so search can be done while typing.
+
+        :param q:
+            Query param: Words to search.
+        :param page_num:
+            Query param: Number of page with entry's.
+        :param page_size:
+            Query param: Page size with entry's.
+        """
+        entry_list = await entry_service.search_entry_list(q=q, page_num=page_num, page_size=page_size)
+        return web.json_response(
+            data=schemas.GenericResponseModel(
+                data=entry_list,
+                total=len(entry_list)
+            ).dict(),
+        )
+
+
 class EntryInspectView(PydanticView):
     @manage_exceptions
     async def get(
@@ -140,3 +217,64 @@ class EntryCreateView(PydanticView):
                 data=data,
             ).dict(),
         )
+
+
+class EntryChangesView(PydanticView):
+    async def get(
+            self,
+            since: int = None,
+            epoch: str = None
+    ) -> web.StreamResponse:
+        """
+        WebSocket feed of entry's changes (create, update, delete events).
+        Each event has sequence number, so client can reconnect and
+        resume from the last seen one. If changes can't be replayed,
+        "reset" event is sent and client should reload entry's,
+        slow clients get "reset" event and are disconnected.
+        Plain HTTP request returns buffered changes since given
+        sequence number at once, so clients can sync without subscribing.
+
+        :param since:
+            Query param: Last sequence number seen by client.
+        :param epoch:
+            Query param: Epoch of the server feed that sequence number belongs to.
+        """
+        ws = web.WebSocketResponse(heartbeat=30)
+
+        if not ws.can_prepare(self.request).ok:
+            return await self.get_since(since=since, epoch=epoch)
+
+        await ws.prepare(self.request)
+
+        async def send_changes():
+            async for event in entry_service.get_entry_changes(since=since, epoch=epoch):
+                await ws.send_json(event)
+            await ws.close()
+
+        sender = asyncio.create_task(send_changes())
+
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            sender.cancel()
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                logger['error'].error(
+                    f'{type(e).__name__}: {repr(e)}'
+                )
+
+        return ws
+
+    @manage_exceptions
+    async def get_since(self, since: int = None, epoch: str = None) -> web.Response:
+        data = await entry_service.get_entry_changes_since(since=since, epoch=epoch)
+        return web.json_response(
+            data=schemas.GenericResponseModel(
+                data=data,
+                total=len(data["events"])
+            ).dict(),
+        )
@@ -1,12 +1,28 @@
 from db.database import Database
+from db.indexes import HashIndex, FuzzyIndex, TextIndex, SortedIndex
+from phonebook.schemas.entry_schemas import EntryBase
+from phonebook.utils import normalize_phone
 from typing import Optional
 
+# Entry fields with phone numbers, indexed by normalized number.
+PHONE_FIELDS = ('work_phone', 'personal_phone')
+
+# Entry fields with names, indexed for fuzzy search.
+NAME_FIELDS = ('first_name', 'last_name')
+
+# Entry fields available for sorted listing.
+SORT_FIELDS = ('first_name', 'last_name', 'middle_name', 'organization')
+
+# Name of full-text index over all entry fields.
+TEXT_INDEX = 'full_text'
+
 _db_session: Optional[Database]
 
 
 def setup_session(session: Database) -> Database:
     """
-    Initialize new database session in current application (Phonebook).
+    Initialize new database session in current application (Phonebook)
+    and register indexes of entry's.
 
     :param session:
         New database session.
@@ -15,6 +31,17 @@ def setup_session(session: Database) -> Database:
 
     _db_session = session
 
+    for field in PHONE_FIELDS:
+        _db_session.add_index(HashIndex(field=field, normalize=normalize_phone))
+
+    for field in NAME_FIELDS:
+        _db_session.add_index(FuzzyIndex(field=field))
+
+    _db_session.add_index(TextIndex(fields=EntryBase.__fields__.keys()), name=TEXT_INDEX)
+
+    for field in SORT_FIELDS:
+        _db_session.add_index(SortedIndex(field=field), name=f'{field}_sorted')
+
     return _db_session
 
 
@@ -0,0 +1,336 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Hashable, Iterable, List, Mapping, NamedTuple, Optional, Tuple, Dict
+
+from db.database import Database
+from db.indexes import bounded_levenshtein
+from phonebook.db_session import PHONE_FIELDS
+from phonebook.utils import normalize_phone
+
+# Weights of entry parts in similarity score.
+PHONE_WEIGHT = 0.45
+NAME_WEIGHT = 0.45
+ORGANIZATION_WEIGHT = 0.1
+
+# Maximum edit distance of names counted as similar.
+MAX_NAME_DISTANCE = 2
+
+# Blocking key: tuple of its kind and normalized values.
+BlockingKey = Tuple
+
+
+def _casefold(value: Any) -> str:
+    return ' '.join(value.split()).casefold() if isinstance(value, str) else ''
+
+
+class Profile(NamedTuple):
+    """
+    Normalized parts of entry compared with other entry's.
+    """
+    phones: frozenset
+    first_name: str
+    last_name: str
+    organization: str
+
+
+def profile(entry: Any) -> Profile:
+    """
+    Normalize phones, names and organization of entry once for all its comparisons.
+
+    :param entry:
+        Stored entry.
+    """
+    if not isinstance(entry, dict):
+        return Profile(frozenset(), '', '', '')
+
+    return Profile(
+        phones=frozenset(normalize_phone(entry.get(f)) for f in PHONE_FIELDS) - {None},
+        first_name=_casefold(entry.get('first_name')),
+        last_name=_casefold(entry.get('last_name')),
+        organization=_casefold(entry.get('organization'))
+    )
+
+
+def blocking_keys(entry_profile: Profile) -> List[BlockingKey]:
+    """
+    Get keys of blocks entry belongs to, only entry's sharing a block are compared.
+    Entry's are blocked by each phone number, by full name and by last name
+    with organization, so duplicates with typos in names are found by phones
+    and the ones with other phones by names.
+
+    :param entry_profile:
+        Normalized entry.
+    """
+    keys = [('phone', phone) for phone in entry_profile.phones]
+
+    if entry_profile.first_name and entry_profile.last_name:
+        keys.append(('name', entry_profile.first_name, entry_profile.last_name))
+
+    if entry_profile.last_name and entry_profile.organization:
+        keys.append(('organization', entry_profile.last_name, entry_profile.organization))
+
+    return keys
+
+
+def _name_similarity(a: str, b: str) -> Optional[float]:
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+
+    distance = bounded_levenshtein(a, b, MAX_NAME_DISTANCE)
+    return 0.0 if distance is None else 1 - distance / max(len(a), len(b))
+
+
+def similarity(a: Profile, b: Profile) -> float:
+    """
+    Score similarity of two entry's from 0 to 1 by shared phone numbers,
+    edit distance of names and equal organization.
+    Parts missing in any of entry's are not counted.
+    """
+    score, weight = 0.0, 0.0
+
+    if a.phones and b.phones:
+        score += PHONE_WEIGHT * (not a.phones.isdisjoint(b.phones))
+        weight += PHONE_WEIGHT
+
+    names = [_name_similarity(a.first_name, b.first_name), _name_similarity(a.last_name, b.last_name)]
+    names = [n for n in names if n is not None]
+    if names:
+        score += NAME_WEIGHT * sum(names) / len(names)
+        weight += NAME_WEIGHT
+
+    if a.organization and b.organization:
+        score += ORGANIZATION_WEIGHT * (a.organization == b.organization)
+        weight += ORGANIZATION_WEIGHT
+
+    return score / weight if weight else 0.0
+
+
+def compare_blocks(
+        blocks: List[Tuple[BlockingKey, List[Tuple[Hashable, Mapping]]]],
+        threshold: float,
+        skipped: frozenset = frozenset()
+) -> Tuple[List[Tuple[Hashable, Hashable, float]], int]:
+    """
+    Compare all pairs of entry's inside each block, runs in worker process.
+    Pair sharing several blocks is compared only in the first of their common blocks.
+
+    :param blocks:
+        Blocking keys with keys and entry's of their blocks.
+    :param threshold:
+        Minimal similarity of duplicates.
+    :param skipped:
+        Blocking keys of blocks which are not compared.
+
+    :return:
+        Pairs of duplicate keys with their similarity and amount of compared pairs.
+    """
+    pairs = []
+    comparisons = 0
+
+    for block_key, members in blocks:
+        profiles = [(key, profile(entry)) for key, entry in members]
+        profiles = [(key, p, set(blocking_keys(p)) - skipped) for key, p in profiles]
+
+        for i, (key_a, profile_a, keys_a) in enumerate(profiles):
+            for key_b, profile_b, keys_b in profiles[i + 1:]:
+                if min(keys_a & keys_b) != block_key:
+                    continue
+
+                comparisons += 1
+                score = similarity(profile_a, profile_b)
+                if score >= threshold:
+                    pairs.append((key_a, key_b, round(score, 3)))
+
+    return pairs, comparisons
+
+
+class DisjointSet:
+    """
+    Union-find of keys to group duplicate pairs into clusters.
+    """
+    def __init__(self):
+        self.parents: Dict[Hashable, Hashable] = {}
+
+    def find(self, key: Hashable) -> Hashable:
+        parent = self.parents.setdefault(key, key)
+
+        while parent != key:
+            grandparent = self.parents[parent]
+            self.parents[key] = grandparent
+            key, parent = parent, grandparent
+
+        return key
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parents[max(root_a, root_b)] = min(root_a, root_b)
+
+    def groups(self) -> List[List[Hashable]]:
+        groups = {}
+        for key in self.parents:
+            groups.setdefault(self.find(key), []).append(key)
+
+        return [sorted(group) for group in groups.values()]
+
+
+def _chunk_blocks(
+        blocks: Iterable[Tuple[BlockingKey, List[Tuple[Hashable, Mapping]]]],
+        chunk_comparisons: int
+) -> Iterable[List[Tuple[BlockingKey, List[Tuple[Hashable, Mapping]]]]]:
+    chunk, size = [], 0
+
+    for block in blocks:
+        chunk.append(block)
+        size += len(block[1]) * (len(block[1]) - 1) // 2
+
+        if size >= chunk_comparisons:
+            yield chunk
+            chunk, size = [], 0
+
+    if chunk:
+        yield chunk
+
+
+def find_duplicates(
+        data: Mapping[Hashable, Any],
+        threshold: float = 0.8,
+        workers: Optional[int] = None,
+        max_block_size: int = 1000,
+        chunk_comparisons: int = 200000
+) -> dict:
+    """
+    Find clusters of duplicate entry's without comparing every pair:
+    entry's are grouped into blocks by blocking keys, pairs inside blocks
+    are compared in a pool of processes and similar pairs are joined into clusters.
+
+    :param data:
+        Snapshot of stored entry's by their keys.
+    :param threshold:
+        Minimal similarity of duplicates from 0 to 1.
+    :param workers:
+        Amount of worker processes, amount of CPUs by default, 0 to compare in current process.
+    :param max_block_size:
+        Blocks larger than this (e.g. shared office phone) are skipped, they would give
+        quadratic amount of comparisons of mostly different entry's.
+    :param chunk_comparisons:
+        Approximate amount of pairs compared by worker per task.
+
+    :return:
+        Dict with "clusters" (lists of keys with similar "pairs") and "stats".
+    """
+    started = time.perf_counter()
+
+    blocks: Dict[BlockingKey, List[Hashable]] = {}
+    for key, entry in data.items():
+        for block_key in blocking_keys(profile(entry)):
+            blocks.setdefault(block_key, []).append(key)
+
+    skipped = frozenset(block_key for block_key, members in blocks.items() if len(members) > max_block_size)
+    candidates = [
+        (block_key, [(key, data[key]) for key in members])
+        for block_key, members in blocks.items()
+        if 1 < len(members) <= max_block_size
+    ]
+    del blocks
+
+    blocked = time.perf_counter()
+    workers = os.cpu_count() if workers is None else workers
+    chunks = _chunk_blocks(candidates, chunk_comparisons)
+
+    if workers:
+        # Spawned workers don't inherit threads and locks of the server process.
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(partial(compare_blocks, threshold=threshold, skipped=skipped), chunks))
+    else:
+        results = [compare_blocks(chunk, threshold, skipped) for chunk in chunks]
+
+    duplicates = DisjointSet()
+    scores: Dict[Hashable, List[Tuple[Hashable, Hashable, float]]] = {}
+    comparisons = 0
+
+    for pairs, compared in results:
+        comparisons += compared
+        for key_a, key_b, score in pairs:
+            duplicates.union(key_a, key_b)
+
+    for key_a, key_b, score in (pair for pairs, _ in results for pair in pairs):
+        scores.setdefault(duplicates.find(key_a), []).append((key_a, key_b, score))
+
+    clusters = [
+        {'keys': group, 'pairs': [list(pair) for pair in scores[group[0]]]}
+        for group in sorted(duplicates.groups())
+    ]
+
+    return {
+        'clusters': clusters,
+        'stats': {
+            'entries': len(data),
+            'blocks': len(candidates),
+            'skipped_blocks': len(skipped),
+            'comparisons': comparisons,
+            'clusters': len(clusters),
+            'duplicates': sum(len(cluster['keys']) - 1 for cluster in clusters),
+            'workers': workers,
+            'blocking_seconds': round(blocked - started, 3),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+    }
+
+
+def merge_entries(entries: List[Mapping]) -> dict:
+    """
+    Merge duplicate entry's into the first one:
+    its empty fields are filled with values of the next entry's.
+    """
+    merged = dict(entries[0])
+
+    for entry in entries[1:]:
+        for field, value in entry.items():
+            if merged.get(field) in (None, '') and value not in (None, ''):
+                merged[field] = value
+
+    return merged
+
+
+async def merge_clusters(db: Database, snapshot: Mapping[Hashable, Any], clusters: List[Mapping]) -> dict:
+    """
+    Merge each cluster of duplicates into the entry with the lowest key and delete the rest
+    in one transaction, so all merges are saved at once or not at all.
+    Clusters with entry's changed or deleted since snapshot was taken are skipped.
+
+    :param db:
+        Database to merge entry's in.
+    :param snapshot:
+        Snapshot of entry's duplicates were found in.
+    :param clusters:
+        Clusters found by find_duplicates.
+
+    :return:
+        Amount of merged clusters, deleted entry's and skipped clusters.
+    """
+    merged, deleted, stale = 0, 0, 0
+
+    async with db.transaction():
+        for cluster in clusters:
+            keys = cluster['keys']
+
+            # Stored objects are replaced on update, so unchanged entry is the same object.
+            if any(db.get(key) is not snapshot.get(key) for key in keys):
+                stale += 1
+                continue
+
+            survivor, *duplicates = keys
+            db.update(key=survivor, data=merge_entries([snapshot[key] for key in keys]))
+            for key in duplicates:
+                db.delete(key=key)
+
+            merged += 1
+            deleted += len(duplicates)
+
+    return {'merged': merged, 'deleted': deleted, 'stale': stale}
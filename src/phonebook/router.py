@@ -1,7 +1,11 @@
+from aiohttp import web
+
+from conf.settings import ADMISSION_LOOKUP_LIMIT, ADMISSION_WRITE_LIMIT, ADMISSION_SCAN_LIMIT
+from modules.middlewares.admission import ADMISSION_KEY, AdmissionController, Priority
 from phonebook.api import entry
 
 
-def setup_routes(app):
+def setup_routes(app: web.Application):
     """
     Initialize all routes of current application (Phonebook).
 
@@ -11,5 +15,26 @@ def setup_routes(app):
 
     app.router.add_view('/phonebook', entry.EntryCollectionView)
     app.router.add_view('/phonebook/create', entry.EntryCreateView)
+    app.router.add_view('/phonebook/changes', entry.EntryChangesView)
+    app.router.add_view('/phonebook/search', entry.EntrySearchView)
 
     app.router.add_view('/phonebook/{entry_id}', entry.EntryInspectView)
+
+    if ADMISSION_KEY in app:
+        setup_admission(app[ADMISSION_KEY])
+
+
+def setup_admission(controller: AdmissionController) -> None:
+    """
+    Set concurrency limits and priorities of current application (Phonebook) routes.
+    Point lookups are admitted first, scans over all entry's last.
+    Change feed subscriptions are long-living, so they are not limited.
+
+    :param controller:
+        Admission controller of aiohttp application.
+    """
+    controller.add_route('/phonebook/{entry_id}', 'GET', limit=ADMISSION_LOOKUP_LIMIT, priority=Priority.LOOKUP)
+    controller.add_route('/phonebook/{entry_id}', limit=ADMISSION_WRITE_LIMIT, priority=Priority.WRITE)
+    controller.add_route('/phonebook/create', limit=ADMISSION_WRITE_LIMIT, priority=Priority.WRITE)
+    controller.add_route('/phonebook', 'GET', limit=ADMISSION_SCAN_LIMIT, priority=Priority.SCAN)
+    controller.add_route('/phonebook/search', 'GET', limit=ADMISSION_SCAN_LIMIT, priority=Priority.SCAN)
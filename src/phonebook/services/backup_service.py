@@ -0,0 +1,23 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Mapping
+
+from conf.settings import BACKUP_DIR
+from logger.tracing import traced
+from phonebook.db_session import get_session
+
+
+@traced('service')
+async def create_backup() -> Mapping:
+    """
+    Write point-in-time backup of phonebook to backups directory,
+    named after database file and UTC time of backup.
+    """
+    db_session = get_session()
+
+    location = Path(db_session.location)
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+
+    return await db_session.backup(BACKUP_DIR / f'{location.stem}-{timestamp}{location.suffix}')
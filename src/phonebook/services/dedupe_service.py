@@ -0,0 +1,41 @@
+import asyncio
+from functools import partial
+from typing import Mapping
+
+from conf.settings import DEDUPE_WORKERS, DEDUPE_MAX_BLOCK_SIZE
+from logger.tracing import traced
+from phonebook.db_session import get_session
+from phonebook.dedupe import find_duplicates, merge_clusters
+
+
+@traced('service')
+async def find_duplicate_entries(threshold: float, merge: bool = False) -> Mapping:
+    """
+    Find clusters of duplicate entry's in snapshot of current entry's and optionally merge them.
+    Entry's are compared in worker processes, so event loop keeps serving requests meanwhile.
+
+    :param threshold:
+        Minimal similarity of duplicates from 0 to 1.
+    :param merge:
+        Merge each cluster into the entry with the lowest ID in one transaction.
+    """
+    db_session = get_session()
+
+    # Stored entry's are replaced on update, so shallow copy is a consistent snapshot.
+    snapshot = dict(db_session.get_all())
+
+    report = await asyncio.get_running_loop().run_in_executor(
+        None,
+        partial(
+            find_duplicates,
+            snapshot,
+            threshold=threshold,
+            workers=DEDUPE_WORKERS,
+            max_block_size=DEDUPE_MAX_BLOCK_SIZE
+        )
+    )
+
+    if merge:
+        report['merge'] = await merge_clusters(db=db_session, snapshot=snapshot, clusters=report['clusters'])
+
+    return report
@@ -1,29 +1,146 @@
-from typing import List, Mapping
-
-from db.exceptions import KeyAlreadyExist
-from phonebook.db_session import get_session
-from modules.utils.utils import convert_obj_to_list, filter_none_values
-from modules.utils.api_utils import paginator
+import heapq
+import time
+from math import ceil
+from typing import Hashable, List, Mapping, AsyncIterator, Optional, Tuple
+
+from db.exceptions import KeyAlreadyExist, InvalidQuery
+from db.query import Predicate, Eq, And, parse_where
+from logger.tracing import traced
+from phonebook.db_session import get_session, TEXT_INDEX
+from modules.utils.utils import filter_none_values, paginator
+from modules.exceptions.api_exceptions import InvalidPageNum
 from phonebook.exceptions import NoSuchEntry
-from phonebook.schemas.entry_schemas import EntryCreate
-from phonebook.utils import generate_id
-
-
-async def get_entry_list(page_num: int, page_size: int, **kwargs) -> List[Mapping]:
+from phonebook.schemas.entry_schemas import EntryBase, EntryCreate
+
+
+@traced('service')
+async def get_entry_list(
+        page_num: int,
+        page_size: int,
+        fuzzy: bool = False,
+        max_distance: int = 2,
+        sort_by: str = None,
+        order: str = 'asc',
+        where: str = None,
+        after_id: int = None,
+        **kwargs
+) -> List[Mapping]:
     db_session = get_session()
     query_params = list(filter_none_values(kwargs).items())
-
-    if not query_params:
-        data = convert_obj_to_list(db_session.get_all())
-        paginate_data = paginator(data, page_num=page_num, page_size=page_size)
+    descending = order == 'desc'
+
+    if after_id is not None:
+        if where is not None or query_params or sort_by is not None or fuzzy:
+            raise InvalidQuery("after_id can't be combined with where, query params or sort_by")
+
+        # Keyset page: unlike page number it doesn't shift when entry's before it are deleted.
+        data_keys = heapq.nsmallest(page_size, (key for key in db_session.get_all() if key > after_id))
+        paginate_data = with_ids(data_keys)
+    elif where is not None:
+        if fuzzy:
+            raise InvalidQuery("Fuzzy search can't be combined with where expression")
+
+        data_keys = db_session.plan(entry_predicate(where=where, query_params=query_params)).execute()
+        if sort_by is not None:
+            data_keys = db_session.sort_keys(keys=data_keys, field=sort_by, descending=descending)
+        paginate_data = with_ids(paginator(data_keys, page_num=page_num, page_size=page_size))
+    elif not query_params and sort_by is not None:
+        if page_num < 1:
+            raise InvalidPageNum("Page number must be > 0")
+
+        # Like paginator, return the last page if page number is out of range.
+        pages = max(ceil(len(db_session.get_all()) / page_size), 1)
+        offset = (min(page_num, pages) - 1) * page_size
+
+        data_keys = db_session.sorted_keys(field=sort_by, offset=offset, limit=page_size, descending=descending)
+        paginate_data = with_ids(data_keys)
+    elif not query_params:
+        paginate_data = with_ids(paginator(list(db_session.get_all()), page_num=page_num, page_size=page_size))
     else:
-        data_keys = db_session.search(search_query=query_params)
-        data = db_session.get_many(data_keys)
-        paginate_data = paginator(data, page_num=page_num, page_size=page_size)
+        data_keys = await db_session.parallel_search(search_query=query_params, fuzzy=fuzzy, max_distance=max_distance)
+        if sort_by is not None:
+            data_keys = db_session.sort_keys(keys=data_keys, field=sort_by, descending=descending)
+        paginate_data = with_ids(paginator(data_keys, page_num=page_num, page_size=page_size))
 
     return paginate_data
 
 
+def with_ids(keys: List[Hashable]) -> List[Mapping]:
+    """
+    Get copies of entry's by their keys with keys added as "id" field,
+    so every branch of entry list returns the same shape.
+
+    :param keys:
+        Keys of existing entry's.
+    """
+    db_session = get_session()
+    return [dict(db_session.get(key), id=key) for key in keys]
+
+
+def entry_predicate(where: Optional[str], query_params: List[Tuple]) -> Optional[Predicate]:
+    """
+    Build condition of entry's from "where" expression and pairs of equality query params.
+
+    :param where:
+        Expression to parse, e.g. 'first_name ^= Jo AND organization IN ("A", "B")'.
+    :param query_params:
+        List of tuples with field and value which entry's should be equal to.
+
+    :raises InvalidQuery:
+        If expression has syntax error or unknown fields.
+    """
+    children = [Eq(field, value) for field, value in query_params]
+
+    if where is not None:
+        children.append(parse_where(where))
+
+    for leaf in (leaf for child in children for leaf in child.leaves()):
+        if leaf.field not in EntryBase.__fields__:
+            raise InvalidQuery(f"Unknown field {leaf.field!r}")
+
+    if not children:
+        return None
+
+    return children[0] if len(children) == 1 else And(children)
+
+
+@traced('service')
+async def explain_entry_list(where: str = None, **kwargs) -> Mapping:
+    """
+    Execute query of entry list and describe its plan:
+    chosen steps, their estimated and actual amount of entry's and time.
+    """
+    db_session = get_session()
+    predicate = entry_predicate(where=where, query_params=list(filter_none_values(kwargs).items()))
+
+    started = time.perf_counter()
+    plan = db_session.plan(predicate)
+    planned = time.perf_counter()
+    plan.execute()
+
+    return {
+        'plan': plan.explain(),
+        'estimated_rows': round(plan.estimated_rows),
+        'actual_rows': plan.actual_rows,
+        'planning_ms': round((planned - started) * 1000, 3),
+        'execution_ms': round(plan.seconds * 1000, 3)
+    }
+
+
+@traced('service')
+async def search_entry_list(q: str, page_num: int, page_size: int) -> List[Mapping]:
+    db_session = get_session()
+
+    if page_num < 1:
+        raise InvalidPageNum("Page number must be > 0")
+
+    data_keys = db_session.text_search(text=q, index_name=TEXT_INDEX, limit=page_num * page_size)
+    data = [dict(db_session.get(key), id=key) for key in data_keys]
+
+    return paginator(data, page_num=page_num, page_size=page_size)
+
+
+@traced('service')
 async def get_entry(entry_id: int) -> Mapping:
     db_session = get_session()
     data = db_session.get(key=entry_id)
@@ -34,48 +151,71 @@ async def get_entry(entry_id: int) -> Mapping:
     return data
 
 
+@traced('service')
 async def delete_entry(entry_id: int) -> bool:
     db_session = get_session()
-    data = db_session.delete(key=entry_id)
 
-    if not data:
-        raise NoSuchEntry(f"Entry with ID {entry_id} does not exist")
+    async with db_session.transaction():
+        data = db_session.delete(key=entry_id)
 
-    await db_session.save()
+        if not data:
+            raise NoSuchEntry(f"Entry with ID {entry_id} does not exist")
 
     return data
 
 
+@traced('service')
 async def create_entry(entry: EntryCreate) -> Mapping:
     db_session = get_session()
 
     entry_key = None
-    while True:
-        try:
-            entry_key = generate_id(data=db_session.get_all())
-            db_session.add(key=entry_key, new_data=entry.dict())
-        except KeyAlreadyExist:
-            continue
-        else:
-            break
+    async with db_session.transaction():
+        while True:
+            try:
+                entry_key = db_session.next_key()
+                db_session.add(key=entry_key, new_data=entry.dict())
+            except KeyAlreadyExist:
+                continue
+            else:
+                break
 
     data = db_session.get(key=entry_key)
 
-    await db_session.save()
-
     return data
 
 
+@traced('service')
 async def update_entry(entry_id: int, entry: EntryCreate) -> Mapping:
     db_session = get_session()
-    entry_d = db_session.get(key=entry_id)
 
-    if not entry_d:
-        raise NoSuchEntry(f"Entry with ID {entry_id} does not exist")
+    async with db_session.transaction():
+        entry_d = db_session.get(key=entry_id)
 
-    db_session.update(key=entry_id, data=entry.dict())
-    data = db_session.get(key=entry_id)
+        if not entry_d:
+            raise NoSuchEntry(f"Entry with ID {entry_id} does not exist")
 
-    await db_session.save()
+        db_session.update(key=entry_id, data=entry.dict())
+
+    data = db_session.get(key=entry_id)
 
     return data
+
+
+@traced('service')
+async def get_entry_changes_since(since: int = None, epoch: str = None) -> Mapping:
+    db_session = get_session()
+    events = db_session.changes.changes_since(since=since, epoch=epoch)
+
+    return {
+        "seq": db_session.changes.seq,
+        "epoch": db_session.changes.epoch,
+        "reset": events is None,
+        "events": events or []
+    }
+
+
+async def get_entry_changes(since: int = None, epoch: str = None) -> AsyncIterator[Mapping]:
+    db_session = get_session()
+
+    async for event in db_session.changes.subscribe(since=since, epoch=epoch):
+        yield event
@@ -1,14 +1,29 @@
-def generate_id(data: dict) -> int:
+import re
+from typing import Optional
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
     """
-    Generate new ID for given dictionary.
-    It takes last root key of dict and increment it
-    or just return 1 if there is no data in dict.
+    Convert phone number in any format to canonical E.164-like string of digits,
+    so "+1 (233) 44" and "+123344" give the same result.
+    International prefix "00" is treated as "+". Digits are kept as string,
+    so leading zeros are kept and number of any length is accepted.
+
+    :param phone:
+        Phone number to normalize.
 
-    :param data:
-        Dict to generate ID.
+    :return:
+        Digits of phone number or None if there are no digits in it.
     """
-    if data:
-        new_id = int(sorted(data.keys())[-1]) + 1
-        return new_id
+    if not isinstance(phone, str):
+        return None
+
+    phone = phone.strip()
+    if phone.startswith('00'):
+        phone = phone[2:]
+
+    digits = re.sub(r'\D', '', phone)
+    if not digits:
+        return None
 
-    return 1
+    return digits